@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Exercise the detector -> crops path of pipelines.cascade end to end on synthetic
+frames, and time it against classifying whole frames.
+
+The detector models in pipelines.models are still stubs that return no boxes, so
+this registers two documented fakes instead:
+
+  blob_detector   -- a real box producer: one make_detection per saturated blob,
+                     found with pipelines.overlay.overlay_boxes
+  blob_colour     -- a classifier that labels a crop red/green/blue by its mean colour
+
+Each frame gets `--regions` opaque coloured ellipses on grey noise, so every box,
+crop count and label can be checked against what was drawn. With --out-dir the
+frames are saved as JPEG next to a detections.jsonl that
+diffusion_test/run_sam3_upscaler_model.py --detections accepts.
+
+    python benchmarks/bench_crop_cascade.py --n 60 --regions 3 --out-dir /tmp/crops
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from PIL import Image, ImageDraw  # noqa: E402
+
+from pipelines.cascade import Cascade  # noqa: E402
+from pipelines.crops import crop_detections, detections_from_json, detections_to_json, make_detection  # noqa: E402
+from pipelines.models import register_model  # noqa: E402
+from pipelines.models.base import BaseModel  # noqa: E402
+from pipelines.overlay import overlay_boxes  # noqa: E402
+
+COLOURS = {"red": (230, 20, 20), "green": (20, 200, 20), "blue": (30, 60, 255)}
+
+
+class BlobDetector(BaseModel):
+    """Fake detector: one box per coloured blob, scored by how saturated the box is."""
+
+    def predict(self, img_path, pil_image):
+        dets = []
+        for box in overlay_boxes(pil_image, padding=0, downscale=4):
+            sat = np.asarray(pil_image.crop(box).convert("HSV"))[:, :, 1]
+            dets.append(make_detection(box, float((sat > 80).mean()), "blob"))
+        return {"notes": "blob_detector", "number": str(len(dets)),
+                "score": max((d["score"] for d in dets), default=0.0), "detections": dets}
+
+
+class BlobColourClassifier(BaseModel):
+    """Fake classifier: the dominant channel of the mean colour names the 'species'."""
+
+    def predict(self, img_path, pil_image):
+        mean = np.asarray(pil_image, dtype=np.float32).reshape(-1, 3).mean(axis=0)
+        name = list(COLOURS)[int(mean.argmax())]
+        return {"common_name": name, "species": name, "notes": "blob_colour",
+                "score": float(mean.max() / max(mean.sum(), 1.0))}
+
+
+def make_frame(rng, size, regions):
+    """Grey noise with `regions` non-overlapping ellipses; returns (frame, [(box, colour)])."""
+    frame = Image.effect_noise(size, 20).convert("RGB")
+    draw = ImageDraw.Draw(frame)
+    w, h = size
+    drawn = []
+    for i in range(regions):
+        x0 = rng.randrange(i * w // regions, (i + 1) * w // regions - 220)
+        y0 = rng.randrange(0, h - 220)
+        box = (x0, y0, x0 + rng.randrange(80, 200), y0 + rng.randrange(80, 200))
+        colour = rng.choice(list(COLOURS))
+        draw.ellipse(box, fill=COLOURS[colour])
+        drawn.append((box, colour))
+    return frame, drawn
+
+
+def run_cascade(stages, frames):
+    cascade = Cascade(stages)
+    t0 = time.perf_counter()
+    preds = dict(cascade.run((p, im) for p, (im, _) in frames.items()))
+    return time.perf_counter() - t0, preds, cascade.report()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=40)
+    ap.add_argument("--size", default="1920x1080")
+    ap.add_argument("--regions", type=int, default=3)
+    ap.add_argument("--batch-size", type=int, default=8)
+    ap.add_argument("--out-dir", default="", help="Save frames + detections.jsonl here")
+    args = ap.parse_args()
+    size = tuple(int(v) for v in args.size.lower().split("x"))
+
+    register_model("blob_detector", BlobDetector)
+    register_model("blob_colour", BlobColourClassifier)
+    rng = random.Random(0)
+    frames = {f"frame_{i:04d}.jpg": make_frame(rng, size, args.regions) for i in range(args.n)}
+
+    detector = {"name": "blob_detector", "batch_size": args.batch_size}
+    classifier = {"name": "blob_colour", "batch_size": args.batch_size}
+    whole_s, _, _ = run_cascade([detector, classifier], frames)
+    crops_s, preds, report = run_cascade([detector, dict(classifier, input="crops", padding=4)],
+                                         frames)
+
+    bad = 0
+    for p, (_, drawn) in frames.items():
+        pred = preds[p]
+        want = sorted(c for _, c in drawn)
+        got = sorted(d["label"] for d in pred["detections"])
+        bad += got != want or pred["number"] != str(len(drawn))
+    n_crops = sum(len(p["detections"]) for p in preds.values())
+    print(f"{args.n} frames {size[0]}x{size[1]}, {args.regions} blobs each, "
+          f"batch {args.batch_size}")
+    print(f"  whole frames  {1000 * whole_s / args.n:7.2f} ms/frame")
+    print(f"  crops         {1000 * crops_s / args.n:7.2f} ms/frame  ({n_crops} crops)")
+    for st in report["stages"]:
+        print(f"    {st['name']:14s} {st['ms_per_frame']:7.2f} ms/frame busy, "
+              f"{st['frames_passed']}/{st['frames_in']} passed")
+    print(f"  frames whose crop labels/counts differ from what was drawn: {bad}")
+
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+        jsonl = os.path.join(args.out_dir, "detections.jsonl")
+        mismatched = 0
+        with open(jsonl, "w") as f:
+            for p, (im, _) in frames.items():
+                path = os.path.join(args.out_dir, p)
+                im.save(path, quality=95)
+                dets = detections_to_json(preds[p]["detections"])
+                f.write(json.dumps({"image_path": path, "detections": dets}) + "\n")
+                # Same cropping run_sam3_upscaler_model.py --detections does
+                with Image.open(path) as saved:
+                    crops = crop_detections(saved.convert("RGB"),
+                                            {"detections": detections_from_json(dets)})
+                mismatched += len(crops) != len(dets)
+        print(f"  wrote {jsonl} ({mismatched} frames re-cropped differently)")
+
+
+if __name__ == "__main__":
+    main()
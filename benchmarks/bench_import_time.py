@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Check that `import pipelines.models` stays cheap: run it under `python -X importtime`
+in a fresh interpreter, report the cumulative import time, and fail if any heavy
+ML dependency got imported or the time exceeds a budget.
+
+    python benchmarks/bench_import_time.py --budget-ms 50
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("torch", "torchvision", "transformers", "open_clip", "segment_anything",
+         "diffusers", "ultralytics", "groundingdino")
+
+
+def import_times(module: str):
+    """Return {module: cumulative_us} from `python -X importtime -c 'import module'`."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in proc.stderr.splitlines():
+        # "import time:      self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cum_us, name = line.split(":", 1)[1].split("|")
+        times[name.strip()] = int(cum_us)
+    return times
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--module", default="pipelines.models")
+    ap.add_argument("--budget-ms", type=float, default=50.0)
+    args = ap.parse_args()
+
+    times = import_times(args.module)
+    total_ms = times.get(args.module, 0) / 1000.0
+    heavy = sorted(m for m in times if m.split(".")[0] in HEAVY)
+    slowest = sorted(times.items(), key=lambda kv: kv[1], reverse=True)[:5]
+
+    print(f"import {args.module}: {total_ms:.1f} ms cumulative (budget {args.budget_ms:.0f} ms)")
+    for name, us in slowest:
+        print(f"  {us / 1000.0:8.1f} ms  {name}")
+    if heavy:
+        print(f"FAIL: heavy modules imported eagerly: {', '.join(heavy)}")
+        sys.exit(1)
+    if total_ms > args.budget_ms:
+        print("FAIL: over budget")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
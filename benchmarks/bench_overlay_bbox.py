@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Time overlay bbox extraction on synthetic 1920x1080 SAM3-style renders: the original
+np.where version against the row/column-reduction version, at full resolution and
+on a downscaled plane, and check that the boxes agree.
+
+    python benchmarks/bench_overlay_bbox.py --n 50 --regions 2
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from PIL import Image, ImageDraw  # noqa: E402
+
+from pipelines.overlay import overlay_boxes  # noqa: E402
+
+
+def where_bbox(img, sat_threshold=80, val_threshold=40, padding=10):
+    """The previous implementation from run_sam3_upscaler_model.py, for reference."""
+    hsv = np.array(img.convert("HSV"))
+    s = hsv[:, :, 1]
+    v = hsv[:, :, 2]
+    mask = (s > sat_threshold) & (v > val_threshold)
+    ys, xs = np.where(mask)
+    if len(xs) == 0:
+        return None
+    height, width = s.shape
+    return (max(0, xs.min() - padding), max(0, ys.min() - padding),
+            min(width, xs.max() + padding), min(height, ys.max() + padding))
+
+
+def make_frame(rng, size, regions):
+    """Gray noise background with `regions` translucent coloured blobs on top."""
+    base = Image.effect_noise(size, 25).convert("RGB")
+    over = Image.new("RGB", size)
+    alpha = Image.new("L", size, 0)
+    d_over, d_alpha = ImageDraw.Draw(over), ImageDraw.Draw(alpha)
+    w, h = size
+    for i in range(regions):
+        x0 = rng.randrange(i * w // regions, (i + 1) * w // regions - 200)
+        y0 = rng.randrange(0, h - 200)
+        box = (x0, y0, x0 + rng.randrange(80, 200), y0 + rng.randrange(80, 200))
+        colour = rng.choice([(255, 0, 0), (0, 200, 0), (30, 60, 255)])
+        d_over.ellipse(box, fill=colour)
+        d_alpha.ellipse(box, fill=160)
+    return Image.composite(over, base, alpha)
+
+
+def time_fn(fn, frames, repeat):
+    best = float("inf")
+    out = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = [fn(im) for im in frames]
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=30)
+    ap.add_argument("--size", default="1920x1080")
+    ap.add_argument("--regions", type=int, default=2)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+    size = tuple(int(v) for v in args.size.lower().split("x"))
+
+    rng = random.Random(0)
+    frames = [make_frame(rng, size, args.regions) for _ in range(args.n)]
+
+    def union(boxes):
+        if not boxes:
+            return None
+        return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+                max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+    cases = [
+        ("np.where (old)", lambda im: where_bbox(im)),
+        ("any() full-res", lambda im: union(overlay_boxes(im, separate=False))),
+        ("any() 1/4 + refine", lambda im: union(overlay_boxes(im, downscale=4, separate=False))),
+        ("regions full-res", lambda im: union(overlay_boxes(im))),
+        ("regions 1/4 + refine", lambda im: union(overlay_boxes(im, downscale=4))),
+    ]
+    ref = None
+    print(f"{args.n} frames {size[0]}x{size[1]}, {args.regions} overlay regions each")
+    for name, fn in cases:
+        secs, boxes = time_fn(fn, frames, args.repeat)
+        boxes = [tuple(int(v) for v in b) if b else None for b in boxes]
+        if ref is None:
+            ref = boxes
+        diff = sum(a != b for a, b in zip(ref, boxes))
+        print(f"  {name:22s} {1000 * secs / args.n:7.2f} ms/frame   boxes differing: {diff}")
+
+    n_regions = [len(overlay_boxes(im, downscale=4)) for im in frames]
+    print(f"  regions found per frame (1/4): min {min(n_regions)} max {max(n_regions)}")
+
+
+if __name__ == "__main__":
+    main()
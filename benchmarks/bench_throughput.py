@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+End-to-end throughput of the ingest path on a synthetic SM_1..SM_5 JPEG tree: image
+discovery, EXIF datetime parsing, decode, BaselineModel.predict and observation
+writing, at several corpus sizes and worker counts. Results go to a JSON file so runs
+can be compared across machines and commits.
+
+    python benchmarks/bench_throughput.py --sizes 200,1000 --workers 0,4,8 --out bench.json
+    python benchmarks/bench_throughput.py --sizes 500 --workers 2,4 --executors thread,process,shm
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd  # noqa: E402
+
+from pipelines.dataset import decode_rgb, iter_image_paths, iter_images  # noqa: E402
+from pipelines.exif_utils import bulk_exif_datetimes, fast_exif_datetime  # noqa: E402
+from pipelines.models.baseline import BaselineModel  # noqa: E402
+from pipelines.writer import write_observations  # noqa: E402
+from synthetic_tree import make_tree  # noqa: E402
+
+
+def run(stage, n, workers, fn, repeat):
+    """Best of `repeat` runs of fn() (which must process n items)."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        count = fn()
+        best = min(best, time.perf_counter() - t0)
+    if count != n:
+        raise RuntimeError(f"{stage}: processed {count} items, expected {n}")
+    result = {"stage": stage, "n": n, "workers": workers, "seconds": round(best, 6),
+              "items_per_s": round(n / best, 2) if best > 0 else None}
+    w = "-" if workers is None else workers
+    print(f"  {stage:<10} n={n:<6} workers={w:<3} {best:8.3f} s  {result['items_per_s']:>10} /s",
+          flush=True)
+    return result
+
+
+def bench_corpus(root, paths, n, workers_list, repeat, out_dir, executors=("thread",),
+                 min_size=None):
+    results = []
+    results.append(run("discover", n, None,
+                       lambda: sum(1 for _ in iter_image_paths(root)), repeat))
+
+    for w in workers_list:
+        if w == 0:
+            fn = lambda: sum(1 for p in paths if fast_exif_datetime(p)[0] is not None)  # noqa: E731
+        else:
+            fn = lambda: sum(1 for dt, _ in bulk_exif_datetimes(paths, workers=w).values()  # noqa: E731
+                             if dt is not None)
+        results.append(run("exif", n, w, fn, repeat))
+
+    for ex in executors:
+        stage = "decode" if ex == "thread" else f"decode_{ex}"
+        for w in workers_list:
+            if w == 0 and ex != "thread":
+                continue  # serial decode is the same for every executor
+            results.append(run(stage, n, w, lambda: sum(
+                1 for _ in iter_images(root, workers=w, executor=ex)), repeat))
+    if min_size:
+        # Reduced-scale decode, as a classifier with input_size=min_size gets it
+        for w in workers_list:
+            results.append(run("decode_reduced", n, w, lambda: sum(
+                1 for _ in iter_images(root, workers=w, min_size=min_size)), repeat))
+
+    # predict: model overhead alone, on a small pool of frames decoded up front
+    model = BaselineModel(model_path="")
+    pool = [(p, decode_rgb(p)) for p in paths[:16]]
+
+    def predict_all():
+        rows = []
+        for i in range(n):
+            p, img = pool[i % len(pool)]
+            rows.append({"path": p, **model.predict(p, img)})
+        return rows
+
+    results.append(run("predict", n, None, lambda: len(predict_all()), repeat))
+
+    df = pd.DataFrame(predict_all())
+    xlsx = os.path.join(out_dir, f"obs_{n}.xlsx")
+
+    def write():
+        write_observations(df, xlsx, overwrite=True)
+        return len(df)
+
+    results.append(run("write", n, None, write, repeat))
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--sizes", default="200,1000", help="Corpus sizes (images)")
+    ap.add_argument("--workers", default="0,4,8", help="Worker counts (0 = serial)")
+    ap.add_argument("--frame", default="1920x1080", help="Frame size WxH")
+    ap.add_argument("--executors", default="thread",
+                    help="Decode executors to compare: thread,process,shm")
+    ap.add_argument("--min-size", default="256x256",
+                    help="Also time decoding for a model with this input_size WxH ('' = skip)")
+    ap.add_argument("--repeat", type=int, default=1, help="Best of N runs per measurement")
+    ap.add_argument("--corpus-dir", default=None,
+                    help="Reuse/keep the synthetic tree here (default: a temp dir)")
+    ap.add_argument("--out", default="bench_throughput.json")
+    args = ap.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    workers_list = [int(w) for w in args.workers.split(",")]
+    frame = tuple(int(v) for v in args.frame.lower().split("x"))
+    executors = [e.strip() for e in args.executors.split(",") if e.strip()]
+    min_size = tuple(int(v) for v in args.min_size.lower().split("x")) if args.min_size else None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base = args.corpus_dir or tmp
+        results = []
+        for n in sizes:
+            # One tree per size, so discovery sees exactly n files
+            root = os.path.join(base, f"tree_{n}_{frame[0]}x{frame[1]}")
+            t0 = time.perf_counter()
+            paths, _ = make_tree(root, n, frame)
+            print(f"corpus {root}: {n} frames ({time.perf_counter() - t0:.1f} s to build)",
+                  flush=True)
+            results += bench_corpus(root, paths, n, workers_list, args.repeat, tmp, executors,
+                                    min_size)
+
+    report = {
+        "benchmark": "throughput",
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "frame": list(frame),
+        "sizes": sizes,
+        "workers": workers_list,
+        "executors": executors,
+        "min_size": list(min_size) if min_size else None,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
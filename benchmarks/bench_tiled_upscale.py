@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Peak memory and time of tiled x4 upscaling (streamed to PNG) against one whole-image
+call, using Lanczos as a stand-in for the SD x4 upscaler (peak = tracemalloc, i.e.
+Python/NumPy allocations). Also reports how far the tiled result is from the
+whole-image one (seams would show up here).
+
+    python benchmarks/bench_tiled_upscale.py --size 1920x1080 --tiles 64,128,256
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from pipelines.superres import lanczos_upscale, tiled_upscale  # noqa: E402
+
+
+def measure(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    out = fn()
+    secs = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return out, secs, peak / 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size", default="1920x1080")
+    ap.add_argument("--tiles", default="64,128,256")
+    ap.add_argument("--overlap", type=int, default=16)
+    args = ap.parse_args()
+    size = tuple(int(v) for v in args.size.lower().split("x"))
+    img = Image.effect_noise(size, 50).convert("RGB")
+
+    def whole():
+        out = lanczos_upscale(img)
+        return np.asarray(out)
+
+    ref, secs, peak = measure(whole)
+    print(f"{size[0]}x{size[1]} -> {size[0] * 4}x{size[1] * 4}")
+    print(f"  whole image      {secs:6.2f} s  peak {peak:7.1f} MB")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        out_path = os.path.join(tmp, "up.png")
+        for tile in (int(t) for t in args.tiles.split(",")):
+            _, secs, peak = measure(lambda: tiled_upscale(img, lanczos_upscale, tile=tile,
+                                                          overlap=args.overlap,
+                                                          out_path=out_path))
+            with Image.open(out_path) as im:
+                diff = np.abs(np.asarray(im, np.float32) - ref).mean()
+            print(f"  tile {tile:4d} (png) {secs:6.2f} s  peak {peak:7.1f} MB  "
+                  f"mean |diff| {diff:.4f}")
+
+
+if __name__ == "__main__":
+    main()
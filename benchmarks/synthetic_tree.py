@@ -0,0 +1,74 @@
+"""
+Synthetic camera-trap tree for benchmarks: <root>/SM_1..SM_5/<YYYYMMDD>/IMG_xxxxx.JPG,
+each JPEG carrying EXIF DateTime / DateTimeOriginal / DateTimeDigitized like our frames.
+
+Frames are encoded once per SM location and the EXIF segment is spliced in per file,
+so building thousands of 1920x1080 files takes seconds.
+"""
+import os
+import random
+import struct
+import sys
+from datetime import datetime, timedelta
+from io import BytesIO
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image  # noqa: E402
+
+from pipelines.exif_utils import (  # noqa: E402
+    TAG_DATETIME, TAG_DATETIME_DIGITIZED, TAG_DATETIME_ORIGINAL, TAG_EXIF_IFD,
+)
+
+SM_LOCATIONS = [f"SM_{i}" for i in range(1, 6)]
+
+
+def exif_segment(dt: datetime) -> bytes:
+    """A complete APP1 (FFE1) segment holding camera-style datetime tags."""
+    stamp = dt.strftime("%Y:%m:%d %H:%M:%S")
+    exif = Image.Exif()
+    exif[0x010F] = "Browning"  # Make
+    exif[TAG_DATETIME] = stamp
+    sub = exif.get_ifd(TAG_EXIF_IFD)
+    sub[TAG_DATETIME_ORIGINAL] = stamp
+    sub[TAG_DATETIME_DIGITIZED] = stamp
+    payload = exif.tobytes()
+    return b"\xff\xe1" + struct.pack(">H", len(payload) + 2) + payload
+
+
+def encode_frame(size, seed: int, quality: int = 85) -> bytes:
+    """JPEG bytes of a noisy frame (noise keeps decode cost close to real photos)."""
+    rng = random.Random(seed)
+    img = Image.effect_noise(size, 30 + rng.randrange(30)).convert("RGB")
+    tint = Image.new("RGB", size, tuple(rng.randrange(60, 200) for _ in range(3)))
+    img = Image.blend(img, tint, 0.4)
+    buf = BytesIO()
+    img.save(buf, "JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def make_tree(root: str, n: int, size=(1920, 1080), seed: int = 0,
+              start: datetime = datetime(2022, 1, 1)) -> Tuple[List[str], Dict[str, datetime]]:
+    """
+    Write n JPEGs spread over SM_1..SM_5 and return (paths, {path: capture datetime}).
+    Files that already exist are left alone, so a corpus directory can be reused.
+    """
+    rng = random.Random(seed)
+    frames = {sm: encode_frame(size, seed * 31 + i) for i, sm in enumerate(SM_LOCATIONS)}
+    paths, truth = [], {}
+    for i in range(n):
+        sm = SM_LOCATIONS[i % len(SM_LOCATIONS)]
+        dt = start + timedelta(minutes=rng.randrange(2 * 365 * 24 * 60))
+        d = os.path.join(root, sm, dt.strftime("%Y%m%d"))
+        p = os.path.join(d, f"IMG_{i:05d}.JPG")
+        if not os.path.exists(p):
+            os.makedirs(d, exist_ok=True)
+            body = frames[sm]
+            with open(p, "wb") as f:
+                f.write(body[:2])  # SOI
+                f.write(exif_segment(dt))
+                f.write(body[2:])
+        paths.append(p)
+        truth[p] = dt
+    return paths, truth
@@ -1,105 +1,101 @@
 #!/usr/bin/env python3
 import os
 import csv
-from PIL import Image
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pipelines.grayscale import analyze_file, analyze_files  # noqa: E402  (shared B/W detector)
 
 # -------- CONFIGURE THIS ROOT --------
 ROOT_DIR = r"/home/hice1/kpanchal30/scratch/stone mt camera full/Camera Trap Photos/Processed_Images"
 OUTPUT_CSV = "images_needing_resolution.csv"
+WORKERS = int(os.environ.get("SLURM_CPUS_PER_TASK", os.cpu_count() or 1))
+MANIFEST_DB = None  # optional pipelines.manifest index; reuses its size/grayscale columns
 # -------------------------------------
 
 
-def is_grayscale(img, tolerance=3, min_gray_fraction=0.95):
-    """
-    Decide if an image is effectively black & white (grayscale).
-
-    - If mode is 'L', '1', or 'LA', treat as grayscale.
-    - Otherwise convert to RGB and sample pixels.
-    - If at least `min_gray_fraction` of sampled pixels have
-      |R-G|, |G-B|, |R-B| <= tolerance, treat as grayscale.
-    """
-    if img.mode in ("1", "L", "LA"):
-        return True
-
-    rgb = img.convert("RGB")
-    width, height = rgb.size
-
-    # Sample up to ~32x32 pixels across the image
-    step_x = max(1, width // 32)
-    step_y = max(1, height // 32)
-
-    total = 0
-    gray_like = 0
-
-    for y in range(0, height, step_y):
-        for x in range(0, width, step_x):
-            r, g, b = rgb.getpixel((x, y))
-            total += 1
-            if (abs(r - g) <= tolerance and
-                abs(g - b) <= tolerance and
-                abs(r - b) <= tolerance):
-                gray_like += 1
-
-    if total == 0:
-        return False
-
-    fraction = gray_like / total
-    return fraction >= min_gray_fraction
-
-
 def analyze_image(path):
     """
     Return (width, height, is_bw) for a given image path.
     Raises an exception if the image can't be opened.
     """
-    with Image.open(path) as img:
-        width, height = img.size
-        bw = is_grayscale(img)
-    return width, height, bw
+    return analyze_file(path)
 
 
-def main():
+def rows_from_manifest(db_path):
+    """Build the same rows as main() from the manifest instead of re-opening every file."""
+    from pipelines.manifest import open_manifest
+
     rows = []
+    with open_manifest(db_path, ROOT_DIR) as m:
+        for r in m.query(ROOT_DIR, exts={".jpg", ".jpeg"}, include_errors=True):
+            bw = None if r["is_gray"] is None else bool(r["is_gray"])
+            if r["error"] or bw or r["width"] != 1920 or r["height"] != 1080:
+                rows.append(
+                    {
+                        "full_path": r["path"],
+                        "filename": os.path.basename(r["path"]),
+                        "is_black_and_white": bw,
+                        "width": r["width"],
+                        "height": r["height"],
+                        "error": r["error"],
+                    }
+                )
+    return rows
 
-    for root, dirs, files in os.walk(ROOT_DIR):
-        for fname in files:
-            if not fname.lower().endswith((".jpg", ".jpeg")):
-                continue
 
-            full_path = os.path.join(root, fname)
+def iter_jpgs(root_dir):
+    for root, dirs, files in os.walk(root_dir):
+        for fname in files:
+            if fname.lower().endswith((".jpg", ".jpeg")):
+                yield os.path.join(root, fname)
 
-            width = None
-            height = None
-            bw = None
-            error_msg = None
 
-            try:
-                width, height, bw = analyze_image(full_path)
+def rows_from_walk():
+    rows = []
 
-                # Filter condition:
-                # keep if black & white OR not 1920x1080
-                needs_resolution = (
-                    bw is True or
-                    width != 1920 or
-                    height != 1080
-                )
+    # Score files on a process pool (SLURM gives us --cpus-per-task cores)
+    for full_path, result in analyze_files(iter_jpgs(ROOT_DIR), workers=WORKERS):
+        width = None
+        height = None
+        bw = None
+        error_msg = None
+
+        if isinstance(result, Exception):
+            # If unreadable/corrupt, mark as needing attention
+            error_msg = str(result)
+            needs_resolution = True
+        else:
+            width, height, bw = result
+
+            # Filter condition:
+            # keep if black & white OR not 1920x1080
+            needs_resolution = (
+                bw is True or
+                width != 1920 or
+                height != 1080
+            )
+
+        if needs_resolution:
+            rows.append(
+                {
+                    "full_path": full_path,
+                    "filename": os.path.basename(full_path),
+                    "is_black_and_white": bw,
+                    "width": width,
+                    "height": height,
+                    "error": error_msg,
+                }
+            )
+
+    return rows
 
-            except Exception as e:
-                # If unreadable/corrupt, mark as needing attention
-                error_msg = str(e)
-                needs_resolution = True
 
-            if needs_resolution:
-                rows.append(
-                    {
-                        "full_path": full_path,
-                        "filename": fname,
-                        "is_black_and_white": bw,
-                        "width": width,
-                        "height": height,
-                        "error": error_msg,
-                    }
-                )
+def main():
+    if MANIFEST_DB:
+        rows = rows_from_manifest(MANIFEST_DB)
+    else:
+        rows = rows_from_walk()
 
     fieldnames = [
         "full_path",
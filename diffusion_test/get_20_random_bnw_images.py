@@ -1,95 +1,52 @@
 #!/usr/bin/env python3
 import json
+import os
 import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pipelines.sampling import sample_label_file  # noqa: E402
 
 INPUT = "All_labels_2_with_bw.jsonl"
 OUTPUT = "sampled_20_mixed.jsonl"
+SEED = 42  # same input + seed -> same 20 images
 
-def load_jsonl_or_array(path):
-    """Load either a JSON array file or a JSONL file into a list of dicts."""
-    with open(path, "r") as f:
-        first_char = f.read(1)
-        f.seek(0)
-        if first_char == "[":
-            return json.load(f)  # JSON array
-        else:
-            return [json.loads(line) for line in f if line.strip()]  # JSONL
 
-def is_black_white(entry):
-    """Robustly interpret the Black_white field as a boolean."""
-    val = entry.get("Black_white")
-    if isinstance(val, bool):
-        return val
-    if val is None:
-        return False
-    return str(val).strip().lower() in ("true", "1", "yes")
+def pick_unique(candidates, used_common_names, n, rng):
+    """Up to n entries with CommonNames not used yet, chosen at random."""
+    candidates = [e for e in candidates if e["CommonName"] not in used_common_names]
+    rng.shuffle(candidates)
+    picked = []
+    for e in candidates:
+        if e["CommonName"] in used_common_names:
+            continue
+        picked.append(e)
+        used_common_names.add(e["CommonName"])
+        if len(picked) == n:
+            break
+    return picked
 
-def main():
-    entries = load_jsonl_or_array(INPUT)
 
-    # Shuffle so we get a random-ish sample instead of always the first ones
-    random.shuffle(entries)
+def main():
+    # One streaming pass: one random entry per (Black_white, CommonName)
+    sample = sample_label_file(INPUT, k=1, strata=["bw", "species"], seed=SEED,
+                               where=lambda e: bool(e.get("CommonName")))
+    bw = [items[0] for (is_bw, _), items in sample.items() if is_bw]
+    non_bw = [items[0] for (is_bw, _), items in sample.items() if not is_bw]
 
-    selected_bw = []         # 10 black & white
-    selected_non_bw = []     # 5 non–black & white
-    selected_extra = []      # 5 extra with new CommonName
+    rng = random.Random(SEED)
     used_common_names = set()
 
     # -------- 1) Pick 10 black & white with unique CommonName --------
-    for e in entries:
-        if not is_black_white(e):
-            continue
-
-        common_name = e.get("CommonName")
-        if not common_name:
-            continue
-
-        if common_name in used_common_names:
-            continue
-
-        selected_bw.append(e)
-        used_common_names.add(common_name)
-
-        if len(selected_bw) == 10:
-            break
-
+    selected_bw = pick_unique(bw, used_common_names, 10, rng)
     print(f"Selected {len(selected_bw)} black & white entries.")
 
     # -------- 2) Pick 5 non–black & white with unique CommonName --------
-    for e in entries:
-        if is_black_white(e):
-            continue
-
-        common_name = e.get("CommonName")
-        if not common_name:
-            continue
-
-        if common_name in used_common_names:
-            continue
-
-        selected_non_bw.append(e)
-        used_common_names.add(common_name)
-
-        if len(selected_non_bw) == 5:
-            break
-
+    selected_non_bw = pick_unique(non_bw, used_common_names, 5, rng)
     print(f"Selected {len(selected_non_bw)} non–black & white entries.")
 
     # -------- 3) Pick 5 extra with new CommonName (any Black_white) --------
-    for e in entries:
-        common_name = e.get("CommonName")
-        if not common_name:
-            continue
-
-        if common_name in used_common_names:
-            continue
-
-        selected_extra.append(e)
-        used_common_names.add(common_name)
-
-        if len(selected_extra) == 5:
-            break
-
+    selected_extra = pick_unique(bw + non_bw, used_common_names, 5, rng)
     print(f"Selected {len(selected_extra)} extra entries with new CommonName.")
 
     # Combine all selected entries
@@ -102,5 +59,6 @@ def main():
 
     print(f"Total selected: {len(all_selected)} (saved to {OUTPUT})")
 
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -2,8 +2,12 @@
 import csv
 import json
 import os
+import sys
 from typing import Set, List, Dict, Any
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pipelines.labels import LabelStore, iter_label_records, sniff_format  # noqa: E402
+
 # ---------- CONFIGURE THESE PATHS ----------
 INPUT_CSV = "/home/hice1/kpanchal30/code/HAAG_Stone_Mountain_Species_Detection_Project/diffusion_test/images_needing_resolution.csv"               # your original CSV (example name)
 BW_CSV = "black_and_white_images.csv"      # output CSV with only B/W images
@@ -57,24 +61,7 @@ def load_labels_file(path: str) -> List[Dict[str, Any]]:
       - A single JSON array [ {...}, {...}, ... ]
     Returns a list of dicts.
     """
-    with open(path, "r") as f:
-        first_char = f.read(1)
-        f.seek(0)
-
-        if first_char == "[":
-            # JSON array
-            data = json.load(f)
-            if not isinstance(data, list):
-                raise ValueError("Expected a JSON array at top-level.")
-            return data
-        else:
-            # JSONL: one JSON object per line
-            entries: List[Dict[str, Any]] = []
-            for line in f:
-                line = line.strip()
-                if line:
-                    entries.append(json.loads(line))
-            return entries
+    return list(iter_label_records(path))
 
 
 def save_labels_file(path: str, entries: List[Dict[str, Any]], as_array: bool) -> None:
@@ -97,25 +84,14 @@ def add_black_white_label_to_labels(
     bw_filenames: Set[str]
 ) -> None:
     """
-    Loads All_labels_2.jsonl, adds 'Black_white' key to each entry based on filename
-    membership in bw_filenames, and writes out a new file.
+    Adds a 'Black_white' column to All_labels_2.jsonl based on filename membership in
+    bw_filenames. The column is stored next to the source (pipelines.labels index), which
+    is never rewritten; labels_output is a streamed, merged copy in the input's format.
     """
-    # Determine if input is array or JSONL so we can preserve format
-    with open(labels_input, "r") as f:
-        first_char = f.read(1)
-        is_array = (first_char == "[")
-    entries = load_labels_file(labels_input)
-
-    for entry in entries:
-        image_path = entry.get("image_path", "")
-        filename = os.path.basename(image_path)
-        is_bw = filename in bw_filenames
-
-        # If you prefer "True"/"False" strings instead of booleans, change to:
-        # entry["Black_white"] = "True" if is_bw else "False"
-        entry["Black_white"] = is_bw
-
-    save_labels_file(labels_output, entries, as_array=is_array)
+    # If you prefer "True"/"False" strings instead of booleans, pass those as values
+    with LabelStore(labels_input) as store:
+        store.set_column("Black_white", dict.fromkeys(bw_filenames, True), default=False)
+        store.write_jsonl(labels_output, as_array=sniff_format(labels_input) == "array")
     print(f"Saved updated labels with 'Black_white' field to: {labels_output}")
 
 
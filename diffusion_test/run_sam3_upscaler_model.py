@@ -1,51 +1,98 @@
 import os
+import sys
+import json
 import argparse
 
 from PIL import Image
-import numpy as np
 import torch
 from diffusers import StableDiffusionUpscalePipeline
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pipelines.crops import crop_detections, detections_from_json  # noqa: E402
+from pipelines.overlay import overlay_boxes, overlay_boxes_for_paths  # noqa: E402
+from pipelines.superres import tiled_upscale  # noqa: E402
 
-def extract_bbox_from_overlay(img, sat_threshold=80, val_threshold=40, padding=10):
+
+def extract_bbox_from_overlay(img, sat_threshold=80, val_threshold=40, padding=10, downscale=1):
     """
     Detect a bounding box around the overlay/mask region, regardless of color.
 
-    Strategy:
-      - Convert to HSV
-      - Use high saturation (and reasonable value) to detect colored overlay pixels
-      - Compute min/max x,y of those pixels as the bounding box
-      - Add a small padding around the box
+    High saturation (and reasonable value) marks overlay pixels; the box spans all of
+    them plus padding. See pipelines.overlay.overlay_boxes for per-region boxes.
 
     Returns (left, top, right, bottom) in image coordinates,
     or None if no overlay region is found.
     """
-    hsv = np.array(img.convert("HSV"))
-    h = hsv[:, :, 0]
-    s = hsv[:, :, 1]
-    v = hsv[:, :, 2]
+    boxes = overlay_boxes(img, sat_threshold, val_threshold, padding,
+                          downscale=downscale, separate=False)
+    return boxes[0] if boxes else None
 
-    # High saturation and not too dark → likely overlay/mask
-    mask = (s > sat_threshold) & (v > val_threshold)
 
-    ys, xs = np.where(mask)
-    if len(xs) == 0 or len(ys) == 0:
-        return None
+def iter_overlay_crops(image_dir, files, args):
+    """
+    Legacy path: recover crops from rendered SAM3 overlays via HSV thresholding.
+    Thresholding runs on a worker pool; each disjoint overlay region becomes its own
+    crop when --separate-regions is set.
+    """
+    index = {os.path.join(image_dir, f): (i, f) for i, f in enumerate(files, start=1)}
+    results = overlay_boxes_for_paths(
+        list(index),
+        workers=args.workers,
+        sat_threshold=args.sat_threshold,
+        val_threshold=args.val_threshold,
+        padding=args.padding,
+        downscale=args.downscale,
+        separate=args.separate_regions,
+    )
+    for img_path, boxes in results:
+        idx, filename = index[img_path]
+        if isinstance(boxes, Exception):
+            print(f"[{idx}] Skipping {filename}: cannot open ({boxes})")
+            continue
+        if not boxes:
+            print(f"[{idx}] Skipping {filename}: no overlay region detected")
+            continue
 
-    ymin, ymax = ys.min(), ys.max()
-    xmin, xmax = xs.min(), xs.max()
+        img = Image.open(img_path).convert("RGB")
+        base_name, _ = os.path.splitext(filename)
+        for ri, bbox in enumerate(boxes):
+            suffix = f"_region{ri}" if len(boxes) > 1 else ""
+            yield idx, filename, f"{base_name}{suffix}", img.crop(bbox)
 
-    # Add padding, clamped to image bounds
-    height, width = s.shape
-    left = max(0, xmin - padding)
-    top = max(0, ymin - padding)
-    right = min(width, xmax + padding)
-    bottom = min(height, ymax + padding)
 
-    if right <= left or bottom <= top:
-        return None
+def iter_detection_crops(detections_jsonl, args):
+    """
+    Crop straight from the original frames using the boxes a detector stage wrote
+    ({"image_path": ..., "detections": [{"box": [l, t, r, b], "score": ...}]} per line;
+    observation rows with "path" and a JSON-string "detections" column also work).
+    Each frame is decoded once; no overlay render, re-encode or HSV pass.
+    """
+    with open(detections_jsonl, "r") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if args.max_images > 0:
+        records = records[: args.max_images]
+
+    for idx, rec in enumerate(records, start=1):
+        img_path = rec.get("image_path") or rec["path"]
+        filename = os.path.basename(img_path)
+        try:
+            img = Image.open(img_path).convert("RGB")
+        except Exception as e:
+            print(f"[{idx}] Skipping {filename}: cannot open ({e})")
+            continue
+
+        dets = rec.get("detections")
+        if isinstance(dets, str):
+            dets = json.loads(dets)
+        crops = crop_detections(img, {"detections": detections_from_json(dets)}, padding=args.padding)
+        if not crops:
+            print(f"[{idx}] Skipping {filename}: no detections")
+            continue
 
-    return left, top, right, bottom
+        base_name, _ = os.path.splitext(filename)
+        for ci, (_, cropped) in enumerate(crops):
+            suffix = f"_det{ci}" if len(crops) > 1 else ""
+            yield idx, filename, f"{base_name}{suffix}", cropped
 
 
 def main():
@@ -74,6 +121,19 @@ def main():
         default="cuda",
         help="Device to run on: 'cuda' or 'cpu'",
     )
+    parser.add_argument(
+        "--detections",
+        type=str,
+        default=None,
+        help="JSONL of detector boxes per original frame; crops from the frames directly "
+             "instead of thresholding SAM3 overlay renders",
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=str,
+        default=None,
+        help="Where to write pre/post images (default: --image-dir)",
+    )
     parser.add_argument(
         "--max-images",
         type=int,
@@ -98,19 +158,58 @@ def main():
         default=10,
         help="Extra pixels of padding around the detected bbox.",
     )
+    parser.add_argument(
+        "--downscale",
+        type=int,
+        default=1,
+        help="Threshold overlays on a 1/N plane and refine edges at full resolution "
+             "(faster; may miss overlays thinner than N pixels).",
+    )
+    parser.add_argument(
+        "--separate-regions",
+        action="store_true",
+        help="Crop each disjoint overlay region separately instead of one box around all.",
+    )
+    parser.add_argument(
+        "--tile",
+        type=int,
+        default=0,
+        help="Upscale in tiles of this many input pixels and stream the result to a PNG "
+             "(0 = whole crop in one call).",
+    )
+    parser.add_argument(
+        "--tile-overlap",
+        type=int,
+        default=16,
+        help="Overlap between tiles in input pixels; seams are blended across it.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Worker processes for overlay thresholding.",
+    )
 
     args = parser.parse_args()
 
     image_dir = args.image_dir
-    files = sorted(
-        f for f in os.listdir(image_dir)
-        if f.lower().endswith((".jpg", ".jpeg", ".png"))
-    )
+    out_dir = args.output_dir or image_dir
+    os.makedirs(out_dir, exist_ok=True)
 
-    if args.max_images > 0:
-        files = files[: args.max_images]
+    if args.detections:
+        crops = iter_detection_crops(args.detections, args)
+        print(f"Reading detections from {args.detections}")
+    else:
+        files = sorted(
+            f for f in os.listdir(image_dir)
+            if f.lower().endswith((".jpg", ".jpeg", ".png"))
+        )
+
+        if args.max_images > 0:
+            files = files[: args.max_images]
 
-    print(f"Found {len(files)} images in {image_dir}")
+        print(f"Found {len(files)} images in {image_dir}")
+        crops = iter_overlay_crops(image_dir, files, args)
 
     # Load upscaler pipeline
     print(f"Loading model: {args.model_id}")
@@ -125,34 +224,12 @@ def main():
     # Optional: disable safety checker if it flags benign wildlife images
     # pipe.safety_checker = lambda images, clip_input: (images, [False] * len(images))
 
-    for idx, filename in enumerate(files, start=1):
-        img_path = os.path.join(image_dir, filename)
-        try:
-            img = Image.open(img_path).convert("RGB")
-        except Exception as e:
-            print(f"[{idx}] Skipping {filename}: cannot open ({e})")
-            continue
-
-        bbox = extract_bbox_from_overlay(
-            img,
-            sat_threshold=args.sat_threshold,
-            val_threshold=args.val_threshold,
-            padding=args.padding,
-        )
-
-        if bbox is None:
-            print(f"[{idx}] Skipping {filename}: no overlay region detected")
-            continue
-
-        left, top, right, bottom = bbox
-        cropped = img.crop((left, top, right, bottom))
-
-        base_name, _ = os.path.splitext(filename)
+    for idx, filename, base_name, cropped in crops:
         pre_name = f"pre_diffuser_{base_name}.jpg"
-        post_name = f"post_diffuser_{base_name}.jpg"
+        post_name = f"post_diffuser_{base_name}.{'png' if args.tile else 'jpg'}"
 
-        pre_path = os.path.join(image_dir, pre_name)
-        post_path = os.path.join(image_dir, post_name)
+        pre_path = os.path.join(out_dir, pre_name)
+        post_path = os.path.join(out_dir, post_name)
 
         # Save cropped "before" image
         try:
@@ -164,15 +241,22 @@ def main():
         # Run diffuser upscaler
         try:
             autocast_device = "cuda" if args.device == "cuda" else "cpu"
-            with torch.autocast(autocast_device):
-                result = pipe(
-                    prompt=args.prompt,
-                    image=cropped,
-                    num_inference_steps=50,
-                    guidance_scale=7.5,
-                )
-            upscaled = result.images[0]
-            upscaled.save(post_path, "JPEG")
+
+            def upscale(image):
+                with torch.autocast(autocast_device):
+                    result = pipe(
+                        prompt=args.prompt,
+                        image=image,
+                        num_inference_steps=50,
+                        guidance_scale=7.5,
+                    )
+                return result.images[0]
+
+            if args.tile:
+                tiled_upscale(cropped, upscale, tile=args.tile, overlap=args.tile_overlap,
+                              out_path=post_path)
+            else:
+                upscale(cropped).save(post_path, "JPEG")
             print(f"[{idx}] Processed {filename} -> {pre_name}, {post_name}")
         except Exception as e:
             print(f"[{idx}] Error running diffuser on {filename}: {e}")
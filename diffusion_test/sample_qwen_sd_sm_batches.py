@@ -1,13 +1,19 @@
 import os
 import json
-import random
+import sys
+import argparse
+from functools import partial
 from pathlib import Path
 
-import torch
 from PIL import Image
-from diffusers import StableDiffusionUpscalePipeline
-from transformers import Qwen3VLForConditionalGeneration, AutoProcessor
-from tqdm import tqdm
+
+# torch / diffusers / transformers are imported where the real models are loaded, so
+# the stand-in phases (--upscaler lanczos --judge stub) also run on a CPU-only box.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from pipelines.jobqueue import JobQueue, run_phase  # noqa: E402
+from pipelines.judge import BatchJudge  # noqa: E402
+from pipelines.sampling import stratified_sample  # noqa: E402
+from pipelines.superres import lanczos_upscale, stub_judge, tiled_upscale  # noqa: E402
 
 
 # ---------- CONFIG ----------
@@ -17,14 +23,27 @@ BASE_INPUT = Path(
 )
 BASE_OUTPUT = Path("/home/hice1/kpanchal30/scratch/stone_mt_sr_outputs")
 METRICS_LOG = Path("/home/hice1/kpanchal30/scratch/stone_mt_sr_outputs/qwen_sr_metrics.jsonl")
+# Durable per-image state of both phases; delete it to start over
+QUEUE_DB = BASE_OUTPUT / "sr_jobs.sqlite"
+
+MANIFEST_DB = None  # optional pipelines.manifest index; None = walk BASE_INPUT
 
 SAMPLES_PER_BATCH = 1
+# Upscale in TILE_SIZE x TILE_SIZE input tiles (0 = whole image at once); tiled output is
+# streamed to a .png next to where the whole-image result would go
+TILE_SIZE = 0
+TILE_OVERLAP = 16
+# Image pairs per Qwen generate() call
+JUDGE_BATCH_SIZE = 4
 RANDOM_SEED = 42
 
 
 # ---------- MODEL SETUP ----------
 
 def load_sr_model(device="cuda"):
+    import torch
+    from diffusers import StableDiffusionUpscalePipeline
+
     print("Loading StableDiffusionUpscalePipeline...", flush=True)
     sr_model_id = "stabilityai/stable-diffusion-x4-upscaler"
     sr_pipe = StableDiffusionUpscalePipeline.from_pretrained(
@@ -37,6 +56,9 @@ def load_sr_model(device="cuda"):
 
 
 def load_qwen_model():
+    import torch
+    from transformers import Qwen3VLForConditionalGeneration, AutoProcessor
+
     print("Loading Qwen3-VL-32B model...", flush=True)
     qwen_id = "Qwen/Qwen3-VL-32B-Instruct"
 
@@ -60,7 +82,14 @@ def load_qwen_model():
 
 # ---------- IMAGE DISCOVERY / SAMPLING ----------
 
-def collect_images_per_sm(base_input: Path):
+def collect_images_per_sm(base_input: Path, manifest_db: str | None = MANIFEST_DB):
+    if manifest_db:
+        # Query the pipelines.manifest index instead of re-walking every SM folder
+        from pipelines.manifest import open_manifest
+        with open_manifest(manifest_db, str(base_input)) as m:
+            by_sm = m.paths_by_sm(str(base_input), exts={".jpg", ".jpeg", ".png"})
+        return {sm: [Path(p) for p in by_sm[sm]] for sm in sorted(by_sm)}
+
     sm_dirs = [d for d in base_input.iterdir() if d.is_dir() and d.name.startswith("SM_")]
     sm_dirs = sorted(sm_dirs)
 
@@ -78,97 +107,156 @@ def collect_images_per_sm(base_input: Path):
 
 
 def sample_images(sm_to_images, samples_per_batch: int, seed: int = 42):
-    random.seed(seed)
-    sampled = []
-
-    for sm_name, imgs in sm_to_images.items():
-        if not imgs:
-            continue
-        k = min(samples_per_batch, len(imgs))
-        picked = random.sample(imgs, k)
-        for p in picked:
-            sampled.append((sm_name, p))
-
-    return sampled
+    # One reservoir per SM folder; the same lists and seed always give the same sample
+    items = ((sm_name, p) for sm_name, imgs in sm_to_images.items() for p in imgs)
+    sample = stratified_sample(items, samples_per_batch, strata=lambda item: item[0], seed=seed)
+    return [pair for pairs in sample.values() for pair in pairs]
 
 
 # ---------- SUPER-RESOLUTION + QWEN METRICS ----------
 
-def upscale_image(sr_pipe, in_path: Path, base_input: Path, base_output: Path):
-    img = Image.open(in_path).convert("RGB")
+def sd_upscaler(sr_pipe):
+    """Wrap the diffusers pipeline as a plain PIL -> PIL callable."""
+    def upscale(img):
+        return sr_pipe(prompt="", image=img).images[0]
+    return upscale
 
-    # OPTIONAL: downscale before upscaling to save memory
-    # img.thumbnail((512, 512), Image.LANCZOS)
 
-    result = sr_pipe(prompt="", image=img)
-    enhanced = result.images[0]
+def upscale_image(upscale_fn, in_path: Path, base_input: Path, base_output: Path,
+                  tile: int = TILE_SIZE, overlap: int = TILE_OVERLAP):
+    img = Image.open(in_path).convert("RGB")
 
     rel_path = in_path.relative_to(base_input)
     out_path = base_output / rel_path
-
     out_path.parent.mkdir(parents=True, exist_ok=True)
+
+    if tile:
+        # Peak memory follows the tile size, not the x4 output size
+        out_path = out_path.with_suffix(".png")
+        tiled_upscale(img, upscale_fn, tile=tile, overlap=overlap, out_path=str(out_path))
+        return out_path
+
+    enhanced = upscale_fn(img)
     enhanced.save(out_path)
 
     return out_path
 
 
 def qwen_rate_pair(qwen_model, qwen_processor, low_path: Path, enhanced_path: Path):
+    """Single-pair convenience wrapper around BatchJudge (schema-checked, with retries)."""
     low_img = Image.open(low_path).convert("RGB")
     enh_img = Image.open(enhanced_path).convert("RGB")
+    return BatchJudge(qwen_model, qwen_processor, batch_size=1).rate_pairs([(low_img, enh_img)])[0]
 
-    system_prompt = (
-        "You are an image quality judge focusing on super-resolution. "
-        "Compare Image A (low-res input) and Image B (enhanced output). "
-        "Return a strict JSON object like:\n"
-        '{"sharpness_gain": float, "noise_level": float, "artifact_level": float, '
-        '"overall_improvement": float, "short_reason": \"...\"}\n'
-        "Use scores from 1 (worst) to 10 (best)."
-    )
 
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {
-            "role": "user",
-            "content": [
-                {"type": "image", "image": low_img},
-                {"type": "image", "image": enh_img},
-                {
-                    "type": "text",
-                    "text": "Compare the first (low-res) and second (enhanced) images.",
-                },
-            ],
-        },
-    ]
-
-    inputs = qwen_processor(messages, return_tensors="pt").to(qwen_model.device)
-
-    with torch.no_grad():
-        out_ids = qwen_model.generate(
-            **inputs,
-            max_new_tokens=256,
-            temperature=0.2,
-        )
+# ---------- PHASES (run by pipelines.jobqueue, one setup per worker process) ----------
+
+def worker_device(worker: int) -> str:
+    import torch
+
+    if not torch.cuda.is_available():
+        return "cpu"
+    return f"cuda:{worker % torch.cuda.device_count()}"
+
+
+def _upscale_handler(upscale_fn, tile, overlap):
+    def handle(job):
+        payload = job["payload"]
+        out_path = upscale_image(upscale_fn, Path(payload["input_path"]),
+                                 Path(payload["base_input"]), Path(payload["base_output"]),
+                                 tile=tile, overlap=overlap)
+        return {"enhanced_path": str(out_path)}
+    return handle
+
 
-    text = qwen_processor.batch_decode(out_ids, skip_special_tokens=True)[0]
+def sd_upscale_setup(worker: int, tile: int = TILE_SIZE, overlap: int = TILE_OVERLAP):
+    sr_pipe = load_sr_model(device=worker_device(worker))
+    return _upscale_handler(sd_upscaler(sr_pipe), tile, overlap)
 
-    start = text.find("{")
-    end = text.rfind("}")
-    if start == -1 or end == -1:
-        return {"raw_response": text}
 
-    try:
-        parsed = json.loads(text[start: end + 1])
-    except Exception:
-        parsed = {"raw_response": text}
+def lanczos_upscale_setup(worker: int, tile: int = TILE_SIZE, overlap: int = TILE_OVERLAP):
+    return _upscale_handler(lanczos_upscale, tile, overlap)
+
+
+def load_pairs(jobs):
+    pairs = []
+    for job in jobs:
+        low = Image.open(job["payload"]["input_path"]).convert("RGB")
+        enhanced = Image.open(job["results"]["upscale"]["enhanced_path"]).convert("RGB")
+        pairs.append((low, enhanced))
+    return pairs
+
+
+def qwen_judge_setup(worker: int, batch_size: int = JUDGE_BATCH_SIZE):
+    qwen_model, qwen_processor = load_qwen_model()
+    judge = BatchJudge(qwen_model, qwen_processor, batch_size=batch_size)
+
+    def handle(jobs):
+        scores = judge.rate_pairs(load_pairs(jobs))
+        # Unparseable after retries: fail the job so a later run asks again
+        return [ValueError(f"{sc['error']}: {sc['raw_response'][:200]!r}") if "error" in sc else sc
+                for sc in scores]
+    return handle
 
-    return parsed
+
+def stub_judge_setup(worker: int, batch_size: int = JUDGE_BATCH_SIZE):
+    def handle(jobs):
+        return [stub_judge(low, enhanced) for low, enhanced in load_pairs(jobs)]
+    return handle
+
+
+UPSCALERS = {"sd": sd_upscale_setup, "lanczos": lanczos_upscale_setup}
+JUDGES = {"qwen": qwen_judge_setup, "stub": stub_judge_setup}
+
+
+def free_gpu():
+    if "torch" in sys.modules:
+        import torch
+
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+
+def export_metrics(queue: JobQueue, metrics_log: Path):
+    """Rewrite METRICS_LOG from the queue (all judged images), replacing it atomically."""
+    metrics_log.parent.mkdir(parents=True, exist_ok=True)
+    tmp = metrics_log.with_suffix(metrics_log.suffix + ".tmp")
+    n = 0
+    with tmp.open("w") as f_log:
+        for job in queue.done("judge"):
+            record = {
+                "batch": job["payload"]["batch"],
+                "input_path": job["payload"]["input_path"],
+                "enhanced_path": job["results"]["upscale"]["enhanced_path"],
+                "scores": job["results"]["judge"],
+            }
+            f_log.write(json.dumps(record) + "\n")
+            n += 1
+    os.replace(tmp, metrics_log)
+    return n
 
 
 # ---------- MAIN PIPELINE (2 PHASES) ----------
 
 def main():
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    print(f"Using device: {device}", flush=True)
+    parser = argparse.ArgumentParser(
+        description="Sample images per SM, super-resolve them (phase 1), judge the pairs (phase 2). "
+                    "Progress is kept in QUEUE_DB, so a rerun resumes where it stopped."
+    )
+    parser.add_argument("--phase", choices=["all", "upscale", "judge"], default="all")
+    parser.add_argument("--upscaler", choices=sorted(UPSCALERS), default="sd")
+    parser.add_argument("--judge", choices=sorted(JUDGES), default="qwen")
+    parser.add_argument("--judge-batch-size", type=int, default=JUDGE_BATCH_SIZE,
+                        help="Image pairs per judge generate() call")
+    parser.add_argument("--tile", type=int, default=TILE_SIZE,
+                        help="Upscale in tiles of this many input pixels (0 = whole image)")
+    parser.add_argument("--tile-overlap", type=int, default=TILE_OVERLAP)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes per phase (images are sharded by path)")
+    parser.add_argument("--queue-db", type=Path, default=QUEUE_DB)
+    parser.add_argument("--rerun", choices=["upscale", "judge"], default=None,
+                        help="Forget a phase's results before running (e.g. after changing the judge)")
+    args = parser.parse_args()
 
     print(f"Scanning images under: {BASE_INPUT}", flush=True)
     sm_to_images = collect_images_per_sm(BASE_INPUT)
@@ -183,46 +271,40 @@ def main():
         print("No images found to process. Exiting.")
         return
 
-    METRICS_LOG.parent.mkdir(parents=True, exist_ok=True)
-    if METRICS_LOG.exists():
-        METRICS_LOG.unlink()  # start fresh
+    queue_db = str(args.queue_db)
+    with JobQueue(queue_db) as queue:
+        added = queue.add(
+            (str(p), {"batch": sm_name, "input_path": str(p),
+                      "base_input": str(BASE_INPUT), "base_output": str(BASE_OUTPUT)})
+            for sm_name, p in sampled_pairs
+        )
+        if args.rerun:
+            queue.reset(args.rerun)
+            if args.rerun == "upscale":
+                queue.reset("judge")
+        print(f"Queue {queue_db}: {added} new jobs, upscale {queue.counts('upscale')}, "
+              f"judge {queue.counts('judge')}", flush=True)
 
     # -------- PHASE 1: SUPER-RESOLUTION ONLY --------
-    print("=== PHASE 1: Running SD Upscale on sampled images ===", flush=True)
-    sr_pipe = load_sr_model(device=device)
-
-    enhanced_paths = {}  # map from input path -> enhanced path
-
-    for sm_name, img_path in tqdm(sampled_pairs, desc="Super-resolving", ncols=100):
-        enhanced_path = upscale_image(sr_pipe, img_path, BASE_INPUT, BASE_OUTPUT)
-        enhanced_paths[str(img_path)] = str(enhanced_path)
-
-    # Free SR model from GPU
-    del sr_pipe
-    torch.cuda.empty_cache()
-    print("Freed SD Upscaler from GPU.", flush=True)
-
-    # -------- PHASE 2: QWEN SCORING ONLY --------
-    print("=== PHASE 2: Scoring enhanced images with Qwen ===", flush=True)
-    qwen_model, qwen_processor = load_qwen_model()
-
-    with METRICS_LOG.open("w") as f_log:
-        for sm_name, img_path in tqdm(sampled_pairs, desc="Scoring with Qwen", ncols=100):
-            input_str = str(img_path)
-            enhanced_path = enhanced_paths[input_str]
-
-            scores = qwen_rate_pair(qwen_model, qwen_processor, img_path, Path(enhanced_path))
-
-            record = {
-                "batch": sm_name,
-                "input_path": input_str,
-                "enhanced_path": enhanced_path,
-                "scores": scores,
-            }
-            f_log.write(json.dumps(record) + "\n")
-
-    print(f"Done. Metrics written to: {METRICS_LOG}", flush=True)
+    if args.phase in ("all", "upscale"):
+        print(f"=== PHASE 1: upscaling sampled images ({args.upscaler}) ===", flush=True)
+        setup = partial(UPSCALERS[args.upscaler], tile=args.tile, overlap=args.tile_overlap)
+        stats = run_phase(queue_db, "upscale", setup, workers=args.workers)
+        print(f"Phase 1: {stats}", flush=True)
+        free_gpu()
+
+    # -------- PHASE 2: JUDGE SCORING ONLY --------
+    if args.phase in ("all", "judge"):
+        print(f"=== PHASE 2: scoring enhanced images ({args.judge}) ===", flush=True)
+        setup = partial(JUDGES[args.judge], batch_size=args.judge_batch_size)
+        stats = run_phase(queue_db, "judge", setup, after="upscale", workers=args.workers,
+                          batch_size=args.judge_batch_size)
+        print(f"Phase 2: {stats}", flush=True)
+
+    with JobQueue(queue_db) as queue:
+        n = export_metrics(queue, METRICS_LOG)
+    print(f"Done. {n} records in: {METRICS_LOG}", flush=True)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 import os
 import csv
-from PIL import Image
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pipelines.grayscale import analyze_file  # noqa: E402  (shared B/W detector)
 
 # -------- CONFIGURE THESE --------
 ROOT_DIR = r"/home/hice1/kpanchal30/scratch/stone mt camera full/Camera Trap Photos/Processed_Images/SM_1/20250329"
@@ -9,48 +12,9 @@ OUTPUT_CSV = "sm1_20250329_image_stats.csv"
 # ---------------------------------
 
 
-def is_grayscale(img, tolerance=3, min_gray_fraction=0.95):
-    """
-    Decide if an image is effectively black & white (grayscale).
-
-    - If mode is 'L', '1', or 'LA', treat as grayscale.
-    - Otherwise convert to RGB and sample pixels.
-    - If at least `min_gray_fraction` of sampled pixels have
-      |R-G|, |G-B|, |R-B| <= tolerance, treat as grayscale.
-    """
-    if img.mode in ("1", "L", "LA"):
-        return True
-
-    rgb = img.convert("RGB")
-    width, height = rgb.size
-
-    step_x = max(1, width // 32)
-    step_y = max(1, height // 32)
-
-    total = 0
-    gray_like = 0
-
-    for y in range(0, height, step_y):
-        for x in range(0, width, step_x):
-            r, g, b = rgb.getpixel((x, y))
-            total += 1
-            if (abs(r - g) <= tolerance and
-                abs(g - b) <= tolerance and
-                abs(r - b) <= tolerance):
-                gray_like += 1
-
-    if total == 0:
-        return False
-
-    fraction = gray_like / total
-    return fraction >= min_gray_fraction
-
 def analyze_image(path):
     """Return (width, height, is_bw) for a given image path."""
-    with Image.open(path) as img:
-        width, height = img.size
-        bw = is_grayscale(img)
-    return width, height, bw
+    return analyze_file(path)
 
 
 def main():
@@ -1,24 +1,32 @@
 from pathlib import Path
-from PIL import Image
+
+from pipelines.dataset import decode_rgb
 
 # use the storage path (or os.environ["SCRATCH"])
 DATA_ROOT = "/storage/ice1/1/8/kpanchal30/stone mt camera full/ProjectInfo/Best Photos"
 VALID_EXTS = {".jpg", ".jpeg", ".png"}  # lower-case set
 
-def load_images(root):
+MANIFEST_DB = ""  # optional pipelines.manifest index; empty = walk the disk
+MIN_SIZE = None  # e.g. (256, 256): decode at 1/2..1/8 scale for classifiers; None = full frames
+
+def load_images(root, manifest_db=MANIFEST_DB, min_size=MIN_SIZE):
     root = Path(root)
     if not root.exists():
         print(f"Path does not exist: {root}")
         return []
 
-    img_paths = [p for p in root.rglob("*") if p.is_file() and p.suffix.lower() in VALID_EXTS]
+    if manifest_db:
+        from pipelines.manifest import open_manifest
+        with open_manifest(manifest_db, str(root)) as m:
+            img_paths = [Path(p) for p in m.paths(str(root), exts=VALID_EXTS, include_errors=True)]
+    else:
+        img_paths = [p for p in root.rglob("*") if p.is_file() and p.suffix.lower() in VALID_EXTS]
     print(f"Found {len(img_paths)} images")
 
     images = []
     for p in img_paths:
         try:
-            with Image.open(p) as im:
-                img = im.convert("RGB")
+            img = decode_rgb(p, min_size)
             images.append((p, img))
             print(f"Loaded {p} | size={img.size}")
         except Exception as e:
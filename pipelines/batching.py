@@ -0,0 +1,89 @@
+import queue
+import threading
+import time
+
+_DONE = object()
+
+
+def iter_micro_batches(stream, max_batch: int = 8, max_wait_s: float | None = None):
+    """
+    Group an iterable of (path, image) pairs into lists of at most `max_batch` items.
+
+    If max_wait_s is set, a batch is also flushed once its first item has waited that
+    long, so a slow producer never stalls the model on a half-filled batch. The stream
+    is then read on a background thread; order is always preserved.
+    """
+    max_batch = max(1, max_batch)
+    if max_wait_s is None:
+        batch = []
+        for item in stream:
+            batch.append(item)
+            if len(batch) >= max_batch:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+        return
+
+    q = queue.Queue(maxsize=max_batch * 2)
+    stop = threading.Event()
+
+    def pump():
+        try:
+            for item in stream:
+                while not stop.is_set():
+                    try:
+                        q.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+        except Exception as e:
+            q.put(e)
+        q.put(_DONE)
+
+    t = threading.Thread(target=pump, daemon=True)
+    t.start()
+    batch = []
+    deadline = None
+    try:
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = q.get(timeout=timeout)
+            except queue.Empty:
+                yield batch
+                batch, deadline = [], None
+                continue
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            batch.append(item)
+            if deadline is None:
+                deadline = time.monotonic() + max_wait_s
+            if len(batch) >= max_batch:
+                yield batch
+                batch, deadline = [], None
+        if batch:
+            yield batch
+    finally:
+        stop.set()
+
+
+def predict_stream(model, stream, batch_size: int | None = None, max_wait_s: float | None = None):
+    """
+    Run model.predict_batch over micro-batches of (path, image) pairs.
+    Yields (path, image, prediction) in input order.
+    """
+    batch_size = batch_size or getattr(model, "batch_size", 1)
+    for batch in iter_micro_batches(stream, batch_size, max_wait_s):
+        paths = [p for p, _ in batch]
+        images = [im for _, im in batch]
+        preds = model.predict_batch(paths, images)
+        if len(preds) != len(batch):
+            raise ValueError(f"{type(model).__name__}.predict_batch returned {len(preds)} "
+                             f"results for {len(batch)} inputs")
+        for (p, im), pred in zip(batch, preds):
+            yield p, im, pred
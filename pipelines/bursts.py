@@ -0,0 +1,156 @@
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from PIL import Image
+
+from .exif_utils import fast_exif_datetime
+from .manifest import sm_location
+from .prefetch import prefetch_map
+
+
+def dhash(img, hash_size: int = 8) -> int:
+    """64-bit difference hash: compares neighbouring pixels of a (9x8) grayscale thumbnail."""
+    small = img.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    px = small.tobytes()
+    bits = 0
+    w = hash_size + 1
+    for y in range(hash_size):
+        row = px[y * w:(y + 1) * w]
+        for x in range(hash_size):
+            bits = (bits << 1) | (row[x] > row[x + 1])
+    return bits
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def frame_signature(path: str) -> Dict[str, Any]:
+    """Capture time (EXIF), camera location and perceptual hash for one frame."""
+    path = str(path)  # Path from iter_image_paths; the loaders key predictions by str
+    dt, _ = fast_exif_datetime(path)
+    with Image.open(path) as im:
+        im.draft("L", (64, 64))  # JPEG DCT-scaled decode; a dHash needs very few pixels
+        h = dhash(im)
+    return {"path": path, "sm": sm_location(path), "capture_dt": dt, "dhash": h}
+
+
+def frame_signatures(paths, workers: int = 8) -> List[Dict[str, Any]]:
+    sigs = []
+    for p, fut in prefetch_map(frame_signature, paths, workers=workers, depth=workers * 8):
+        try:
+            sigs.append(fut.result())
+        except Exception:
+            sigs.append({"path": str(p), "sm": sm_location(str(p)), "capture_dt": None, "dhash": None})
+    return sigs
+
+
+def group_bursts(frames: List[Dict[str, Any]], max_gap_s: float = 60.0,
+                 max_hamming: int = 12) -> List[List[Dict[str, Any]]]:
+    """
+    Split frames into trigger bursts: same SM location, consecutive capture times no
+    more than max_gap_s apart, and dHashes within max_hamming bits of the previous
+    frame. Frames without a capture time or hash become single-frame bursts.
+    """
+    by_sm: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    singles = []
+    for f in frames:
+        if f.get("capture_dt") is None or f.get("dhash") is None:
+            singles.append([f])
+        else:
+            by_sm.setdefault(f.get("sm"), []).append(f)
+
+    bursts = []
+    for sm in sorted(by_sm, key=lambda s: s or ""):
+        seq = sorted(by_sm[sm], key=lambda f: (f["capture_dt"], f["path"]))
+        cur = [seq[0]]
+        for prev, f in zip(seq, seq[1:]):
+            gap = (f["capture_dt"] - prev["capture_dt"]).total_seconds()
+            if gap <= max_gap_s and hamming(f["dhash"], prev["dhash"]) <= max_hamming:
+                cur.append(f)
+            else:
+                bursts.append(cur)
+                cur = [f]
+        bursts.append(cur)
+    return bursts + singles
+
+
+def keyframe_indices(n: int, keyframes: int = 1) -> List[int]:
+    """Evenly spaced keyframes; with keyframes=1 this is the middle frame."""
+    k = max(1, min(keyframes, n))
+    return sorted({int((i + 0.5) * n / k) for i in range(k)})
+
+
+def burst_id(burst: List[Dict[str, Any]], index: int) -> str:
+    first = burst[0]
+    dt = first.get("capture_dt")
+    stamp = dt.strftime("%Y%m%d_%H%M%S") if isinstance(dt, datetime) else "nodate"
+    return f"{first.get('sm') or 'SM_?'}-{stamp}-{index:05d}"
+
+
+def predict_bursts(model, bursts: List[List[Dict[str, Any]]], keyframes: int = 1,
+                   batch_size: Optional[int] = None, **loader_kwargs):
+    """
+    Run `model` only on the keyframes of each burst and copy each keyframe's prediction
+    to the frames nearest to it. Every frame's `same_individual` is set to its burst id.
+    A keyframe that fails to decode is replaced by the nearest untried frame of its
+    burst; frames left without a prediction (unreadable, or in a burst with no readable
+    frame) are listed in stats["unpredicted"] so callers can rerun them.
+    Returns (predictions {path: dict}, stats).
+    """
+    from .batching import predict_stream
+    from .dataset import iter_images_from_paths
+
+    plan = {bi: keyframe_indices(len(b), keyframes) for bi, b in enumerate(bursts) if b}
+    tried = {bi: set(pos) for bi, pos in plan.items()}
+    todo = [str(bursts[bi][i]["path"]) for bi, pos in plan.items() for i in pos]
+    key_preds = {}
+    inferences = 0
+    while todo:
+        inferences += len(todo)
+        stream = iter_images_from_paths(todo, **loader_kwargs)
+        for p, _, pred in predict_stream(model, stream, batch_size):
+            key_preds[p] = pred
+        todo = []
+        for bi, pos in plan.items():
+            burst = bursts[bi]
+            for i in [i for i in pos if str(burst[i]["path"]) not in key_preds]:
+                pos.remove(i)
+                untried = [j for j in range(len(burst)) if j not in tried[bi]]
+                if untried:
+                    j = min(untried, key=lambda j: abs(j - i))
+                    tried[bi].add(j)
+                    pos.append(j)
+                    todo.append(str(burst[j]["path"]))
+            pos.sort()
+
+    out = {}
+    unpredicted = []
+    for bi, pos in plan.items():
+        burst = bursts[bi]
+        bid = burst_id(burst, bi)
+        for i, f in enumerate(burst):
+            path = str(f["path"])
+            if not pos or (i in tried[bi] and i not in pos):
+                unpredicted.append(path)  # unreadable, or no readable frame in the burst
+                continue
+            nearest = min(pos, key=lambda k: abs(k - i))
+            src = str(burst[nearest]["path"])
+            pred = dict(key_preds[src])
+            pred["same_individual"] = bid
+            if i != nearest:
+                note = pred.get("notes") or ""
+                pred["notes"] = f"{note} [burst: from {os.path.basename(src)}]".strip()
+            out[path] = pred
+
+    frames = sum(len(b) for b in bursts)
+    stats = {
+        "frames": frames,
+        "bursts": len(bursts),
+        "inferences": inferences,
+        "inferences_saved": frames - inferences,
+        "saved_fraction": (frames - inferences) / frames if frames else 0.0,
+        "unpredicted": unpredicted,
+    }
+    return out, stats
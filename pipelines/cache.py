@@ -0,0 +1,255 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, List, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    content_hash  TEXT NOT NULL,
+    model_name    TEXT NOT NULL,
+    settings_hash TEXT NOT NULL,
+    result_json   TEXT NOT NULL,
+    nbytes        INTEGER NOT NULL,
+    last_used     REAL NOT NULL,
+    PRIMARY KEY (content_hash, model_name, settings_hash)
+);
+CREATE INDEX IF NOT EXISTS results_last_used ON results(last_used);
+CREATE INDEX IF NOT EXISTS results_model ON results(model_name);
+CREATE TABLE IF NOT EXISTS file_hashes (
+    path         TEXT PRIMARY KEY,
+    size         INTEGER NOT NULL,
+    mtime_ns     INTEGER NOT NULL,
+    content_hash TEXT NOT NULL
+);
+"""
+
+
+def settings_hash(settings: Dict[str, Any] | None) -> str:
+    blob = json.dumps(settings or {}, sort_keys=True, default=str)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+def file_content_hash(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    On-disk SQLite cache of per-image predictions.
+
+    Key: (file content hash, model name as passed to make_model, hash of settings).
+    Content hashes are memoised per (path, size, mtime) so unchanged files are not
+    re-read. When the stored results exceed max_bytes, least recently used rows
+    are evicted. New hashes, new results and last_used updates are buffered and
+    written in one transaction every `commit_every` rows, per partition() and on
+    close(); a crash loses at most that many rows, which are simply recomputed.
+    """
+
+    def __init__(self, db_path: str, max_bytes: int = 512 * 1024 * 1024,
+                 commit_every: int = 500, timeout: float = 60.0):
+        parent = os.path.dirname(db_path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.commit_every = max(1, commit_every)
+        self.conn = sqlite3.connect(db_path, timeout=timeout)
+        self.conn.executescript(_SCHEMA)
+        self._bytes = self.total_bytes()
+        # Not yet written: path -> file_hashes row, result key -> results row,
+        # result key -> time of the last hit
+        self._hashes: Dict[str, tuple] = {}
+        self._results: Dict[tuple, tuple] = {}
+        self._touched: Dict[tuple, float] = {}
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------- hashing ----------
+
+    def content_hash(self, path: str) -> str:
+        st = os.stat(path)
+        row = self._hashes.get(path)
+        if row is not None:
+            row = row[1:]
+        else:
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, content_hash FROM file_hashes WHERE path = ?", (path,)
+            ).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return row[2]
+        digest = file_content_hash(path)
+        self._hashes[path] = (path, st.st_size, st.st_mtime_ns, digest)
+        self._maybe_flush()
+        return digest
+
+    # ---------- lookups ----------
+
+    def get(self, path: str, model_name: str, settings: Dict[str, Any] | None):
+        key = (self.content_hash(path), model_name, settings_hash(settings))
+        if key in self._results:
+            row = (self._results[key][3],)
+        else:
+            row = self.conn.execute(
+                "SELECT result_json FROM results "
+                "WHERE content_hash = ? AND model_name = ? AND settings_hash = ?", key
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._touched[key] = time.time()
+        return json.loads(row[0])
+
+    def flush(self):
+        """Write buffered hashes, results and last_used times in one transaction."""
+        if not (self._hashes or self._results or self._touched):
+            return
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?)",
+                                  list(self._hashes.values()))
+            self.conn.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                                  list(self._results.values()))
+            self.conn.executemany(
+                "UPDATE results SET last_used = ? "
+                "WHERE content_hash = ? AND model_name = ? AND settings_hash = ?",
+                [(t, *key) for key, t in self._touched.items()],
+            )
+        self._hashes, self._results, self._touched = {}, {}, {}
+
+    def _maybe_flush(self):
+        if len(self._hashes) + len(self._results) >= self.commit_every:
+            self.flush()
+
+    def partition(self, paths: Iterable[str], model_name: str,
+                  settings: Dict[str, Any] | None) -> Tuple[Dict[str, Dict], List[str]]:
+        """Split paths into ({path: cached result}, [paths that still need inference])."""
+        cached, todo = {}, []
+        for p in paths:
+            p = str(p)
+            try:
+                res = self.get(p, model_name, settings)
+            except OSError:
+                res = None
+            if res is None:
+                todo.append(p)
+            else:
+                cached[p] = res
+        self.flush()
+        return cached, todo
+
+    def put(self, path: str, model_name: str, settings: Dict[str, Any] | None,
+            result: Dict[str, Any]):
+        from .crops import serializable_prediction
+
+        blob = json.dumps(serializable_prediction(result), default=str)
+        key = (self.content_hash(path), model_name, settings_hash(settings))
+        if key in self._results:
+            old = (self._results[key][4],)
+        else:
+            old = self.conn.execute(
+                "SELECT nbytes FROM results "
+                "WHERE content_hash = ? AND model_name = ? AND settings_hash = ?", key
+            ).fetchone()
+        self._results[key] = (*key, blob, len(blob), time.time())
+        self._touched.pop(key, None)
+        self._bytes += len(blob) - (old[0] if old else 0)
+        if self._bytes > self.max_bytes:
+            self.evict()
+        else:
+            self._maybe_flush()
+
+    # ---------- maintenance ----------
+
+    def total_bytes(self) -> int:
+        return self.conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM results").fetchone()[0]
+
+    def evict(self):
+        """Drop least recently used results until the cache fits in max_bytes."""
+        self.flush()
+        self._bytes = self.total_bytes()
+        excess = self._bytes - self.max_bytes
+        if excess <= 0:
+            return 0
+        removed = 0
+        freed = 0
+        rows = self.conn.execute(
+            "SELECT rowid, nbytes FROM results ORDER BY last_used ASC"
+        ).fetchall()
+        doomed = []
+        for rowid, nbytes in rows:
+            if freed >= excess:
+                break
+            doomed.append((rowid,))
+            freed += nbytes
+            removed += 1
+        with self.conn:
+            self.conn.executemany("DELETE FROM results WHERE rowid = ?", doomed)
+        self._bytes -= freed
+        return removed
+
+    def invalidate(self, model_name: str, settings: Dict[str, Any] | None = None) -> int:
+        """Drop cached results for a model (optionally only for one settings dict)."""
+        self.flush()
+        with self.conn:
+            if settings is None:
+                cur = self.conn.execute("DELETE FROM results WHERE model_name = ?", (model_name,))
+            else:
+                cur = self.conn.execute(
+                    "DELETE FROM results WHERE model_name = ? AND settings_hash = ?",
+                    (model_name, settings_hash(settings)),
+                )
+        self._bytes = self.total_bytes()
+        return cur.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        self.flush()
+        total = self.hits + self.misses
+        n = self.conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+            "entries": n,
+            "bytes": self._bytes,
+        }
+
+
+def predict_with_cache(model, paths: Iterable[str], cache: ResultCache, model_cfg: dict,
+                       batch_size: int | None = None, open_images=None, **loader_kwargs):
+    """
+    Yield (path, prediction) for every path, running `model` only on images that are
+    new or changed since the last run. Cached results come first, then fresh ones.
+    open_images(paths) -> (path, image) stream for the uncached paths; by default
+    iter_images_from_paths(paths, **loader_kwargs) (workers, prefetch, ...).
+    """
+    from .batching import predict_stream
+    from .dataset import iter_images_from_paths
+
+    name = (model_cfg.get("name") or "baseline").lower()
+    settings = model_cfg.get("settings", {})
+    cached, todo = cache.partition(paths, name, settings)
+    for p, res in cached.items():
+        yield p, res
+    if open_images is not None:
+        stream = open_images(todo)
+    else:
+        stream = iter_images_from_paths(todo, **loader_kwargs)
+    for p, _, pred in predict_stream(model, stream, batch_size):
+        cache.put(p, name, settings, pred)
+        yield p, pred
@@ -0,0 +1,165 @@
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from .batching import iter_micro_batches
+from .crops import aggregate_crop_predictions, crop_detections
+from .models import make_model
+from .prefetch import prefetch_map
+
+
+def passes(pred: Dict[str, Any], threshold: Optional[float]) -> bool:
+    """
+    Gate a frame on a stage's prediction. Models report confidence as pred["score"];
+    a model that reports none cannot gate, so its frames always pass.
+    """
+    if threshold is None:
+        return True
+    score = pred.get("score")
+    if score is None or score == "":
+        return True
+    return float(score) >= threshold
+
+
+def merge_predictions(base: Optional[Dict[str, Any]], new: Dict[str, Any]) -> Dict[str, Any]:
+    """Later stages refine earlier ones: non-empty fields win, notes are chained."""
+    if base is None:
+        return dict(new)
+    out = dict(base)
+    for k, v in new.items():
+        if k == "notes":
+            out[k] = "|".join(n for n in (base.get("notes"), v) if n)
+        elif v not in ("", None) and v != []:
+            out[k] = v
+    return out
+
+
+class Stage:
+    def __init__(self, cfg: Dict[str, Any], paths: Dict[str, str]):
+        self.name = (cfg.get("name") or "baseline").lower()
+        self.model = make_model({"name": self.name, "paths": paths,
+                                 "settings": cfg.get("settings", {})})
+        self.batch_size = int(cfg.get("batch_size") or self.model.batch_size)
+        self.workers = max(1, int(cfg.get("workers", 1)))
+        self.threshold = cfg.get("threshold")
+        self.max_wait_s = cfg.get("max_wait_s")
+        # input: frame (default) or crops, i.e. the boxes an earlier detector stage found,
+        # cut from the in-memory frame so there is no render/re-encode round trip
+        self.input = cfg.get("input", "frame")
+        self.padding = int(cfg.get("padding", 10))
+        self.min_box_score = float(cfg.get("min_box_score", 0.0))
+        self.apply_mask = bool(cfg.get("apply_mask", False))
+        self.stats = {"name": self.name, "frames_in": 0, "frames_passed": 0,
+                      "batches": 0, "busy_s": 0.0}
+
+    def _run_batch(self, batch):
+        t0 = time.perf_counter()
+        if self.input == "crops":
+            preds = self._predict_crops(batch)
+        else:
+            preds = self.model.predict_batch([p for p, _, _ in batch], [im for _, im, _ in batch])
+        return preds, time.perf_counter() - t0
+
+    def _predict_crops(self, batch):
+        items = []  # (frame index, detection, crop id, crop image)
+        for fi, (p, im, merged) in enumerate(batch):
+            crops = crop_detections(im, merged or {}, self.padding, self.min_box_score,
+                                    self.apply_mask)
+            for ci, (det, crop) in enumerate(crops):
+                items.append((fi, det, f"{p}#crop{ci}", crop))
+        crop_preds = []
+        for i in range(0, len(items), self.batch_size):
+            chunk = items[i:i + self.batch_size]
+            crop_preds += self._checked(self.model.predict_batch([c[2] for c in chunk],
+                                                                 [c[3] for c in chunk]), chunk)
+        per_frame = [[] for _ in batch]
+        for (fi, det, _, _), pred in zip(items, crop_preds):
+            per_frame[fi].append((det, pred))
+        return [aggregate_crop_predictions(self.name, pairs) for pairs in per_frame]
+
+    def _checked(self, preds, inputs):
+        if len(preds) != len(inputs):
+            raise ValueError(f"{type(self.model).__name__}.predict_batch returned {len(preds)} "
+                             f"results for {len(inputs)} inputs (stage {self.name})")
+        return preds
+
+    def run(self, stream):
+        """
+        stream yields (path, image, merged_pred_or_None). Yields (path, image, merged,
+        passed) for every input, in order, running predict_batch on `workers` threads.
+        """
+        batches = iter_micro_batches(stream, self.batch_size, self.max_wait_s)
+        for batch, fut in prefetch_map(self._run_batch, batches, workers=self.workers,
+                                       depth=self.workers * 2):
+            preds, busy = fut.result()
+            self._checked(preds, batch)
+            self.stats["batches"] += 1
+            self.stats["busy_s"] += busy
+            for (p, im, merged), pred in zip(batch, preds):
+                self.stats["frames_in"] += 1
+                ok = passes(pred, self.threshold)
+                if self.input == "crops" and not pred.get("detections"):
+                    ok = False  # nothing was detected, so there is nothing to classify
+                self.stats["frames_passed"] += ok
+                yield p, im, merge_predictions(merged, pred), ok
+
+
+class Cascade:
+    """
+    Chain of models from config; each stage only sees frames the previous stage
+    passed above its confidence threshold. Example config:
+
+        cascade:
+          - {name: yolov7, batch_size: 16, workers: 2, threshold: 0.4}
+          - {name: clip, batch_size: 32, workers: 1, input: crops}
+    """
+
+    def __init__(self, stage_cfgs: List[Dict[str, Any]], paths: Optional[Dict[str, str]] = None):
+        if not stage_cfgs:
+            raise ValueError("cascade needs at least one stage")
+        self.stages = [Stage(cfg, paths or {}) for cfg in stage_cfgs]
+        self.wall_s = 0.0
+
+    @classmethod
+    def from_config(cls, model_cfg: Dict[str, Any]) -> "Cascade":
+        return cls(model_cfg.get("cascade", []), model_cfg.get("paths", {}))
+
+    def run(self, images):
+        """
+        images yields (path, image) as from iter_images. Yields (path, prediction) for
+        every frame once it leaves the cascade, either rejected by a stage or after the
+        last one. Output order follows completion, not input order.
+        """
+        t0 = time.perf_counter()
+        stopped = deque()
+        last = len(self.stages) - 1
+
+        def gate(stream, stage_idx):
+            for p, im, merged, ok in stream:
+                if stage_idx == last or ok:
+                    yield p, im, merged
+                else:
+                    stopped.append((p, merged))
+
+        stream = ((p, im, None) for p, im in images)
+        for i, stage in enumerate(self.stages):
+            stream = gate(stage.run(stream), i)
+        for p, _, merged in stream:
+            while stopped:
+                yield stopped.popleft()
+            yield p, merged
+        while stopped:
+            yield stopped.popleft()
+        self.wall_s = time.perf_counter() - t0
+
+    def report(self) -> Dict[str, Any]:
+        stages = []
+        for s in self.stages:
+            st = dict(s.stats)
+            st["pass_rate"] = st["frames_passed"] / st["frames_in"] if st["frames_in"] else 0.0
+            st["ms_per_frame"] = 1000.0 * st["busy_s"] / st["frames_in"] if st["frames_in"] else 0.0
+            st["batch_size"] = s.batch_size
+            st["workers"] = s.workers
+            st["threshold"] = s.threshold
+            stages.append(st)
+        return {"wall_s": self.wall_s, "stages": stages}
@@ -0,0 +1,212 @@
+"""
+Camera clock corrections: per-SM offsets from camera (EXIF) time to true time, as
+versioned rules applied in one vectorized pandas pass. Python port of the Conversion
+section of DateTime_Corrections.R.
+
+    clock = ClockCorrector.from_version()            # latest rule set
+    df = clock.apply(df, dt_col="capture_dt", sm_col="sm")   # adds true_dt, clock_rule
+
+A rule is a dict: {"id", "sm", "offset_days", "start", "end", "note"}. It applies to
+frames from `sm` whose camera time lies in [start, end) (either bound may be None);
+the first matching rule wins and frames no rule matches keep their camera time.
+Corrected times are rounded to the nearest minute, like lubridate::round_date.
+"""
+import argparse
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Offsets measured against the true time when the cameras were serviced. The
+# 2022-11 set is the one in DateTime_Corrections.R (Observations_Nov21 batch):
+# SM_1 runs 84 minutes behind; SM_2..SM_5 were reset to 2017 and are off by ~5 years,
+# so their offsets only apply to frames the camera stamped in 2017.
+RULESETS: Dict[str, List[Dict[str, Any]]] = {
+    "2022-11": [
+        {"id": "SM_1@2022-11", "sm": "SM_1", "offset_days": 0.05833333, "start": None, "end": None,
+         "note": "always applied"},
+        {"id": "SM_2@2022-11", "sm": "SM_2", "offset_days": 1866.502083,
+         "start": "2017-01-01", "end": "2018-01-01", "note": "camera year 2017 only"},
+        {"id": "SM_3@2022-11", "sm": "SM_3", "offset_days": 1866.606944,
+         "start": "2017-01-01", "end": "2018-01-01", "note": "camera year 2017 only"},
+        {"id": "SM_4@2022-11", "sm": "SM_4", "offset_days": 1866.636111,
+         "start": "2017-01-01", "end": "2018-01-01", "note": "camera year 2017 only"},
+        {"id": "SM_5@2022-11", "sm": "SM_5", "offset_days": 1866.634028,
+         "start": "2017-01-01", "end": "2018-01-01", "note": "camera year 2017 only"},
+    ],
+}
+LATEST_VERSION = "2022-11"
+
+_SM_IN_PATH = r"(?:^|[\\/])(SM_\d+)(?:[\\/]|$)"
+_MINUTE = timedelta(minutes=1)
+
+
+def _bound(value) -> Optional[pd.Timestamp]:
+    return None if value in (None, "") else pd.Timestamp(value)
+
+
+class ClockCorrector:
+    def __init__(self, rules: List[Dict[str, Any]], version: Optional[str] = None):
+        self.version = version
+        self.rules = []
+        for i, r in enumerate(rules):
+            if not r.get("sm") or "offset_days" not in r:
+                raise ValueError(f"clock rule {i} needs 'sm' and 'offset_days': {r}")
+            self.rules.append({
+                "id": r.get("id") or f"{r['sm']}#{i}",
+                "sm": r["sm"],
+                "offset": pd.Timedelta(days=float(r["offset_days"])),
+                "start": _bound(r.get("start")),
+                "end": _bound(r.get("end")),
+            })
+
+    @classmethod
+    def from_version(cls, version: str = LATEST_VERSION) -> "ClockCorrector":
+        if version not in RULESETS:
+            raise KeyError(f"Unknown clock rule set {version!r}; have {sorted(RULESETS)}")
+        return cls(RULESETS[version], version)
+
+    @classmethod
+    def from_file(cls, path: str) -> "ClockCorrector":
+        """JSON or YAML file: a list of rules, or {"version": ..., "rules": [...]}."""
+        with open(path) as f:
+            if path.lower().endswith((".yaml", ".yml")):
+                import yaml
+
+                data = yaml.safe_load(f)
+            else:
+                data = json.load(f)
+        if isinstance(data, dict):
+            return cls(data.get("rules", []), data.get("version"))
+        return cls(data)
+
+    @classmethod
+    def from_config(cls, cfg) -> Optional["ClockCorrector"]:
+        """None / "" -> None, a known version name, or a path to a rules file."""
+        if not cfg:
+            return None
+        if isinstance(cfg, str) and cfg in RULESETS:
+            return cls.from_version(cfg)
+        return cls.from_file(cfg)
+
+    def offsets(self, sm: pd.Series, camera_dt: pd.Series):
+        """(offset per row as timedelta64[ns], matching rule id per row or None)."""
+        n = len(camera_dt)
+        offset = np.zeros(n, dtype="timedelta64[ns]")
+        rule_id = np.full(n, None, dtype=object)
+        free = camera_dt.notna().to_numpy().copy()
+        sm = sm.to_numpy(dtype=object)
+        for r in self.rules:
+            mask = free & (sm == r["sm"])
+            if r["start"] is not None:
+                mask &= (camera_dt >= r["start"]).to_numpy()
+            if r["end"] is not None:
+                mask &= (camera_dt < r["end"]).to_numpy()
+            offset[mask] = r["offset"].to_timedelta64()
+            rule_id[mask] = r["id"]
+            free &= ~mask
+        return offset, rule_id
+
+    def correct_series(self, sm: pd.Series, camera_dt: pd.Series) -> pd.Series:
+        """True times for aligned SM / camera datetime Series (NaT stays NaT)."""
+        dt = pd.to_datetime(camera_dt, errors="coerce")
+        offset, _ = self.offsets(sm, dt)
+        return _round_minute(dt + offset)
+
+    def apply(self, df: pd.DataFrame, dt_col: str = "capture_dt", sm_col: Optional[str] = "sm",
+              path_col: str = "path", out_col: str = "true_dt", split: bool = False) -> pd.DataFrame:
+        """
+        Copy of df with out_col (corrected datetime) and clock_rule (id of the rule
+        used, None if none matched). The SM comes from sm_col if present, else from
+        an SM_X folder in path_col. split=True also adds TrueDate / TrueTime strings,
+        like the R script's output.
+        """
+        out = df.copy()
+        dt = pd.to_datetime(out[dt_col], errors="coerce")
+        if sm_col and sm_col in out:
+            sm = out[sm_col].astype(object)
+        else:
+            sm = out[path_col].astype(str).str.extract(_SM_IN_PATH, expand=False)
+        offset, rule_id = self.offsets(sm, dt)
+        true_dt = _round_minute(dt + offset)
+        out[out_col] = true_dt
+        out["clock_rule"] = rule_id
+        if split:
+            out["TrueDate"] = true_dt.dt.strftime("%Y-%m-%d")
+            out["TrueTime"] = true_dt.dt.strftime("%H:%M:%S")
+        return out
+
+    def correct(self, sm: Optional[str], camera_dt: Optional[datetime]) -> Optional[datetime]:
+        """Single-frame version of apply() for per-file code paths."""
+        if camera_dt is None:
+            return None
+        ts = pd.Timestamp(camera_dt)
+        for r in self.rules:
+            if r["sm"] != sm:
+                continue
+            if r["start"] is not None and ts < r["start"]:
+                continue
+            if r["end"] is not None and ts >= r["end"]:
+                continue
+            ts = ts + r["offset"]
+            break
+        return (ts + _MINUTE / 2).floor("min").to_pydatetime()
+
+
+def _round_minute(dt: pd.Series) -> pd.Series:
+    # Half-up like lubridate::round_date (Series.dt.round rounds half to even)
+    return (dt + _MINUTE / 2).dt.floor("min")
+
+
+def read_observations(path: str) -> pd.DataFrame:
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".parquet":
+        return pd.read_parquet(path)
+    if ext in (".xlsx", ".xls"):
+        return pd.read_excel(path)
+    return pd.read_csv(path)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Apply camera clock corrections to an observation table.")
+    ap.add_argument("table", help="CSV / Excel / Parquet with camera datetimes")
+    ap.add_argument("--out", required=True, help="Output table (.csv, .xlsx or .parquet)")
+    ap.add_argument("--rules", default=LATEST_VERSION,
+                    help=f"Rule set version {sorted(RULESETS)} or a JSON/YAML rules file")
+    ap.add_argument("--dt-col", default="capture_dt", help="Camera datetime column")
+    ap.add_argument("--date-col", default=None,
+                    help="Camera date column; combined with --time-col instead of --dt-col "
+                         "(the R script's CameraDate/CameraTime)")
+    ap.add_argument("--time-col", default=None)
+    ap.add_argument("--sm-col", default="sm", help="SM column (e.g. Location); else taken from --path-col")
+    ap.add_argument("--path-col", default="path")
+    ap.add_argument("--split", action="store_true", help="Also write TrueDate / TrueTime columns")
+    args = ap.parse_args()
+
+    clock = ClockCorrector.from_config(args.rules)
+    df = read_observations(args.table)
+    dt_col = args.dt_col
+    if args.date_col:
+        dt_col = "_camera_dt"
+        df[dt_col] = df[args.date_col].astype(str) + " " + df[args.time_col].astype(str)
+        df[dt_col] = pd.to_datetime(df[dt_col], errors="coerce", format="mixed")
+    out = clock.apply(df, dt_col=dt_col, sm_col=args.sm_col, path_col=args.path_col, split=args.split)
+    if args.date_col:
+        out = out.drop(columns=[dt_col])
+
+    ext = os.path.splitext(args.out)[1].lower()
+    if ext == ".parquet":
+        out.to_parquet(args.out, index=False)
+    elif ext in (".xlsx", ".xls"):
+        out.to_excel(args.out, index=False)
+    else:
+        out.to_csv(args.out, index=False)
+    matched = out["clock_rule"].notna().sum()
+    print(f"{len(out)} rows, {matched} corrected ({clock.version or 'custom rules'}) -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+
+def make_detection(box, score: float, label: str = "", mask=None) -> Dict[str, Any]:
+    """
+    One detector hit, in the shape detector models put under pred["detections"]:
+      box   -- (left, top, right, bottom) in full-frame pixel coordinates
+      score -- confidence in [0, 1]
+      label -- class / text query that fired
+      mask  -- optional HxW bool array (full frame) or None
+    """
+    left, top, right, bottom = (int(round(v)) for v in box)
+    return {"box": (left, top, right, bottom), "score": float(score), "label": label, "mask": mask}
+
+
+def clamp_box(box, size, padding: int = 0) -> Optional[Tuple[int, int, int, int]]:
+    width, height = size
+    left, top, right, bottom = box
+    left = max(0, left - padding)
+    top = max(0, top - padding)
+    right = min(width, right + padding)
+    bottom = min(height, bottom + padding)
+    if right <= left or bottom <= top:
+        return None
+    return left, top, right, bottom
+
+
+def crop_detections(pil_image, pred: Dict[str, Any], padding: int = 10, min_score: float = 0.0,
+                    apply_mask: bool = False) -> List[Tuple[Dict[str, Any], Any]]:
+    """
+    Crop every detection in pred["detections"] out of the already-decoded frame.
+    Returns [(detection, crop)]; with apply_mask, pixels outside the mask are blacked out.
+    """
+    out = []
+    for det in pred.get("detections") or []:
+        if det.get("score", 1.0) < min_score:
+            continue
+        box = clamp_box(det["box"], pil_image.size, padding)
+        if box is None:
+            continue
+        crop = pil_image.crop(box)
+        mask = det.get("mask")
+        if apply_mask and mask is not None:
+            left, top, right, bottom = box
+            m = np.asarray(mask, dtype=bool)[top:bottom, left:right]
+            crop = Image.composite(crop, Image.new(crop.mode, crop.size),
+                                   Image.fromarray(m.astype(np.uint8) * 255))
+        out.append((det, crop))
+    return out
+
+
+def detections_to_json(dets) -> List[Dict[str, Any]]:
+    """Detections without masks (for JSONL/Parquet output)."""
+    return [{"box": list(d["box"]), "score": d.get("score"), "label": d.get("label", "")}
+            for d in dets or []]
+
+
+def detections_from_json(items) -> List[Dict[str, Any]]:
+    return [make_detection(d["box"], d.get("score", 1.0), d.get("label", "")) for d in items or []]
+
+
+def serializable_prediction(pred: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of a prediction with masks dropped from its detections (for cache/writers)."""
+    if not pred.get("detections"):
+        return pred
+    out = dict(pred)
+    out["detections"] = detections_to_json(pred["detections"])
+    return out
+
+
+def aggregate_crop_predictions(name: str, pairs) -> Dict[str, Any]:
+    """
+    Fold per-crop predictions [(detection, pred)] back into one frame-level prediction:
+    unique species/common names joined with ';', number = crop count, score = best crop.
+    """
+    if not pairs:
+        return {"notes": f"{name}:no-crops", "score": 0.0, "detections": []}
+    species = list(dict.fromkeys(p.get("species") for _, p in pairs if p.get("species")))
+    common = list(dict.fromkeys(p.get("common_name") for _, p in pairs if p.get("common_name")))
+    dets = []
+    scores = []
+    for det, p in pairs:
+        d = dict(det)
+        d["label"] = p.get("species") or p.get("common_name") or det.get("label", "")
+        if p.get("score") not in (None, ""):
+            d["crop_score"] = float(p["score"])
+            scores.append(float(p["score"]))
+        dets.append(d)
+    return {
+        "common_name": ";".join(common),
+        "species": ";".join(species),
+        "number": str(len(pairs)),
+        "notes": f"{name}:crops",
+        "score": max(scores) if scores else None,
+        "detections": dets,
+    }
@@ -1,6 +1,10 @@
+import sys
+from functools import partial
 from pathlib import Path
 from PIL import Image
 
+from .prefetch import prefetch_map
+
 VALID_EXTS = {".jpg", ".jpeg", ".png"}
 
 def expand_input_dirs(inputs_cfg: dict):
@@ -36,14 +40,106 @@ def expand_input_dirs(inputs_cfg: dict):
             seen.add(d)
     return dedup
 
-def iter_images(root_dir: str):
+def iter_image_paths(root_dir: str, manifest=None):
+    """Image paths under root_dir; served from a pipelines.manifest.Manifest if given."""
+    if manifest is not None:
+        yield from (Path(p) for p in manifest.paths(root_dir, exts=VALID_EXTS, include_errors=True))
+        return
     root = Path(root_dir)
     for p in root.rglob("*"):
         if p.is_file() and p.suffix.lower() in VALID_EXTS:
+            yield p
+
+def reduce_factor(size, min_size) -> int:
+    """Largest of 8, 4, 2 that keeps `size` at least `min_size` (w, h) on both axes, else 1."""
+    for f in (8, 4, 2):
+        if size[0] // f >= min_size[0] and size[1] // f >= min_size[1]:
+            return f
+    return 1
+
+def decode_rgb(path, min_size=None):
+    """
+    Open + convert("RGB"). With min_size=(w, h), decode at the smallest 1/2, 1/4 or 1/8
+    scale that is still at least that big: JPEGs via libjpeg DCT scaling (Image.draft),
+    which is where the time and memory go; other formats are reduced after decoding.
+    """
+    with Image.open(path) as im:
+        if min_size is None:
+            return im.convert("RGB")
+        if im.format == "JPEG":
+            im.draft("RGB", tuple(min_size))
+        img = im.convert("RGB")
+    f = reduce_factor(img.size, min_size)
+    return img.reduce(f) if f > 1 else img
+
+def decoder_for(min_size=None):
+    """decode_rgb bound to min_size; a partial, so process pools can pickle it."""
+    return decode_rgb if min_size is None else partial(decode_rgb, min_size=tuple(min_size))
+
+def decode_size_for(*models):
+    """
+    Smallest decode size that satisfies every model's input_size, or None (full
+    resolution) if any of them needs the full frame.
+    """
+    sizes = [getattr(m, "input_size", None) for m in models]
+    if not sizes or any(s is None for s in sizes):
+        return None
+    return max(s[0] for s in sizes), max(s[1] for s in sizes)
+
+def report_bad_image(path: str, exc: Exception):
+    print(f"Failed to load {path}: {exc}", file=sys.stderr)
+
+def iter_images(root_dir: str, workers: int = 0, prefetch: int = 16, ordered: bool = True,
+                executor: str = "thread", on_error=report_bad_image, manifest=None,
+                decode=decode_rgb, min_size=None):
+    """
+    Yield (path, RGB PIL image) for every image under root_dir.
+
+    workers=0 decodes in the caller's thread. With workers > 0, a thread (or process)
+    pool decodes ahead, keeping at most `prefetch` images queued. ordered=True keeps
+    discovery order; ordered=False yields images as soon as they are decoded.
+    executor="shm" decodes in worker processes that hand pixels back through shared
+    memory (pipelines.shm) instead of pickling them; `decode` is not used there.
+    Unreadable files are passed to on_error(path, exc) and skipped.
+    Pass a Manifest to list files from the index instead of walking the disk.
+    decode(path) -> image replaces the default open + convert("RGB").
+    min_size=(w, h) decodes at a reduced scale that is still at least that big (see
+    decode_rgb); pass decode_size_for(model) so classifiers skip full-frame decodes.
+    """
+    return iter_images_from_paths(iter_image_paths(root_dir, manifest), workers=workers,
+                                  prefetch=prefetch, ordered=ordered, executor=executor,
+                                  on_error=on_error, decode=decode, min_size=min_size)
+
+def iter_images_from_paths(paths, workers: int = 0, prefetch: int = 16, ordered: bool = True,
+                           executor: str = "thread", on_error=report_bad_image, decode=decode_rgb,
+                           min_size=None):
+    """Same as iter_images, but over an explicit iterable of paths."""
+    if min_size is not None and decode is decode_rgb:
+        decode = decoder_for(min_size)
+    if workers <= 0:
+        for p in paths:
             try:
-                with Image.open(p) as im:
-                    img = im.convert("RGB")
-                yield str(p), img
+                img = decode(p)
             except Exception as e:
-                # Could log this path; for now, skip corrupted images
-                continue
\ No newline at end of file
+                if on_error:
+                    on_error(str(p), e)
+                continue
+            yield str(p), img
+        return
+
+    if executor == "shm":
+        from .shm import iter_shared_frames
+
+        yield from iter_shared_frames(paths, workers=workers, slots=max(2, prefetch),
+                                      ordered=ordered, on_error=on_error, min_size=min_size)
+        return
+
+    for p, fut in prefetch_map(decode, paths, workers=workers, depth=prefetch,
+                               ordered=ordered, executor=executor):
+        try:
+            img = fut.result()
+        except Exception as e:
+            if on_error:
+                on_error(str(p), e)
+            continue
+        yield str(p), img
@@ -1,31 +1,179 @@
+import struct
 from datetime import datetime
-from PIL import Image, ExifTags
+from typing import Dict, Iterable, Optional, Tuple
+
+from PIL import Image
+
+from .prefetch import prefetch_map
+
+# EXIF tag ids we care about
+TAG_DATETIME = 0x0132           # IFD0 "DateTime" (a.k.a. Modify Date)
+TAG_EXIF_IFD = 0x8769           # IFD0 pointer to the Exif sub-IFD
+TAG_DATETIME_ORIGINAL = 0x9003  # Exif IFD
+TAG_DATETIME_DIGITIZED = 0x9004 # Exif IFD
+
+# (field name, source label) in priority order, as used by organizeImagesByCaptureDate
+DATETIME_FIELDS = (
+    ("DateTimeOriginal", "EXIF:DateTimeOriginal"),
+    ("DateTime", "EXIF:ModifyDate"),
+    ("DateTimeDigitized", "EXIF:DateTimeDigitized"),
+)
+
+_TAG_NAMES = {
+    TAG_DATETIME: "DateTime",
+    TAG_DATETIME_ORIGINAL: "DateTimeOriginal",
+    TAG_DATETIME_DIGITIZED: "DateTimeDigitized",
+}
+
+
+def parse_exif_datetime(raw) -> Optional[datetime]:
+    """Parse 'YYYY:MM:DD HH:MM:SS' (hyphens tolerated); None if unparsable."""
+    if not raw:
+        return None
+    if isinstance(raw, bytes):
+        raw = raw.decode("ascii", "ignore")
+    # common EXIF format: "YYYY:MM:DD HH:MM:SS"
+    raw = str(raw).strip("\x00 ").replace("-", ":")  # sometimes hyphens appear
+    try:
+        return datetime.strptime(raw, "%Y:%m:%d %H:%M:%S")
+    except Exception:
+        return None
+
+
+class _SegmentReader:
+    """Reads an APP1 payload lazily: only the bytes that IFD offsets point at."""
+
+    def __init__(self, f, start: int, length: int, initial: int):
+        self.f = f
+        self.start = start
+        self.length = length
+        f.seek(start)
+        self.buf = f.read(min(length, initial))
+
+    def need(self, end: int) -> bool:
+        if end > self.length:
+            return False
+        if end > len(self.buf):
+            self.f.seek(self.start + len(self.buf))
+            self.buf += self.f.read(end - len(self.buf))
+        return end <= len(self.buf)
+
+
+def _read_ifd(seg: _SegmentReader, tiff: int, offset: int, endian: str, out: Dict[str, str]):
+    """Collect wanted ASCII tags of one IFD into `out`; return the Exif sub-IFD offset if any."""
+    base = tiff + offset
+    if not seg.need(base + 2):
+        return None
+    (count,) = struct.unpack_from(endian + "H", seg.buf, base)
+    if not seg.need(base + 2 + 12 * count):
+        return None
+    exif_ifd = None
+    for i in range(count):
+        tag, typ, n, value = struct.unpack_from(endian + "HHI4s", seg.buf, base + 2 + 12 * i)
+        if tag == TAG_EXIF_IFD:
+            (exif_ifd,) = struct.unpack(endian + "I", value)
+            continue
+        name = _TAG_NAMES.get(tag)
+        if name is None or typ != 2:  # 2 = ASCII
+            continue
+        if n <= 4:
+            raw = value[:n]
+        else:
+            (ptr,) = struct.unpack(endian + "I", value)
+            if not seg.need(tiff + ptr + n):
+                continue
+            raw = seg.buf[tiff + ptr: tiff + ptr + n]
+        out[name] = raw.split(b"\x00", 1)[0].decode("ascii", "ignore")
+    return exif_ifd
+
+
+def read_exif_datetime_fields(path: str, initial: int = 4096) -> Dict[str, str]:
+    """
+    Return the raw DateTimeOriginal / DateTime / DateTimeDigitized strings of a JPEG
+    by walking its markers to the APP1 Exif segment. No pixel data is decoded and
+    usually only the first few KB of the file are read. Returns {} if not found.
+    """
+    out: Dict[str, str] = {}
+    with open(path, "rb") as f:
+        if f.read(2) != b"\xff\xd8":
+            return out
+        while True:
+            hdr = f.read(4)
+            if len(hdr) < 4 or hdr[0] != 0xFF:
+                return out
+            marker = hdr[1]
+            if marker in (0xDA, 0xD9):  # start of scan / end of image: no EXIF ahead
+                return out
+            (seg_len,) = struct.unpack(">H", hdr[2:])
+            if marker != 0xE1:
+                f.seek(seg_len - 2, 1)
+                continue
+            seg = _SegmentReader(f, f.tell(), seg_len - 2, initial)
+            if seg.buf[:6] != b"Exif\x00\x00":
+                f.seek(seg.start + seg.length)
+                continue
+            tiff = 6
+            if not seg.need(tiff + 8):
+                return out
+            endian = "<" if seg.buf[tiff:tiff + 2] == b"II" else ">"
+            (ifd0,) = struct.unpack_from(endian + "I", seg.buf, tiff + 4)
+            exif_ifd = _read_ifd(seg, tiff, ifd0, endian, out)
+            if exif_ifd:
+                _read_ifd(seg, tiff, exif_ifd, endian, out)
+            return out
+
+
+def fast_exif_datetime(path: str) -> Tuple[Optional[datetime], str]:
+    """
+    Return (datetime, source label) using the streaming reader, with priority
+    DateTimeOriginal -> DateTime -> DateTimeDigitized. (None, "none") if absent.
+    """
+    try:
+        fields = read_exif_datetime_fields(path)
+    except Exception:
+        return None, "none"
+    for name, label in DATETIME_FIELDS:
+        dt = parse_exif_datetime(fields.get(name))
+        if dt is not None:
+            return dt, label
+    return None, "none"
+
+
+def bulk_exif_datetimes(paths: Iterable[str], workers: int = 8) -> Dict[str, Tuple[Optional[datetime], str]]:
+    """fast_exif_datetime over many paths on a thread pool; returns {path: (datetime, label)}."""
+    out = {}
+    for p, fut in prefetch_map(fast_exif_datetime, paths, workers=workers,
+                               depth=workers * 8, ordered=False):
+        out[p] = fut.result()
+    return out
+
 
 def extract_exif_datetime(path: str):
     """
     Returns a datetime if EXIF DateTimeOriginal or DateTime exists; otherwise None.
     """
+    try:
+        fields = read_exif_datetime_fields(path)
+    except Exception:
+        fields = {}
+    for key in ("DateTimeOriginal", "DateTime"):
+        dt = parse_exif_datetime(fields.get(key))
+        if dt is not None:
+            return dt
+    if fields:
+        return None
+
+    # Not a JPEG with an APP1 segment (PNG, truncated header, ...): ask PIL
     try:
         with Image.open(path) as im:
             exif = im.getexif()
             if not exif:
                 return None
-            # map tag ids to names
-            tag2name = {ExifTags.TAGS.get(k, k): k for k in exif.keys()}
-            for key in ("DateTimeOriginal", "DateTime"):
-                tag_id = tag2name.get(key)
-                if tag_id is None:
-                    continue
-                raw = exif.get(tag_id)
-                if not raw:
-                    continue
-                # common EXIF format: "YYYY:MM:DD HH:MM:SS"
-                raw = str(raw)
-                raw = raw.replace("-", ":")  # sometimes hyphens appear
-                try:
-                    return datetime.strptime(raw, "%Y:%m:%d %H:%M:%S")
-                except Exception:
-                    pass
+            dto = exif.get_ifd(TAG_EXIF_IFD).get(TAG_DATETIME_ORIGINAL) or exif.get(TAG_DATETIME_ORIGINAL)
+            for raw in (dto, exif.get(TAG_DATETIME)):
+                dt = parse_exif_datetime(raw)
+                if dt is not None:
+                    return dt
     except Exception:
         return None
-    return None
\ No newline at end of file
+    return None
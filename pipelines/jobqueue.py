@@ -0,0 +1,224 @@
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import sqlite3
+import time
+import traceback
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    key     TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    added   REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS phases (
+    key      TEXT NOT NULL,
+    phase    TEXT NOT NULL,
+    status   TEXT NOT NULL,          -- running | done | failed
+    result   TEXT,
+    error    TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker   INTEGER,
+    updated  REAL NOT NULL,
+    PRIMARY KEY (key, phase)
+);
+CREATE INDEX IF NOT EXISTS phases_status ON phases(phase, status);
+"""
+
+
+def shard_of(key: str, n_shards: int) -> int:
+    """Stable shard for a job key (not hash(), which is salted per process)."""
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % max(1, n_shards)
+
+
+class JobQueue:
+    """
+    Durable SQLite work queue for multi-phase jobs (e.g. upscale -> judge).
+
+    Every job has a key and a JSON payload; each phase records its own status and
+    JSON result per job, committed as soon as the job finishes. A phase only picks
+    up jobs whose `after` phase is done, so phases resume independently after a
+    crash and finished work is never redone.
+    """
+
+    def __init__(self, db_path: str, timeout: float = 60.0):
+        parent = os.path.dirname(db_path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, timeout=timeout)
+        # Several worker processes write to the same file
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------- jobs ----------
+
+    def add(self, jobs: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        """Insert (key, payload) jobs; existing keys are left as they are. Returns #new."""
+        before = self.conn.total_changes
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO jobs (key, payload, added) VALUES (?, ?, ?)",
+                ((k, json.dumps(p, default=str), time.time()) for k, p in jobs),
+            )
+        return self.conn.total_changes - before
+
+    def pending(self, phase: str, after: Optional[str] = None, shard: int = 0,
+                n_shards: int = 1, retry_failed: bool = False,
+                max_attempts: int = 3) -> List[str]:
+        """
+        Keys this shard still has to run for `phase`: not done, the `after` phase done,
+        and (with retry_failed) failed fewer than max_attempts times. A job left
+        `running` by a crashed worker counts as pending again.
+        """
+        sql = "SELECT j.key FROM jobs j LEFT JOIN phases p ON p.key = j.key AND p.phase = ?"
+        args: List[Any] = [phase]
+        if after:
+            sql += " JOIN phases a ON a.key = j.key AND a.phase = ? AND a.status = 'done'"
+            args.append(after)
+        sql += " WHERE p.status IS NULL OR p.status = 'running'"
+        if retry_failed:
+            sql += " OR (p.status = 'failed' AND p.attempts < ?)"
+            args.append(max_attempts)
+        sql += " ORDER BY j.key"
+        keys = [k for (k,) in self.conn.execute(sql, args)]
+        return [k for k in keys if shard_of(k, n_shards) == shard]
+
+    def job(self, key: str) -> Dict[str, Any]:
+        """{"key", "payload", "results": {phase: result}} for one job (done phases only)."""
+        (payload,) = self.conn.execute("SELECT payload FROM jobs WHERE key = ?", (key,)).fetchone()
+        results = {
+            ph: json.loads(res) for ph, res in self.conn.execute(
+                "SELECT phase, result FROM phases WHERE key = ? AND status = 'done'", (key,))
+        }
+        return {"key": key, "payload": json.loads(payload), "results": results}
+
+    # ---------- phase state ----------
+
+    def _set(self, key: str, phase: str, status: str, result=None, error=None,
+             worker: Optional[int] = None, bump: bool = False):
+        with self.conn:
+            self.conn.execute(
+                """
+                INSERT INTO phases (key, phase, status, result, error, attempts, worker, updated)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(key, phase) DO UPDATE SET
+                    status = excluded.status, result = excluded.result,
+                    error = excluded.error, worker = excluded.worker,
+                    attempts = phases.attempts + ?, updated = excluded.updated
+                """,
+                (key, phase, status,
+                 None if result is None else json.dumps(result, default=str),
+                 error, int(bump), worker, time.time(), int(bump)),
+            )
+
+    def start(self, key: str, phase: str, worker: Optional[int] = None):
+        self._set(key, phase, "running", worker=worker, bump=True)
+
+    def complete(self, key: str, phase: str, result: Dict[str, Any],
+                 worker: Optional[int] = None):
+        self._set(key, phase, "done", result=result, worker=worker)
+
+    def fail(self, key: str, phase: str, error: str, worker: Optional[int] = None):
+        self._set(key, phase, "failed", error=error, worker=worker)
+
+    def reset(self, phase: str, status: Optional[str] = None):
+        """Forget a phase's state (all jobs, or only those with `status`) so it reruns."""
+        sql, args = "DELETE FROM phases WHERE phase = ?", [phase]
+        if status:
+            sql += " AND status = ?"
+            args.append(status)
+        with self.conn:
+            self.conn.execute(sql, args)
+
+    def counts(self, phase: str) -> Dict[str, int]:
+        out = {"jobs": self.conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]}
+        for status, n in self.conn.execute(
+            "SELECT status, COUNT(*) FROM phases WHERE phase = ? GROUP BY status", (phase,)
+        ):
+            out[status] = n
+        return out
+
+    def done(self, phase: str) -> Iterable[Dict[str, Any]]:
+        """Jobs whose `phase` is done, with payload and all done results, by key."""
+        keys = [k for (k,) in self.conn.execute(
+            "SELECT key FROM phases WHERE phase = ? AND status = 'done' ORDER BY key", (phase,))]
+        for k in keys:
+            yield self.job(k)
+
+
+# ---------- running a phase ----------
+
+def _work_shard(db_path: str, phase: str, setup: Callable, after: Optional[str],
+                shard: int, n_shards: int, retry_failed: bool, max_attempts: int,
+                progress: bool, batch_size: Optional[int] = None) -> Dict[str, int]:
+    stats = {"done": 0, "failed": 0}
+    with JobQueue(db_path) as q:
+        keys = q.pending(phase, after, shard, n_shards, retry_failed, max_attempts)
+        if not keys:
+            return stats
+        handler = setup(shard)  # load the model once per worker
+        step = batch_size or 1
+        for i in range(0, len(keys), step):
+            batch = keys[i:i + step]
+            jobs = [q.job(k) for k in batch]
+            for k in batch:
+                q.start(k, phase, worker=shard)
+            try:
+                results = handler(jobs) if batch_size else [handler(jobs[0])]
+                if len(results) != len(batch):
+                    raise ValueError(f"handler returned {len(results)} results for "
+                                     f"{len(batch)} jobs")
+            except Exception as e:
+                results = [e] * len(batch)
+            for key, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    err = "".join(traceback.format_exception(result))
+                    q.fail(key, phase, err, worker=shard)
+                    stats["failed"] += 1
+                    print(f"[{phase} w{shard}] {key}: failed ({result})", flush=True)
+                    continue
+                q.complete(key, phase, result, worker=shard)
+                stats["done"] += 1
+            if progress:
+                print(f"[{phase} w{shard}] {min(i + step, len(keys))}/{len(keys)} "
+                      f"{batch[-1]}", flush=True)
+    return stats
+
+
+def run_phase(db_path: str, phase: str, setup: Callable[[int], Callable],
+              after: Optional[str] = None, workers: int = 1, retry_failed: bool = True,
+              max_attempts: int = 3, progress: bool = True,
+              batch_size: Optional[int] = None) -> Dict[str, int]:
+    """
+    Run one phase over every pending job, sharded by key across `workers` processes.
+
+    setup(worker_index) is called once per worker and returns handler(job) -> result
+    dict, where job is {"key", "payload", "results": {earlier phase: result}}. With a
+    batch_size the handler instead gets a list of up to batch_size jobs and returns one
+    result per job. A handler marks a job failed by raising (the whole batch) or by
+    returning an Exception in that job's place. setup must be picklable (a module-level
+    function or functools.partial of one). With workers=1 everything runs in this process.
+    """
+    n = max(1, workers)
+    args = [(db_path, phase, setup, after, i, n, retry_failed, max_attempts, progress,
+             batch_size) for i in range(n)]
+    if n == 1:
+        parts = [_work_shard(*args[0])]
+    else:
+        # spawn: CUDA cannot be re-initialised in forked children
+        with mp.get_context("spawn").Pool(n) as pool:
+            parts = pool.starmap(_work_shard, args)
+    return {"done": sum(p["done"] for p in parts), "failed": sum(p["failed"] for p in parts)}
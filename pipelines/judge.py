@@ -0,0 +1,201 @@
+"""
+Batched vision-language judging of (low-res, enhanced) image pairs.
+
+The model and processor are passed in, so anything with the Hugging Face chat-template /
+generate / batch_decode interface works (Qwen3-VL in diffusion_test/, or a tiny local
+stand-in when checking the batching logic).
+"""
+import contextlib
+import json
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .superres import JUDGE_SCORE_FIELDS
+
+JUDGE_SYSTEM_PROMPT = (
+    "You are an image quality judge focusing on super-resolution. "
+    "Compare Image A (low-res input) and Image B (enhanced output). "
+    "Return a strict JSON object like:\n"
+    '{"sharpness_gain": float, "noise_level": float, "artifact_level": float, '
+    '"overall_improvement": float, "short_reason": "..."}\n'
+    "Use scores from 1 (worst) to 10 (best)."
+)
+JUDGE_USER_PROMPT = "Compare the first (low-res) and second (enhanced) images."
+RETRY_HINT = " Reply with the JSON object only, no other text."
+
+SCORE_RANGE = (1.0, 10.0)
+MAX_REASON_CHARS = 500
+
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+
+
+def validate_scores(obj: Any) -> Dict[str, Any]:
+    """
+    Check a parsed judge reply against the schema: every score field a number within
+    SCORE_RANGE and a short_reason string. Returns only the schema fields; raises
+    ValueError on anything else.
+    """
+    if not isinstance(obj, dict):
+        raise ValueError(f"expected a JSON object, got {type(obj).__name__}")
+    out = {}
+    lo, hi = SCORE_RANGE
+    for field in JUDGE_SCORE_FIELDS:
+        v = obj.get(field)
+        if isinstance(v, bool) or not isinstance(v, (int, float)):
+            raise ValueError(f"{field}: expected a number, got {v!r}")
+        if not lo <= v <= hi:
+            raise ValueError(f"{field}: {v} outside {lo:g}..{hi:g}")
+        out[field] = float(v)
+    reason = obj.get("short_reason")
+    if not isinstance(reason, str):
+        raise ValueError(f"short_reason: expected a string, got {reason!r}")
+    out["short_reason"] = reason.strip()[:MAX_REASON_CHARS]
+    return out
+
+
+def parse_judge_output(text: str) -> Dict[str, Any]:
+    """Decode one reply: the JSON object, optionally inside a ```json fence, nothing else."""
+    body = _FENCE.sub("", text.strip())
+    try:
+        obj = json.loads(body)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"not valid JSON ({e.msg})") from None
+    return validate_scores(obj)
+
+
+def build_messages(low_img, enh_img, retry: bool = False) -> List[Dict[str, Any]]:
+    return [
+        {"role": "system", "content": JUDGE_SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": [
+                {"type": "image", "image": low_img},
+                {"type": "image", "image": enh_img},
+                {"type": "text", "text": JUDGE_USER_PROMPT + (RETRY_HINT if retry else "")},
+            ],
+        },
+    ]
+
+
+class BatchJudge:
+    """
+    Rates pairs in batches: one padded chat-template call and one `generate` per batch.
+    Replies that fail parse_judge_output are re-asked (sampling, with a stricter hint)
+    up to max_retries times; after that the pair gets {"raw_response", "error"}.
+    """
+
+    def __init__(self, model, processor, batch_size: int = 4, max_new_tokens: int = 256,
+                 max_retries: int = 2, retry_temperature: float = 0.7):
+        self.model = model
+        self.processor = processor
+        self.batch_size = max(1, batch_size)
+        self.max_new_tokens = max_new_tokens
+        self.max_retries = max_retries
+        self.retry_temperature = retry_temperature
+        self.generate_calls = 0
+        self.retries = 0
+        # Batched generation with a decoder-only model needs left padding
+        tokenizer = getattr(processor, "tokenizer", None)
+        if tokenizer is not None and hasattr(tokenizer, "padding_side"):
+            tokenizer.padding_side = "left"
+
+    def _generate(self, conversations, sample: bool) -> List[str]:
+        inputs = self.processor.apply_chat_template(
+            conversations,
+            tokenize=True,
+            add_generation_prompt=True,
+            return_dict=True,
+            return_tensors="pt",
+            padding=True,
+        )
+        if hasattr(inputs, "to") and hasattr(self.model, "device"):
+            inputs = inputs.to(self.model.device)
+        kwargs = {"max_new_tokens": self.max_new_tokens, "do_sample": sample}
+        if sample:
+            kwargs["temperature"] = self.retry_temperature
+        with _no_grad():
+            out_ids = self.model.generate(**inputs, **kwargs)
+        self.generate_calls += 1
+        # Keep only the newly generated tokens (all prompts share the padded length)
+        prompt_len = inputs["input_ids"].shape[1]
+        return self.processor.batch_decode(out_ids[:, prompt_len:], skip_special_tokens=True)
+
+    def rate_pairs(self, pairs: Sequence[Tuple[Any, Any]]) -> List[Dict[str, Any]]:
+        """Scores for each (low_img, enhanced_img) pair, in input order."""
+        results: List[Optional[Dict[str, Any]]] = [None] * len(pairs)
+        todo = list(range(len(pairs)))
+        for attempt in range(self.max_retries + 1):
+            retry = attempt > 0
+            failed = []
+            for i in range(0, len(todo), self.batch_size):
+                idx = todo[i:i + self.batch_size]
+                convs = [build_messages(*pairs[j], retry=retry) for j in idx]
+                for j, text in zip(idx, self._generate(convs, sample=retry)):
+                    try:
+                        results[j] = parse_judge_output(text)
+                    except ValueError as e:
+                        results[j] = {"raw_response": text, "error": str(e)}
+                        failed.append(j)
+            if not failed:
+                break
+            if attempt < self.max_retries:
+                self.retries += len(failed)
+            todo = failed
+        return results
+
+
+def _no_grad():
+    try:
+        import torch
+    except ImportError:
+        return contextlib.nullcontext()
+    return torch.no_grad()
+
+
+def load_done_keys(jsonl_path: str, key: str = "input_path") -> set:
+    """
+    Keys with a successful result in a results JSONL. Rows whose scores hold an
+    "error" don't count, so a resumed run retries them; a torn last line is ignored.
+    """
+    done = set()
+    if not os.path.exists(jsonl_path):
+        return done
+    with open(jsonl_path, "r") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+                if "error" not in (rec.get("scores") or {}):
+                    done.add(rec[key])
+            except (ValueError, KeyError, TypeError, AttributeError):
+                continue
+    return done
+
+
+def judge_pairs(judge: BatchJudge, items: Iterable[Dict[str, Any]], out_jsonl: str,
+                load_pair, key: str = "input_path") -> Dict[str, int]:
+    """
+    Resumable judging run. items are dicts (e.g. {"input_path", "enhanced_path", ...});
+    load_pair(item) returns the (low_img, enhanced_img) pair. Items whose key is already
+    in out_jsonl with scores are skipped; each finished batch is appended as
+    {**item, "scores": ...} and flushed, so an interrupted run picks up after the last
+    full batch and items that failed before are judged again (a later row for a key
+    supersedes its earlier error row).
+    """
+    done = load_done_keys(out_jsonl, key)
+    items = list(items)
+    todo = [it for it in items if it[key] not in done]
+    stats = {"skipped": len(items) - len(todo), "judged": 0, "failed": 0}
+    parent = os.path.dirname(out_jsonl)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    with open(out_jsonl, "a") as f:
+        for i in range(0, len(todo), judge.batch_size):
+            batch = todo[i:i + judge.batch_size]
+            scores = judge.rate_pairs([load_pair(it) for it in batch])
+            for it, sc in zip(batch, scores):
+                f.write(json.dumps({**it, "scores": sc}, default=str) + "\n")
+                stats["judged"] += 1
+                stats["failed"] += "error" in sc
+            f.flush()
+    return stats
@@ -0,0 +1,398 @@
+"""
+Streaming access to the All_Labels JSONL / JSON-array label files.
+
+    store = LabelStore("scripts/All_Labels.jsonl")      # index built on first use
+    store.find(basename="IMG_0001__20220505_085305__cc8335.JPG")
+    store.set_column("Black_white", {basename: True, ...}, default=False)
+    for rec in store:                                    # source fields + derived columns
+        ...
+
+The source file is never rewritten. Its records are indexed by byte offset, image
+path and basename in a SQLite file next to it (<source>.idx.sqlite), and derived
+columns live in the same file. to_parquet() / write_jsonl() produce a merged mirror.
+"""
+import json
+import os
+import sqlite3
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS records (
+    id         INTEGER PRIMARY KEY,   -- record number in the source file, from 0
+    offset     INTEGER NOT NULL,
+    length     INTEGER NOT NULL,
+    image_path TEXT,
+    basename   TEXT
+);
+CREATE INDEX IF NOT EXISTS records_basename ON records(basename);
+CREATE INDEX IF NOT EXISTS records_path ON records(image_path);
+CREATE TABLE IF NOT EXISTS derived (
+    id    INTEGER NOT NULL,
+    name  TEXT NOT NULL,
+    value TEXT,                       -- JSON
+    PRIMARY KEY (name, id)
+);
+"""
+
+_CHUNK = 1 << 20
+
+
+def record_image_path(rec: Dict[str, Any]) -> Optional[str]:
+    """Image path of a label record: "image_path", or the first of "images"."""
+    p = rec.get("image_path")
+    if p:
+        return p
+    images = rec.get("images")
+    if isinstance(images, list) and images:
+        return images[0]
+    return None
+
+
+def path_basename(path: str) -> str:
+    return os.path.basename(path.replace("\\", "/"))
+
+
+def sniff_format(path: str) -> str:
+    """'array' for a top-level JSON array, otherwise 'jsonl'."""
+    with open(path, "rb") as f:
+        while True:
+            c = f.read(1)
+            if not c:
+                return "jsonl"
+            if not c.isspace():
+                return "array" if c == b"[" else "jsonl"
+
+
+def _iter_jsonl_spans(f) -> Iterator[Tuple[int, int, bytes]]:
+    offset = 0
+    for line in f:
+        stripped = line.strip()
+        if stripped:
+            start = offset + (len(line) - len(line.lstrip()))
+            yield start, len(stripped), stripped
+        offset += len(line)
+
+
+def _iter_array_spans(f) -> Iterator[Tuple[int, int, bytes]]:
+    """
+    (byte offset, byte length, raw bytes) of each element of a top-level JSON array,
+    read in 1 MiB chunks. Only the element being scanned is kept in memory.
+    """
+    buf = b""
+    base = 0  # file offset of buf[0]
+    pos = 0
+    depth = 0
+    in_str = escape = False
+    start = None
+    started = False
+    while True:
+        if pos >= len(buf):
+            chunk = f.read(_CHUNK)
+            if not chunk:
+                return
+            keep = start if start is not None else len(buf)
+            base += keep
+            pos -= keep
+            buf = buf[keep:] + chunk
+            if start is not None:
+                start = 0
+        c = buf[pos]
+        if not started:
+            if c == 0x5B:  # [
+                started = True
+        elif in_str:
+            if escape:
+                escape = False
+            elif c == 0x5C:  # backslash
+                escape = True
+            elif c == 0x22:  # "
+                in_str = False
+        elif c == 0x22:
+            in_str = True
+            if start is None:
+                start = pos
+        elif c in (0x7B, 0x5B):  # { [
+            if start is None:
+                start = pos
+            depth += 1
+        elif c in (0x7D, 0x5D):  # } ]
+            if depth == 0:  # closing bracket of the top-level array
+                if start is not None:
+                    raw = buf[start:pos].rstrip()
+                    yield base + start, len(raw), raw
+                return
+            depth -= 1
+        elif c == 0x2C and depth == 0:  # , between elements
+            if start is not None:
+                raw = buf[start:pos].rstrip()
+                yield base + start, len(raw), raw
+            start = None
+        elif start is None and not chr(c).isspace():
+            start = pos  # scalar element
+        pos += 1
+
+
+def iter_label_spans(path: str) -> Iterator[Tuple[int, int, bytes]]:
+    """(offset, length, raw JSON bytes) for every record of a JSONL or JSON-array file."""
+    fmt = sniff_format(path)
+    with open(path, "rb") as f:
+        spans = _iter_array_spans(f) if fmt == "array" else _iter_jsonl_spans(f)
+        yield from spans
+
+
+def iter_label_records(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream the records of a JSONL or JSON-array label file, one at a time."""
+    for _, _, raw in iter_label_spans(path):
+        yield json.loads(raw)
+
+
+class LabelStore:
+    """Indexed, append-friendly view of one label file plus its derived columns."""
+
+    def __init__(self, source: str, index_path: Optional[str] = None, refresh: bool = True):
+        self.source = source
+        self.index_path = index_path or source + ".idx.sqlite"
+        self.conn = sqlite3.connect(self.index_path)
+        self.conn.executescript(_SCHEMA)
+        self._f = None
+        if refresh:
+            self.refresh()
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------- index ----------
+
+    def _signature(self) -> str:
+        st = os.stat(self.source)
+        return f"{st.st_size}:{st.st_mtime_ns}"
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        (Re)build the offset index if the source changed. Derived columns are kept;
+        they refer to record numbers, so they stay valid as long as records are only
+        appended or edited in place. Returns True if the index was rebuilt.
+        """
+        sig = self._signature()
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'signature'").fetchone()
+        if row and row[0] == sig and not force:
+            return False
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+        with self.conn:
+            self.conn.execute("DELETE FROM records")
+            batch = []
+            for i, (offset, length, raw) in enumerate(iter_label_spans(self.source)):
+                path = record_image_path(json.loads(raw))
+                batch.append((i, offset, length, path, path_basename(path) if path else None))
+                if len(batch) >= 10000:
+                    self.conn.executemany("INSERT INTO records VALUES (?, ?, ?, ?, ?)", batch)
+                    batch = []
+            self.conn.executemany("INSERT INTO records VALUES (?, ?, ?, ?, ?)", batch)
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('signature', ?)", (sig,))
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('format', ?)",
+                              (sniff_format(self.source),))
+        return True
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    # ---------- reads ----------
+
+    def _read(self, offset: int, length: int) -> Dict[str, Any]:
+        if self._f is None:
+            self._f = open(self.source, "rb")
+        self._f.seek(offset)
+        return json.loads(self._f.read(length))
+
+    def _derived_for(self, rid: int) -> Dict[str, Any]:
+        return {name: json.loads(v) for name, v in self.conn.execute(
+            "SELECT name, value FROM derived WHERE id = ?", (rid,))}
+
+    def get(self, rid: int, derived: bool = True) -> Dict[str, Any]:
+        row = self.conn.execute("SELECT offset, length FROM records WHERE id = ?",
+                                (rid,)).fetchone()
+        if row is None:
+            raise KeyError(rid)
+        rec = self._read(*row)
+        if derived:
+            rec.update(self._derived_for(rid))
+        return rec
+
+    def ids(self, basename: Optional[str] = None, path: Optional[str] = None) -> List[int]:
+        """Record numbers matching an image basename and/or full image path."""
+        sql, args = "SELECT id FROM records WHERE 1 = 1", []
+        if basename is not None:
+            sql += " AND basename = ?"
+            args.append(basename)
+        if path is not None:
+            sql += " AND image_path = ?"
+            args.append(path)
+        return [r for (r,) in self.conn.execute(sql + " ORDER BY id", args)]
+
+    def find(self, basename: Optional[str] = None, path: Optional[str] = None,
+             derived: bool = True) -> List[Dict[str, Any]]:
+        return [self.get(r, derived) for r in self.ids(basename, path)]
+
+    def keys(self) -> Iterator[Tuple[int, Optional[str], Optional[str]]]:
+        """(record number, image path, basename) for every record, from the index only."""
+        yield from self.conn.execute("SELECT id, image_path, basename FROM records ORDER BY id")
+
+    def columns(self) -> List[str]:
+        return [n for (n,) in self.conn.execute("SELECT DISTINCT name FROM derived ORDER BY name")]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return self.iter_records()
+
+    def iter_records(self, derived: bool = True) -> Iterator[Dict[str, Any]]:
+        """Every record in file order, streamed from the source, with derived columns."""
+        names = self.columns() if derived else []
+        cursors = [self.conn.execute(
+            "SELECT id, value FROM derived WHERE name = ? ORDER BY id", (n,)) for n in names]
+        heads = [next(c, None) for c in cursors]
+        for rid, (_, _, raw) in enumerate(iter_label_spans(self.source)):
+            rec = json.loads(raw)
+            for k, name in enumerate(names):
+                # Each column's rows arrive in id order: merge-join them with the file
+                while heads[k] is not None and heads[k][0] < rid:
+                    heads[k] = next(cursors[k], None)
+                if heads[k] is not None and heads[k][0] == rid:
+                    rec[name] = json.loads(heads[k][1])
+            yield rec
+
+    # ---------- derived columns ----------
+
+    def set_column(self, name: str, values, default: Any = None, by: str = "basename") -> int:
+        """
+        Store a derived column without touching the source file.
+
+        values is either an iterable of (record number, value) pairs, or a mapping keyed
+        by basename (by="basename") or full image path (by="path"). With a mapping,
+        records whose key is missing get `default` (None = leave unset). Returns the
+        number of values written; an existing column of the same name is replaced.
+        """
+        if isinstance(values, Mapping):
+            col = 2 if by == "basename" else 1
+
+            def pairs():
+                rows = self.conn.cursor().execute(
+                    "SELECT id, image_path, basename FROM records ORDER BY id")
+                for row in rows:
+                    key = row[col]
+                    if key in values:
+                        yield row[0], values[key]
+                    elif default is not None:
+                        yield row[0], default
+            items: Iterable[Tuple[int, Any]] = pairs()
+        else:
+            items = values
+        before = self.conn.total_changes
+        with self.conn:
+            self.conn.execute("DELETE FROM derived WHERE name = ?", (name,))
+            deleted = self.conn.total_changes - before
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO derived (id, name, value) VALUES (?, ?, ?)",
+                ((int(rid), name, json.dumps(v, default=str)) for rid, v in items),
+            )
+        return self.conn.total_changes - before - deleted
+
+    def drop_column(self, name: str):
+        with self.conn:
+            self.conn.execute("DELETE FROM derived WHERE name = ?", (name,))
+
+    # ---------- mirrors ----------
+
+    def write_jsonl(self, out_path: str, as_array: bool = False):
+        """Write the merged records (source + derived) to a new JSONL or JSON-array file."""
+        parent = os.path.dirname(out_path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        with open(out_path, "w") as f:
+            if as_array:
+                f.write("[\n")
+            for i, rec in enumerate(self.iter_records()):
+                if as_array and i:
+                    f.write(",\n")
+                f.write(json.dumps(rec))
+                if not as_array:
+                    f.write("\n")
+            if as_array:
+                f.write("\n]\n")
+
+    def to_parquet(self, out_path: str, chunk_rows: int = 5000):
+        """
+        Parquet mirror of the merged records, streamed in chunks. Top-level fields become
+        columns; nested values (lists, dicts) are stored as JSON strings. Column types
+        come from a pass over the whole index first, so a field that is a number in one
+        record and text in a later one is stored as text rather than failing mid-write.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        kinds: Dict[str, Optional[str]] = {"_id": "int"}
+        for rec in iter_label_records(self.source):
+            for k, v in rec.items():
+                kinds[k] = _merge_kind(kinds.get(k), v)
+        for name, value in self.conn.execute("SELECT name, value FROM derived"):
+            kinds[name] = _merge_kind(kinds.get(name), json.loads(value))
+        arrow = {"bool": pa.bool_(), "int": pa.int64(), "float": pa.float64()}
+        schema = pa.schema([pa.field(n, arrow.get(k, pa.string())) for n, k in kinds.items()])
+
+        def cell(v, kind):
+            if v is None or kind in ("bool", "int"):
+                return v
+            if kind == "float":
+                return float(v)
+            return v if isinstance(v, str) else json.dumps(v)
+
+        parent = os.path.dirname(out_path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        with pq.ParquetWriter(out_path, schema) as writer:
+            buf: List[Dict[str, Any]] = []
+
+            def flush():
+                data = {n: [cell(r.get(n), k) for r in buf] for n, k in kinds.items()}
+                writer.write_table(pa.table(data, schema=schema))
+                buf.clear()
+
+            for rid, rec in enumerate(self.iter_records()):
+                rec["_id"] = rid
+                buf.append(rec)
+                if len(buf) >= chunk_rows:
+                    flush()
+            if buf:
+                flush()
+
+
+def _merge_kind(kind: Optional[str], value: Any) -> Optional[str]:
+    """Widen a column kind (None, bool, int, float, str) to also hold `value`."""
+    if value is None:
+        return kind
+    if isinstance(value, bool):
+        new = "bool"
+    elif isinstance(value, int):
+        new = "int"
+    elif isinstance(value, float):
+        new = "float"
+    else:
+        new = "str"
+    if kind is None or kind == new:
+        return new
+    if {kind, new} == {"int", "float"}:
+        return "float"
+    return "str"
@@ -0,0 +1,258 @@
+import os
+import re
+import sqlite3
+from functools import partial
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from PIL import Image
+
+from .exif_utils import extract_exif_datetime
+from .grayscale import analyze_file
+from .prefetch import prefetch_map
+
+VALID_EXTS = {".jpg", ".jpeg", ".png"}
+SM_PART = re.compile(r"^SM_\d+$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    path        TEXT PRIMARY KEY,
+    dir         TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    mtime_ns    INTEGER NOT NULL,
+    sm          TEXT,
+    capture_dt  TEXT,
+    width       INTEGER,
+    height      INTEGER,
+    is_gray     INTEGER,
+    error       TEXT
+);
+CREATE INDEX IF NOT EXISTS images_dir ON images(dir);
+CREATE INDEX IF NOT EXISTS images_sm_dt ON images(sm, capture_dt);
+CREATE TABLE IF NOT EXISTS dirs (
+    path      TEXT PRIMARY KEY,
+    parent    TEXT,
+    mtime_ns  INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs(parent);
+"""
+
+COLUMNS = ["path", "dir", "size", "mtime_ns", "sm", "capture_dt",
+           "width", "height", "is_gray", "error"]
+
+
+def sm_location(path: str) -> Optional[str]:
+    """Return the SM_X component of a path (the camera location), if any."""
+    for part in path.split(os.sep):
+        if SM_PART.match(part):
+            return part
+    return None
+
+
+def read_image_info(path: str, with_grayscale: bool = True) -> Dict[str, Any]:
+    """Header-level metadata for one image: capture time, dimensions, grayscale flag."""
+    info = {"capture_dt": None, "width": None, "height": None, "is_gray": None, "error": None}
+    try:
+        if with_grayscale:
+            info["width"], info["height"], bw = analyze_file(path)
+            info["is_gray"] = int(bw)
+        else:
+            with Image.open(path) as im:
+                info["width"], info["height"] = im.size
+        dt = extract_exif_datetime(path)
+        if dt is not None:
+            info["capture_dt"] = dt.strftime("%Y-%m-%d %H:%M:%S")
+    except Exception as e:
+        info["error"] = str(e)
+    return info
+
+
+def _read_job(job, with_grayscale=True):
+    return read_image_info(job[0], with_grayscale)
+
+
+def _prefix_bounds(root: str):
+    prefix = os.path.abspath(root).rstrip(os.sep) + os.sep
+    return prefix, prefix + "\uffff"
+
+
+class Manifest:
+    """
+    SQLite index of the camera-trap image tree.
+
+    refresh() walks the tree once and re-reads metadata only for files whose
+    size/mtime changed. Directories whose mtime is unchanged are not even listed;
+    their known files and subdirectories come from the index (pass deep=True to
+    also catch files overwritten in place). Everything else queries the index.
+    """
+
+    def __init__(self, db_path: str):
+        parent = os.path.dirname(db_path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------- refresh ----------
+
+    def refresh(self, root: str, workers: int = 8, with_grayscale: bool = True,
+                deep: bool = False) -> Dict[str, int]:
+        root = os.path.abspath(root)
+        lo, hi = _prefix_bounds(root)
+        known_dirs = dict(self.conn.execute(
+            "SELECT path, mtime_ns FROM dirs WHERE path = ? OR (path >= ? AND path < ?)",
+            (root, lo, hi)))
+        known_files: Dict[str, tuple] = {}
+        files_by_dir: Dict[str, List[str]] = {}
+        for path, d, size, mtime in self.conn.execute(
+                "SELECT path, dir, size, mtime_ns FROM images WHERE path >= ? AND path < ?",
+                (lo, hi)):
+            known_files[path] = (size, mtime)
+            files_by_dir.setdefault(d, []).append(path)
+        subdirs_by_parent: Dict[str, List[str]] = {}
+        for path, parent in self.conn.execute(
+                "SELECT path, parent FROM dirs WHERE path >= ? AND path < ?", (lo, hi)):
+            # parent is NULL for roots recorded by older versions; it is still their dirname
+            subdirs_by_parent.setdefault(parent or os.path.dirname(path), []).append(path)
+
+        seen_files = set()
+        dir_rows = []
+        todo = []  # (path, dir, size, mtime_ns)
+        stack = [root]
+        while stack:
+            d = stack.pop()
+            try:
+                d_mtime = os.stat(d).st_mtime_ns
+            except OSError:
+                continue
+            # The root keeps its real parent too, so refreshing a sub-root (tree/SM_1)
+            # doesn't cut it out of an earlier refresh of the whole tree
+            dir_rows.append((d, os.path.dirname(d), d_mtime))
+            if not deep and known_dirs.get(d) == d_mtime:
+                seen_files.update(files_by_dir.get(d, []))
+                stack.extend(subdirs_by_parent.get(d, []))
+                continue
+            try:
+                entries = list(os.scandir(d))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                    continue
+                if os.path.splitext(entry.name)[1].lower() not in VALID_EXTS:
+                    continue
+                st = entry.stat()
+                seen_files.add(entry.path)
+                if known_files.get(entry.path) != (st.st_size, st.st_mtime_ns):
+                    todo.append((entry.path, d, st.st_size, st.st_mtime_ns))
+
+        removed = [(p,) for p in known_files if p not in seen_files]
+        live_dirs = {row[0] for row in dir_rows}
+        stale_dirs = [(p,) for p in known_dirs if p not in live_dirs]
+
+        reader = partial(_read_job, with_grayscale=with_grayscale)
+        rows = []
+        for (path, d, size, mtime), fut in prefetch_map(reader, todo, workers=workers,
+                                                        depth=workers * 4):
+            info = fut.result()
+            rows.append((path, d, size, mtime, sm_location(path), info["capture_dt"],
+                         info["width"], info["height"], info["is_gray"], info["error"]))
+            if len(rows) >= 1000:
+                self._upsert_images(rows)
+                rows = []
+        self._upsert_images(rows)
+
+        with self.conn:
+            self.conn.executemany("DELETE FROM images WHERE path = ?", removed)
+            self.conn.executemany("DELETE FROM dirs WHERE path = ?", stale_dirs)
+            # Directory mtimes are recorded last so an interrupted refresh re-lists them
+            self.conn.executemany("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)", dir_rows)
+
+        added = sum(1 for t in todo if t[0] not in known_files)
+        return {
+            "files": len(seen_files),
+            "added": added,
+            "updated": len(todo) - added,
+            "removed": len(removed),
+            "unchanged": len(seen_files) - len(todo),
+        }
+
+    def _upsert_images(self, rows):
+        if not rows:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    # ---------- queries ----------
+
+    def query(self, root: Optional[str] = None, **filters) -> List[Dict[str, Any]]:
+        """
+        Return manifest rows (dicts) sorted by path.
+        start/end bound capture_dt as 'YYYY-MM-DD[ HH:MM:SS]' strings (end exclusive).
+        """
+        return list(self.iter_query(root, **filters))
+
+    def iter_query(self, root: Optional[str] = None, sm: Optional[str] = None,
+                   start: Optional[str] = None, end: Optional[str] = None,
+                   grayscale: Optional[bool] = None, exts: Optional[Iterable[str]] = None,
+                   include_errors: bool = False) -> Iterator[Dict[str, Any]]:
+        """Same rows as query(), streamed from the database one at a time."""
+        where, args = [], []
+        if root:
+            lo, hi = _prefix_bounds(root)
+            where.append("path >= ? AND path < ?")
+            args += [lo, hi]
+        if sm:
+            where.append("sm = ?")
+            args.append(sm)
+        if start:
+            where.append("capture_dt >= ?")
+            args.append(start)
+        if end:
+            where.append("capture_dt < ?")
+            args.append(end)
+        if grayscale is not None:
+            where.append("is_gray = ?")
+            args.append(int(grayscale))
+        if not include_errors:
+            where.append("error IS NULL")
+        sql = "SELECT " + ", ".join(COLUMNS) + " FROM images"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY path"
+        exts = {e.lower() for e in exts} if exts else None
+        for r in self.conn.cursor().execute(sql, args):
+            row = dict(zip(COLUMNS, r))
+            if exts and os.path.splitext(row["path"])[1].lower() not in exts:
+                continue
+            yield row
+
+    def paths(self, root: Optional[str] = None, **filters) -> List[str]:
+        return [r["path"] for r in self.query(root, **filters)]
+
+    def paths_by_sm(self, root: Optional[str] = None, **filters) -> Dict[str, List[str]]:
+        out: Dict[str, List[str]] = {}
+        for r in self.query(root, **filters):
+            if r["sm"]:
+                out.setdefault(r["sm"], []).append(r["path"])
+        return out
+
+
+def open_manifest(db_path: str, root: Optional[str] = None, refresh: bool = True,
+                  **refresh_kwargs) -> Manifest:
+    """Open a manifest and (by default) bring it up to date for `root`."""
+    m = Manifest(db_path)
+    if root and refresh:
+        m.refresh(root, **refresh_kwargs)
+    return m
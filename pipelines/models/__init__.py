@@ -1,24 +1,99 @@
-from .baseline import BaselineModel
-from .resnet50 import ResNet50Model
-from .clip_zeroshot import CLIPZeroShotModel
-from .yolo_v7 import YOLOv7Model
-from .sam_vit_b import SAMViTBModel
-from .grounding_dino_tiny import GroundingDinoTinyModel
+import importlib
+
+from .base import BaseModel
+
+# name -> "module:Class". Modules are imported only when make_model selects them,
+# so `import pipelines.models` never pulls in torch/transformers/open_clip/SAM.
+_REGISTRY = {
+    "baseline": ".baseline:BaselineModel",
+    "resnet50": ".resnet50:ResNet50Model",
+    "clip": ".clip_zeroshot:CLIPZeroShotModel",
+    "yolov7": ".yolo_v7:YOLOv7Model",
+    "sam_vit_b": ".sam_vit_b:SAMViTBModel",
+    "grounding_dino_tiny": ".grounding_dino_tiny:GroundingDinoTinyModel",
+}
+
+# Third-party packages can add models with, in their pyproject.toml:
+#   [project.entry-points."stone_mountain.models"]
+#   my_model = "my_pkg.models:MyModel"
+ENTRY_POINT_GROUP = "stone_mountain.models"
+
+_loaded = {}
+_entry_points_scanned = False
+
+
+def register_model(name: str, target):
+    """Register a model class, or a lazy "module:Class" string, under `name`."""
+    name = name.lower()
+    _loaded.pop(name, None)
+    if isinstance(target, str):
+        _REGISTRY[name] = target
+    else:
+        _REGISTRY[name] = f"{target.__module__}:{target.__qualname__}"
+        _loaded[name] = target
+
+
+def _scan_entry_points():
+    global _entry_points_scanned
+    if _entry_points_scanned:
+        return
+    _entry_points_scanned = True
+    from importlib.metadata import entry_points
+
+    for ep in entry_points(group=ENTRY_POINT_GROUP):
+        _REGISTRY.setdefault(ep.name.lower(), ep.value)
+
+
+def available_models():
+    _scan_entry_points()
+    return sorted(_REGISTRY)
+
+
+def get_model_class(name: str):
+    name = name.lower()
+    if name not in _REGISTRY:
+        _scan_entry_points()
+    if name in _loaded:
+        return _loaded[name]
+    target = _REGISTRY.get(name)
+    if target is None:
+        raise KeyError(f"Unknown model '{name}'. Available: {', '.join(available_models())}")
+    module_name, _, attr = target.partition(":")
+    cls = importlib.import_module(module_name, package=__name__)
+    for part in attr.split("."):
+        cls = getattr(cls, part)
+    _loaded[name] = cls
+    return cls
+
 
 def make_model(model_cfg: dict):
     name = (model_cfg.get("name") or "baseline").lower()
     paths = model_cfg.get("paths", {})
     settings = model_cfg.get("settings", {})
 
-    if name == "resnet50":
-        return ResNet50Model(paths.get("resnet50", ""), settings)
-    if name == "clip":
-        return CLIPZeroShotModel(paths.get("clip", ""), settings)
-    if name == "yolov7":
-        return YOLOv7Model(paths.get("yolov7", ""), settings)
-    if name == "sam_vit_b":
-        return SAMViTBModel(paths.get("sam_vit_b", ""), settings)
-    if name == "grounding_dino_tiny":
-        return GroundingDinoTinyModel(paths.get("grounding_dino_tiny", ""), settings)
+    if name != "baseline":
+        try:
+            cls = get_model_class(name)
+        except KeyError:
+            cls = None
+        if cls is not None:
+            return cls(paths.get(name, ""), settings)
     # default
-    return BaselineModel("", settings)
\ No newline at end of file
+    return get_model_class("baseline")("", settings)
+
+
+_LAZY_EXPORTS = {
+    "BaselineModel": "baseline",
+    "ResNet50Model": "resnet50",
+    "CLIPZeroShotModel": "clip",
+    "YOLOv7Model": "yolov7",
+    "SAMViTBModel": "sam_vit_b",
+    "GroundingDinoTinyModel": "grounding_dino_tiny",
+}
+
+
+def __getattr__(attr):
+    # Keeps `from pipelines.models import ResNet50Model` working without eager imports
+    if attr in _LAZY_EXPORTS:
+        return get_model_class(_LAZY_EXPORTS[attr])
+    raise AttributeError(f"module {__name__!r} has no attribute {attr!r}")
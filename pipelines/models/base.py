@@ -1,12 +1,32 @@
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Tuple
 
 class BaseModel:
+    # Smallest (width, height) frame the model's preprocessing needs. The loader decodes
+    # JPEGs at the nearest 1/2, 1/4 or 1/8 scale that is still at least this big
+    # (pipelines.dataset.decode_size_for). None = full resolution, e.g. detectors that
+    # report boxes in full-frame pixels. settings["input_size"] overrides it.
+    input_size: Optional[Tuple[int, int]] = None
+
     def __init__(self, model_path: str, settings: Dict[str, Any] | None = None):
         self.model_path = model_path
         self.settings = settings or {}
+        # Preferred micro-batch size for predict_batch; models with a real batched
+        # forward pass should raise this via settings["batch_size"].
+        self.batch_size = int(self.settings.get("batch_size", 1))
+        if "input_size" in self.settings:
+            size = self.settings["input_size"]
+            self.input_size = tuple(size) if size else None
 
     def predict(self, img_path: str, pil_image) -> Dict[str, Any]:
         """Return a dict with fields used by run_models:
            common_name, species, number, same_individual, sex, notes, best_photo
+           Detectors also return "detections": a list of pipelines.crops.make_detection
+           dicts (box, score, label, optional mask) in full-frame pixel coordinates.
+        """
+        raise NotImplementedError
+
+    def predict_batch(self, img_paths: List[str], pil_images: List) -> List[Dict[str, Any]]:
+        """Return one predict()-style dict per input, in input order.
+           Override for a batched forward pass; the default loops over predict().
         """
-        raise NotImplementedError
\ No newline at end of file
+        return [self.predict(p, im) for p, im in zip(img_paths, pil_images)]
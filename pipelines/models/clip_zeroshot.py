@@ -3,6 +3,8 @@ from .base import BaseModel
 # TODO: import transformers or open_clip; tokenize text prompts from settings["text_queries"]
 
 class CLIPZeroShotModel(BaseModel):
+    input_size = (224, 224)  # CLIP ViT preprocessing works at 224; no need to decode full 1920x1080 frames
+
     def __init__(self, model_path, settings):
         super().__init__(model_path, settings)
         self.text_queries = settings.get("text_queries", [])
@@ -4,6 +4,8 @@ from .base import BaseModel
 # TODO: class index mapping for ImageNet or your custom classes
 
 class ResNet50Model(BaseModel):
+    input_size = (256, 256)  # resize 256 + center crop 224; no need to decode full 1920x1080 frames
+
     def __init__(self, model_path, settings):
         super().__init__(model_path, settings)
         # TODO: load weights from self.model_path (torchvision or HF), set eval(), device, transforms
@@ -0,0 +1,169 @@
+from functools import partial
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from .prefetch import prefetch_map
+
+Box = Tuple[int, int, int, int]
+
+
+def overlay_mask(img, sat_threshold: int = 80, val_threshold: int = 40) -> np.ndarray:
+    """High saturation and not too dark -> likely a coloured overlay/mask pixel."""
+    hsv = np.asarray(img.convert("HSV"))
+    return (hsv[:, :, 1] > sat_threshold) & (hsv[:, :, 2] > val_threshold)
+
+
+def bbox_from_mask(mask: np.ndarray) -> Optional[Box]:
+    """(xmin, ymin, xmax, ymax) of True pixels using row/column any() reductions."""
+    rows = np.flatnonzero(mask.any(axis=1))
+    if rows.size == 0:
+        return None
+    cols = np.flatnonzero(mask[rows[0]:rows[-1] + 1].any(axis=0))
+    return int(cols[0]), int(rows[0]), int(cols[-1]), int(rows[-1])
+
+
+def _label(grid: np.ndarray):
+    """8-connected components of a small boolean grid (iterative flood fill)."""
+    labels = np.zeros(grid.shape, dtype=np.int32)
+    h, w = grid.shape
+    n = 0
+    for y, x in zip(*np.nonzero(grid)):
+        if labels[y, x]:
+            continue
+        n += 1
+        labels[y, x] = n
+        stack = [(y, x)]
+        while stack:
+            cy, cx = stack.pop()
+            for ny in range(max(0, cy - 1), min(h, cy + 2)):
+                for nx in range(max(0, cx - 1), min(w, cx + 2)):
+                    if grid[ny, nx] and not labels[ny, nx]:
+                        labels[ny, nx] = n
+                        stack.append((ny, nx))
+    return labels, n
+
+
+def region_boxes(mask: np.ndarray, cell: int = 8, min_area: int = 16) -> List[Box]:
+    """
+    One box per disjoint region of `mask`. Regions are found on a cell x cell occupancy
+    grid (so blobs closer than `cell` pixels merge), then each box is measured exactly
+    on the mask pixels inside its cells. Regions under min_area pixels are dropped.
+    """
+    h, w = mask.shape
+    gh, gw = -(-h // cell), -(-w // cell)
+    padded = np.zeros((gh * cell, gw * cell), dtype=bool)
+    padded[:h, :w] = mask
+    grid = padded.reshape(gh, cell, gw, cell).any(axis=(1, 3))
+    labels, n = _label(grid)
+
+    boxes = []
+    for i in range(1, n + 1):
+        gy, gx = np.nonzero(labels == i)
+        y0, y1, x0, x1 = gy.min(), gy.max() + 1, gx.min(), gx.max() + 1
+        cells = np.repeat(np.repeat(labels[y0:y1, x0:x1] == i, cell, axis=0), cell, axis=1)
+        sub = padded[y0 * cell:y1 * cell, x0 * cell:x1 * cell] & cells
+        if int(sub.sum()) < min_area:
+            continue
+        b = bbox_from_mask(sub)
+        boxes.append((b[0] + x0 * cell, b[1] + y0 * cell, b[2] + x0 * cell, b[3] + y0 * cell))
+    boxes.sort(key=lambda b: (b[1], b[0]))
+    return boxes
+
+
+def _refine(img, coarse: Box, factor: int, sat_threshold: int, val_threshold: int) -> Box:
+    """
+    Turn a box found on a 1/factor plane into full-resolution pixels, converting to HSV
+    only the strips around each edge (the interior is already known to be inside).
+    """
+    width, height = img.size
+    x0, y0, x1, y1 = coarse
+    # Full-res window that must contain the region
+    L, T = max(0, (x0 - 1) * factor), max(0, (y0 - 1) * factor)
+    R, B = min(width, (x1 + 2) * factor), min(height, (y1 + 2) * factor)
+    band = 2 * factor
+
+    def strip(box):
+        return overlay_mask(img.crop(box), sat_threshold, val_threshold)
+
+    left_m = strip((L, T, min(R, L + band), B))
+    right_m = strip((max(L, R - band), T, R, B))
+    top_m = strip((L, T, R, min(B, T + band)))
+    bottom_m = strip((L, max(T, B - band), R, B))
+
+    def first(a):
+        idx = np.flatnonzero(a)
+        return int(idx[0]) if idx.size else None
+
+    def last(a):
+        idx = np.flatnonzero(a)
+        return int(idx[-1]) if idx.size else None
+
+    left = first(left_m.any(axis=0))
+    right = last(right_m.any(axis=0))
+    top = first(top_m.any(axis=1))
+    bottom = last(bottom_m.any(axis=1))
+    return (
+        L + left if left is not None else x0 * factor,
+        T + top if top is not None else y0 * factor,
+        max(L, R - band) + right if right is not None else min(width, (x1 + 1) * factor) - 1,
+        max(T, B - band) + bottom if bottom is not None else min(height, (y1 + 1) * factor) - 1,
+    )
+
+
+def _pad(box: Box, size, padding: int) -> Optional[Box]:
+    width, height = size
+    xmin, ymin, xmax, ymax = box
+    left = max(0, xmin - padding)
+    top = max(0, ymin - padding)
+    right = min(width, xmax + padding)
+    bottom = min(height, ymax + padding)
+    if right <= left or bottom <= top:
+        return None
+    return int(left), int(top), int(right), int(bottom)
+
+
+def overlay_boxes(img, sat_threshold: int = 80, val_threshold: int = 40, padding: int = 10,
+                  downscale: int = 1, separate: bool = True, min_area: int = 16) -> List[Box]:
+    """
+    Bounding boxes (left, top, right, bottom) of coloured overlay regions.
+
+    downscale > 1 thresholds a reduced HSV plane first and then refines each edge at
+    full resolution. Overlays thinner than `downscale` pixels may be missed, so keep 1
+    when exactness matters. With separate=True each disjoint region gets its own box
+    (see region_boxes); otherwise a single box around all overlay pixels is returned.
+    """
+    factor = max(1, int(downscale))
+    work = img.reduce(factor) if factor > 1 else img
+    mask = overlay_mask(work, sat_threshold, val_threshold)
+
+    if separate:
+        coarse = region_boxes(mask, min_area=min_area)
+    else:
+        b = bbox_from_mask(mask)
+        coarse = [b] if b is not None else []
+
+    boxes = []
+    for b in coarse:
+        full = _refine(img, b, factor, sat_threshold, val_threshold) if factor > 1 else b
+        padded = _pad(full, img.size, padding)
+        if padded is not None:
+            boxes.append(padded)
+    return boxes
+
+
+def overlay_boxes_file(path: str, **kwargs) -> List[Box]:
+    with Image.open(path) as im:
+        return overlay_boxes(im.convert("RGB"), **kwargs)
+
+
+def overlay_boxes_for_paths(paths, workers: int = 4, executor: str = "process", **kwargs):
+    """Yield (path, [boxes]) or (path, exception) for many overlay renders on a worker pool."""
+    fn = partial(overlay_boxes_file, **kwargs)
+    for p, fut in prefetch_map(fn, paths, workers=workers, depth=workers * 4,
+                               executor=executor):
+        try:
+            yield p, fut.result()
+        except Exception as e:
+            yield p, e
@@ -0,0 +1,46 @@
+import concurrent.futures as futures
+from collections import deque
+
+
+def make_executor(kind: str, workers: int):
+    """Return a thread or process pool; threads suit PIL decode (it drops the GIL)."""
+    if kind == "process":
+        return futures.ProcessPoolExecutor(max_workers=workers)
+    return futures.ThreadPoolExecutor(max_workers=workers)
+
+
+def prefetch_map(fn, items, workers: int = 4, depth: int = 16, ordered: bool = True,
+                 executor: str = "thread"):
+    """
+    Apply `fn` to each item on a worker pool, keeping at most `depth` calls in flight.
+    Yields (item, future) pairs; call future.result() to get the value or re-raise.
+
+    - ordered=True yields in input order (deterministic).
+    - ordered=False yields as soon as each call finishes (best throughput).
+    """
+    depth = max(depth, workers, 1)
+    it = iter(items)
+    with make_executor(executor, workers) as pool:
+        pending = deque()
+        try:
+            for item in it:
+                pending.append((item, pool.submit(fn, item)))
+                if len(pending) < depth:
+                    continue
+                yield from _drain(pending, ordered, until=depth - 1)
+            yield from _drain(pending, ordered, until=0)
+        finally:
+            # Consumer stopped early: don't decode what nobody will read
+            for _, fut in pending:
+                fut.cancel()
+
+
+def _drain(pending: deque, ordered: bool, until: int):
+    while len(pending) > until:
+        if ordered:
+            yield pending.popleft()
+            continue
+        done, _ = futures.wait([f for _, f in pending], return_when=futures.FIRST_COMPLETED)
+        for pair in [p for p in pending if p[1] in done]:
+            pending.remove(pair)
+            yield pair
@@ -0,0 +1,270 @@
+"""
+Cheap CPU empty-frame prefilter, run before any BaseModel.predict.
+
+Each frame is decoded at thumbnail size (JPEG draft mode) and compared with a running
+median background for its camera (SM location) and time-of-day bucket. Frames that
+barely differ from that background are flagged likely-empty and never reach the
+detector. The threshold is calibrated against labelled frames to hit a recall target,
+and recall is reported on capture days held out of the calibration. run_models.py
+applies it before the model when its config has a `prefilter:` section.
+
+    python -m pipelines.prefilter --root "Camera Trap Photos" \
+        --labels experiments/SpeciesNet/predictions-full-dataset.json --recall 0.98
+"""
+import argparse
+import json
+import os
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from PIL import Image
+
+from .exif_utils import fast_exif_datetime
+from .jobqueue import shard_of
+from .manifest import sm_location
+from .prefetch import prefetch_map
+
+THUMB_SIZE = (96, 54)  # 16:9 like our 1920x1080 frames
+
+
+def load_thumb(path: str, size=THUMB_SIZE) -> Dict[str, Any]:
+    """Capture time plus a small grayscale uint8 thumbnail of one frame (~5 KB)."""
+    dt, _ = fast_exif_datetime(path)
+    with Image.open(path) as im:
+        im.draft("L", (size[0] * 2, size[1] * 2))
+        thumb = np.asarray(im.convert("L").resize(size, Image.BILINEAR), dtype=np.uint8)
+    return {"path": path, "sm": sm_location(path), "capture_dt": dt, "thumb": thumb}
+
+
+class BackgroundModel:
+    """
+    Running median of the last `history` frames per (SM location, time-of-day bucket).
+    Thumbnails are kept as uint8 and only converted to float while a frame is scored.
+    """
+
+    def __init__(self, history: int = 15, min_history: int = 3, bucket_hours: int = 3,
+                 pixel_threshold: float = 25.0):
+        self.history = history
+        self.min_history = min_history
+        self.bucket_hours = bucket_hours
+        self.pixel_threshold = pixel_threshold
+        self._frames: Dict[tuple, deque] = {}
+
+    def key(self, sm: Optional[str], capture_dt) -> tuple:
+        bucket = capture_dt.hour // self.bucket_hours if capture_dt is not None else -1
+        return sm, bucket
+
+    def score(self, key: tuple, thumb: np.ndarray) -> float:
+        """Fraction of pixels that differ from the background; inf if no background yet."""
+        frames = self._frames.get(key)
+        if not frames or len(frames) < self.min_history:
+            return float("inf")
+        bg = np.median(np.stack(frames), axis=0)
+        thumb = thumb.astype(np.float32)
+        # Compensate global exposure changes (clouds, IR flash strength)
+        scale = bg.mean() / max(float(thumb.mean()), 1.0)
+        diff = np.abs(thumb * scale - bg)
+        return float((diff > self.pixel_threshold).mean())
+
+    def update(self, key: tuple, thumb: np.ndarray):
+        frames = self._frames.get(key)
+        if frames is None:
+            frames = self._frames[key] = deque(maxlen=self.history)
+        frames.append(thumb)
+
+
+def score_frames(paths: Iterable[str], workers: int = 8,
+                 background: Optional[BackgroundModel] = None) -> List[Dict[str, Any]]:
+    """
+    Motion score per frame (higher = more likely an animal). Frames are scored per
+    camera in capture-time order, so each one is compared with the frames before it.
+    """
+    background = background or BackgroundModel()
+    thumbs = []
+    for p, fut in prefetch_map(load_thumb, paths, workers=workers, depth=workers * 8,
+                               ordered=False):
+        try:
+            thumbs.append(fut.result())
+        except Exception:
+            # Unreadable: let the detector stage decide (and report) it
+            thumbs.append({"path": str(p), "sm": sm_location(str(p)), "capture_dt": None,
+                           "thumb": None})
+
+    def order(t):
+        return (t["sm"] or "", t["capture_dt"] is None, t["capture_dt"] or 0, t["path"])
+
+    out = []
+    for t in sorted(thumbs, key=order):
+        thumb = t.pop("thumb")  # release each thumbnail once its camera has used it
+        if thumb is None:
+            s = float("inf")
+        else:
+            key = background.key(t["sm"], t["capture_dt"])
+            s = background.score(key, thumb)
+            background.update(key, thumb)
+        out.append({"path": t["path"], "sm": t["sm"], "capture_dt": t["capture_dt"], "score": s})
+    return out
+
+
+def split_frames(scored: List[Dict[str, Any]], threshold: float):
+    """(frames for the detector, frames flagged likely-empty)."""
+    keep = [f for f in scored if f["score"] >= threshold]
+    empty = [f for f in scored if f["score"] < threshold]
+    return keep, empty
+
+
+def prefilter_paths(paths: List[str], cfg: Dict[str, Any], workers: int = 8):
+    """
+    Run the prefilter from a run_models `prefilter:` config section:
+        {enabled: true, threshold: 0.004, history: 15, min_history: 3, bucket_hours: 3,
+         pixel_threshold: 25}
+    Returns (paths for the detector in input order, frames flagged likely-empty,
+    {path: score}).
+    """
+    if cfg.get("threshold") is None:
+        raise ValueError("prefilter.threshold is required; calibrate it with "
+                         "python -m pipelines.prefilter --root ... --labels ...")
+    background = BackgroundModel(
+        history=int(cfg.get("history", 15)), min_history=int(cfg.get("min_history", 3)),
+        bucket_hours=int(cfg.get("bucket_hours", 3)),
+        pixel_threshold=float(cfg.get("pixel_threshold", 25.0)))
+    scored = score_frames(paths, workers=workers, background=background)
+    keep, empty = split_frames(scored, float(cfg["threshold"]))
+    kept = {f["path"] for f in keep}
+    return [p for p in paths if p in kept], empty, {f["path"]: f["score"] for f in scored}
+
+
+# ---------- calibration / evaluation against SpeciesNet labels ----------
+
+def path_key(path: str, parts: int = 3) -> str:
+    """Last `parts` path components (SM_X/date/file), lowercased, to match across roots."""
+    comps = os.path.normpath(path).replace("\\", "/").split("/")
+    return "/".join(comps[-parts:]).lower()
+
+
+def load_speciesnet_labels(path: str, parts: int = 3) -> Dict[str, bool]:
+    """
+    {path_key: has_animal} from a SpeciesNet predictions JSON or the `predictions`
+    table of speciesnet_result.duckdb. Anything not predicted blank counts as animal.
+    """
+    rows = []
+    if path.endswith(".duckdb"):
+        import duckdb
+
+        con = duckdb.connect(path, read_only=True)
+        try:
+            rows = con.execute("SELECT filepath, prediction FROM predictions").fetchall()
+        finally:
+            con.close()
+    else:
+        with open(path, "r") as f:
+            data = json.load(f)
+        for p in data if isinstance(data, list) else data.get("predictions", []):
+            rows.append((p.get("filepath"), p.get("prediction")))
+
+    labels = {}
+    for filepath, prediction in rows:
+        if not filepath:
+            continue
+        pred = (prediction or "").lower()
+        labels[path_key(filepath, parts)] = not (pred.endswith("blank") or "no cv result" in pred)
+    return labels
+
+
+def holdout_split(scored: List[Dict[str, Any]], by: str = "date", fraction: float = 0.3):
+    """
+    (calibration frames, held-out frames). by="date" holds out whole capture days,
+    by="sm" whole camera locations, so a burst never lands on both sides.
+    """
+    def group(f):
+        if by == "sm":
+            return f["sm"] or ""
+        return f["capture_dt"].strftime("%Y-%m-%d") if f["capture_dt"] is not None else ""
+
+    calib, held = [], []
+    for f in scored:
+        (held if shard_of(group(f), 1000) < fraction * 1000 else calib).append(f)
+    return calib, held
+
+
+def calibrate_threshold(scored: List[Dict[str, Any]], labels: Dict[str, bool],
+                        recall_target: float = 0.98, parts: int = 3) -> float:
+    """Largest threshold that still passes `recall_target` of the labelled animal frames."""
+    animal_scores = sorted(
+        f["score"] for f in scored if labels.get(path_key(f["path"], parts)) is True
+    )
+    if not animal_scores:
+        return 0.0
+    # Allow at most this many animal frames below the threshold
+    allowed_misses = int(np.floor((1.0 - recall_target) * len(animal_scores)))
+    return animal_scores[allowed_misses]
+
+
+def evaluate(scored: List[Dict[str, Any]], labels: Dict[str, bool], threshold: float,
+             parts: int = 3) -> Dict[str, Any]:
+    labelled = [(f, labels[path_key(f["path"], parts)]) for f in scored
+                if path_key(f["path"], parts) in labels]
+    animals = [f for f, a in labelled if a]
+    blanks = [f for f, a in labelled if not a]
+    passed = sum(1 for f in scored if f["score"] >= threshold)
+    missed = sum(1 for f in animals if f["score"] < threshold)
+    blanks_dropped = sum(1 for f in blanks if f["score"] < threshold)
+    n = len(scored)
+    return {
+        "threshold": threshold,
+        "frames": n,
+        "labelled": len(labelled),
+        "passed_to_detector": passed,
+        "pass_rate": passed / n if n else 0.0,
+        "detector_speedup": n / passed if passed else float("inf"),
+        "animal_frames": len(animals),
+        "animals_missed": missed,
+        "recall": 1.0 - missed / len(animals) if animals else 1.0,
+        "blank_frames": len(blanks),
+        "blanks_filtered": blanks_dropped,
+        "blank_filter_rate": blanks_dropped / len(blanks) if blanks else 0.0,
+    }
+
+
+def main():
+    from .dataset import iter_image_paths
+
+    ap = argparse.ArgumentParser(description="Calibrate and evaluate the empty-frame prefilter.")
+    ap.add_argument("--root", required=True, help="Image root (contains SM_1..SM_5)")
+    ap.add_argument("--labels", required=True, help="SpeciesNet predictions .json or .duckdb")
+    ap.add_argument("--recall", type=float, default=0.98, help="Target animal recall")
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--path-parts", type=int, default=3,
+                    help="Trailing path components used to match image paths to labels")
+    ap.add_argument("--holdout", type=float, default=0.3,
+                    help="Fraction held out of calibration to measure recall on (0 = in-sample)")
+    ap.add_argument("--holdout-by", default="date", choices=("date", "sm"),
+                    help="Hold out whole capture days or whole SM locations")
+    ap.add_argument("--out", default=None, help="Optional JSON report path")
+    args = ap.parse_args()
+
+    scored = score_frames((str(p) for p in iter_image_paths(args.root)), workers=args.workers)
+    labels = load_speciesnet_labels(args.labels, args.path_parts)
+    calib, held = scored, []
+    if args.holdout > 0:
+        calib, held = holdout_split(scored, args.holdout_by, args.holdout)
+    threshold = calibrate_threshold(calib, labels, args.recall, args.path_parts)
+    # Recall on the calibration frames meets the target by construction; report it
+    # separately from the held-out figure
+    report = {
+        "calibration": evaluate(calib, labels, threshold, args.path_parts),
+        "holdout": evaluate(held, labels, threshold, args.path_parts) if held else None,
+        "holdout_by": args.holdout_by if held else None,
+        "all_frames": evaluate(scored, labels, threshold, args.path_parts),
+    }
+    if not held:
+        report["note"] = "no holdout: recall is in-sample and equals the target by construction"
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""
+Per-stage instrumentation for pipeline runs.
+
+    prof = Profiler.from_config({"enabled": True, "cprofile": False, "tracemalloc": False})
+    model = prof.wrap_model(make_model(model_cfg))
+    rows = []
+    with prof.hot_loop():
+        for path, img in prof.iter_images(root, workers=4):
+            rows.append({"path": path, **model.predict(path, img)})
+    prof.write_observations(pd.DataFrame(rows), excel_path)
+    prof.write_report("reports/run")          # run.json + run.md
+
+Stages: walk (directory listing), decode (dataset.decode_rgb: open, pixel decode and
+convert("RGB")), wait (time the consumer blocked on the loader), predict / predict_batch, write.
+A disabled Profiler hands back the original iterators, models and functions, so it
+costs nothing.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from array import array
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from typing import Any, Dict, Optional
+
+from .dataset import decode_rgb, iter_image_paths, iter_images_from_paths
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far, or None where unavailable."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def percentile(sorted_vals, q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    k = (len(sorted_vals) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (k - lo)
+
+
+class _Stage:
+    __slots__ = ("durations", "items")
+
+    def __init__(self):
+        self.durations = array("d")
+        self.items = 0
+
+
+class _TimedModel:
+    """Proxy that times predict / predict_batch and forwards everything else."""
+
+    def __init__(self, model, profiler: "Profiler"):
+        self._model = model
+        self._prof = profiler
+
+    def predict(self, img_path, pil_image):
+        t0 = time.perf_counter()
+        out = self._model.predict(img_path, pil_image)
+        self._prof.record("predict", time.perf_counter() - t0)
+        return out
+
+    def predict_batch(self, img_paths, pil_images):
+        t0 = time.perf_counter()
+        out = self._model.predict_batch(img_paths, pil_images)
+        self._prof.record("predict_batch", time.perf_counter() - t0, items=len(img_paths))
+        return out
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+
+class Profiler:
+    def __init__(self, enabled: bool = True, cprofile: bool = False, tracemalloc: bool = False,
+                 top: int = 25):
+        self.enabled = enabled
+        self.use_cprofile = enabled and cprofile
+        self.use_tracemalloc = enabled and tracemalloc
+        self.top = top
+        self.stages: Dict[str, _Stage] = {}
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+        self._profile_text = None
+        self._alloc_top = None
+
+    @classmethod
+    def from_config(cls, cfg: Optional[Dict[str, Any]]) -> "Profiler":
+        cfg = cfg or {}
+        return cls(enabled=bool(cfg.get("enabled", False)), cprofile=bool(cfg.get("cprofile", False)),
+                   tracemalloc=bool(cfg.get("tracemalloc", False)), top=int(cfg.get("top", 25)))
+
+    # ---------- recording ----------
+
+    def record(self, name: str, seconds: float, items: int = 1):
+        with self._lock:
+            st = self.stages.get(name)
+            if st is None:
+                st = self.stages[name] = _Stage()
+            st.durations.append(seconds)
+            st.items += items
+
+    @contextmanager
+    def _timed(self, name: str, items: int = 1):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - t0, items)
+
+    def stage(self, name: str, items: int = 1):
+        """Context manager timing one occurrence of a stage."""
+        return self._timed(name, items) if self.enabled else nullcontext()
+
+    def wrap_iter(self, name: str, iterable):
+        """Time each next() on iterable (i.e. how long the consumer waited)."""
+        if not self.enabled:
+            return iterable
+        return self._wrap_iter(name, iterable)
+
+    def _wrap_iter(self, name, iterable):
+        it = iter(iterable)
+        while True:
+            t0 = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            self.record(name, time.perf_counter() - t0)
+            yield item
+
+    def wrap_model(self, model):
+        return _TimedModel(model, self) if self.enabled else model
+
+    # ---------- instrumented pipeline pieces ----------
+
+    def decode_rgb(self, path, min_size=None):
+        """dataset.decode_rgb (open, pixel decode and convert("RGB")), timed as `decode`."""
+        with self._timed("decode"):
+            return decode_rgb(path, min_size)
+
+    def iter_images(self, root_dir: str, manifest=None, **kwargs):
+        """dataset.iter_images, instrumented: walk, decode, convert and wait stages."""
+        from .dataset import iter_images
+
+        if not self.enabled:
+            return iter_images(root_dir, manifest=manifest, **kwargs)
+        paths = self.wrap_iter("walk", iter_image_paths(root_dir, manifest))
+        if kwargs.get("executor", "thread") == "thread" and "decode" not in kwargs:
+            # Timings recorded in worker processes would be lost; there only `wait` is kept.
+            # A caller's own decode is left alone, together with its min_size.
+            min_size = kwargs.pop("min_size", None)
+            kwargs["decode"] = (self.decode_rgb if min_size is None
+                                else partial(self.decode_rgb, min_size=tuple(min_size)))
+        return self.wrap_iter("wait", iter_images_from_paths(paths, **kwargs))
+
+    def write_observations(self, df, excel_path: str, overwrite: bool = False):
+        from .writer import write_observations
+
+        with self.stage("write", items=len(df)):
+            write_observations(df, excel_path, overwrite=overwrite)
+
+    # ---------- hot-loop profilers ----------
+
+    @contextmanager
+    def hot_loop(self):
+        """Run the block under cProfile and/or tracemalloc if enabled."""
+        prof = cProfile.Profile() if self.use_cprofile else None
+        started_tm = False
+        if self.use_tracemalloc and not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+            started_tm = True
+        if prof is not None:
+            prof.enable()
+        try:
+            yield
+        finally:
+            if prof is not None:
+                prof.disable()
+                buf = io.StringIO()
+                pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(self.top)
+                self._profile_text = buf.getvalue()
+            if self.use_tracemalloc and tracemalloc.is_tracing():
+                snap = tracemalloc.take_snapshot()
+                current, peak = tracemalloc.get_traced_memory()
+                self._alloc_top = {
+                    "traced_current_mb": current / 1e6,
+                    "traced_peak_mb": peak / 1e6,
+                    "top": [{"where": str(s.traceback[0]), "size_mb": s.size / 1e6, "count": s.count}
+                            for s in snap.statistics("lineno")[:self.top]],
+                }
+                if started_tm:
+                    tracemalloc.stop()
+
+    # ---------- report ----------
+
+    def report(self) -> Dict[str, Any]:
+        stages = {}
+        for name, st in self.stages.items():
+            d = sorted(st.durations)
+            total = sum(d)
+            stages[name] = {
+                "calls": len(d),
+                "items": st.items,
+                "total_s": total,
+                "mean_ms": 1000 * total / len(d) if d else 0.0,
+                "p50_ms": 1000 * percentile(d, 0.50),
+                "p90_ms": 1000 * percentile(d, 0.90),
+                "p99_ms": 1000 * percentile(d, 0.99),
+                "max_ms": 1000 * d[-1] if d else 0.0,
+                "items_per_s": st.items / total if total else None,
+            }
+        out = {
+            "wall_s": time.perf_counter() - self._t0,
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": stages,
+        }
+        if self._alloc_top is not None:
+            out["tracemalloc"] = self._alloc_top
+        if self._profile_text is not None:
+            out["cprofile"] = self._profile_text
+        return out
+
+    def markdown(self, report: Optional[Dict[str, Any]] = None) -> str:
+        r = report or self.report()
+        rss = r["peak_rss_mb"]
+        lines = [
+            "# Run report",
+            "",
+            f"Wall time: {r['wall_s']:.2f} s  ",
+            f"Peak RSS: {rss:.0f} MB" if rss is not None else "Peak RSS: n/a",
+            "",
+            "decode/convert run on the loader workers, so their totals can exceed wall time;",
+            "`wait` is what the model loop actually spent blocked on the loader.",
+            "",
+            "| stage | calls | items | total s | mean ms | p50 ms | p90 ms | p99 ms | max ms | items/s |",
+            "|---|---:|---:|---:|---:|---:|---:|---:|---:|---:|",
+        ]
+        for name, s in sorted(r["stages"].items(), key=lambda kv: -kv[1]["total_s"]):
+            ips = f"{s['items_per_s']:.1f}" if s["items_per_s"] else "-"
+            lines.append(
+                f"| {name} | {s['calls']} | {s['items']} | {s['total_s']:.3f} | {s['mean_ms']:.2f} "
+                f"| {s['p50_ms']:.2f} | {s['p90_ms']:.2f} | {s['p99_ms']:.2f} | {s['max_ms']:.2f} | {ips} |"
+            )
+        if "tracemalloc" in r:
+            tm = r["tracemalloc"]
+            lines += ["", "## tracemalloc", "",
+                      f"Traced peak: {tm['traced_peak_mb']:.1f} MB", "",
+                      "| where | MB | blocks |", "|---|---:|---:|"]
+            lines += [f"| `{t['where']}` | {t['size_mb']:.2f} | {t['count']} |" for t in tm["top"]]
+        if "cprofile" in r:
+            lines += ["", "## cProfile (cumulative)", "", "```", r["cprofile"].strip(), "```"]
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, path_stem: str) -> Optional[Dict[str, Any]]:
+        """Write <path_stem>.json and <path_stem>.md; no-op when disabled."""
+        if not self.enabled:
+            return None
+        r = self.report()
+        parent = os.path.dirname(path_stem)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        with open(path_stem + ".json", "w") as f:
+            json.dump(r, f, indent=2)
+        with open(path_stem + ".md", "w") as f:
+            f.write(self.markdown(r))
+        return r
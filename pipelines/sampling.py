@@ -0,0 +1,193 @@
+"""
+One-pass stratified sampling: k items per stratum by reservoir sampling, over a label
+file (pipelines.labels) or manifest rows (pipelines.manifest), never holding more than
+k items per stratum.
+
+    python -m pipelines.sampling --labels All_labels_2_with_bw.jsonl --strata bw,species \
+        --k 1 --seed 42 --out sample.jsonl
+"""
+import argparse
+import json
+import os
+import random
+import re
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple, Union
+
+from .labels import iter_label_records, record_image_path
+from .manifest import sm_location
+
+_DATE_IN_PATH = re.compile(r"(?<!\d)(20\d{2})(\d{2})(\d{2})(?!\d)|(?<!\d)(\d{2})-(\d{2})-(20\d{2})(?!\d)")
+
+
+def is_black_white(rec: Dict[str, Any]) -> bool:
+    """Black_white label (bool or "true"/"1"/"yes"), or a manifest row's is_gray flag."""
+    val = rec.get("Black_white", rec.get("is_gray"))
+    if isinstance(val, bool):
+        return val
+    if val is None:
+        return False
+    return str(val).strip().lower() in ("true", "1", "yes")
+
+
+def record_path(rec: Dict[str, Any]) -> Optional[str]:
+    return rec.get("path") or record_image_path(rec)
+
+
+def record_sm(rec: Dict[str, Any]) -> Optional[str]:
+    sm = rec.get("sm") or (rec.get("metadata") or {}).get("location")
+    if sm:
+        return sm
+    path = record_path(rec)
+    return sm_location(path.replace("/", os.sep)) if path else None
+
+
+def record_species(rec: Dict[str, Any]) -> Optional[str]:
+    return rec.get("CommonName") or rec.get("common_name") or rec.get("output") or None
+
+
+def record_month(rec: Dict[str, Any]) -> Optional[str]:
+    """'YYYY-MM' from capture_dt, metadata.date (MM-DD-YYYY) or a date in the path."""
+    dt = rec.get("capture_dt")
+    if isinstance(dt, datetime):
+        return dt.strftime("%Y-%m")
+    if isinstance(dt, str) and len(dt) >= 7:
+        return dt[:7].replace(":", "-")
+    for text in ((rec.get("metadata") or {}).get("date"), record_path(rec)):
+        if not text:
+            continue
+        m = _DATE_IN_PATH.search(text)
+        if m:
+            if m.group(1):
+                return f"{m.group(1)}-{m.group(2)}"
+            return f"{m.group(6)}-{m.group(4)}"
+    return None
+
+
+STRATA: Dict[str, Callable[[Dict[str, Any]], Hashable]] = {
+    "sm": record_sm,
+    "species": record_species,
+    "bw": is_black_white,
+    "month": record_month,
+}
+
+Strata = Union[str, Sequence[Union[str, Callable]], Callable[[Any], Hashable]]
+
+
+def make_stratum_fn(strata: Strata) -> Callable[[Any], Tuple]:
+    """Turn 'sm,bw' / ["sm", "month"] / a callable into item -> stratum tuple."""
+    if callable(strata):
+        return lambda item: (strata(item),)
+    if isinstance(strata, str):
+        strata = [s.strip() for s in strata.split(",") if s.strip()]
+    fns = []
+    for s in strata:
+        if callable(s):
+            fns.append(s)
+        elif s in STRATA:
+            fns.append(STRATA[s])
+        else:
+            raise ValueError(f"Unknown stratum {s!r}; choose from {sorted(STRATA)} or pass a callable")
+    return lambda item: tuple(f(item) for f in fns)
+
+
+class StratifiedReservoir:
+    """
+    Keeps a uniform random sample of up to k items per stratum (Algorithm R).
+
+    Each stratum draws from its own RNG seeded with (seed, stratum), so a stratum's
+    sample depends only on the seed and the order of that stratum's items: the same
+    input and seed always give the same sample.
+    """
+
+    def __init__(self, k: int, strata: Strata, seed: int = 42):
+        self.k = max(0, int(k))
+        self.seed = seed
+        self.stratum_of = make_stratum_fn(strata)
+        self.seen: Dict[Tuple, int] = {}
+        self._res: Dict[Tuple, List[Tuple[int, Any]]] = {}
+        self._rngs: Dict[Tuple, random.Random] = {}
+        self._n = 0
+
+    def add(self, item: Any):
+        key = self.stratum_of(item)
+        n = self.seen.get(key, 0)
+        self.seen[key] = n + 1
+        res = self._res.setdefault(key, [])
+        if n < self.k:
+            res.append((self._n, item))
+        else:
+            rng = self._rngs.get(key)
+            if rng is None:
+                rng = self._rngs[key] = random.Random(f"{self.seed}:{key!r}")
+            j = rng.randrange(n + 1)
+            if j < self.k:
+                res[j] = (self._n, item)
+        self._n += 1
+
+    def add_all(self, items: Iterable[Any]) -> "StratifiedReservoir":
+        for item in items:
+            self.add(item)
+        return self
+
+    def sample(self) -> Dict[Tuple, List[Any]]:
+        """{stratum: items}, strata sorted, items in input order."""
+        def order(key):
+            return tuple("" if v is None else str(v) for v in key)
+        return {key: [it for _, it in sorted(self._res[key], key=lambda t: t[0])]
+                for key in sorted(self._res, key=order)}
+
+    def items(self) -> List[Any]:
+        return [it for items in self.sample().values() for it in items]
+
+
+def stratified_sample(items: Iterable[Any], k: int, strata: Strata,
+                      seed: int = 42) -> Dict[Tuple, List[Any]]:
+    return StratifiedReservoir(k, strata, seed).add_all(items).sample()
+
+
+def sample_label_file(path: str, k: int, strata: Strata, seed: int = 42,
+                      where: Optional[Callable[[Dict[str, Any]], bool]] = None):
+    """Stratified sample of a JSONL / JSON-array label file in one streaming pass."""
+    records = iter_label_records(path)
+    if where is not None:
+        records = (r for r in records if where(r))
+    return stratified_sample(records, k, strata, seed)
+
+
+def sample_manifest(db_path: str, k: int, strata: Strata, seed: int = 42, root=None, **filters):
+    """Stratified sample of manifest rows (path, sm, capture_dt, is_gray, ...)."""
+    from .manifest import Manifest
+
+    with Manifest(db_path) as m:
+        return stratified_sample(m.iter_query(root, **filters), k, strata, seed)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="k items per stratum, one pass, reproducible.")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--labels", help="JSONL / JSON-array label file")
+    src.add_argument("--manifest", help="pipelines.manifest SQLite file")
+    ap.add_argument("--root", default=None, help="With --manifest: only rows under this root")
+    ap.add_argument("--strata", default="sm", help=f"Comma list of {sorted(STRATA)}")
+    ap.add_argument("--k", type=int, default=1, help="Items per stratum")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--out", default=None, help="Write the sample as JSONL (default: stdout)")
+    args = ap.parse_args()
+
+    if args.labels:
+        sample = sample_label_file(args.labels, args.k, args.strata, args.seed)
+    else:
+        sample = sample_manifest(args.manifest, args.k, args.strata, args.seed, args.root)
+
+    lines = [json.dumps(it, default=str) for items in sample.values() for it in items]
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write("".join(line + "\n" for line in lines))
+        print(f"{len(lines)} items from {len(sample)} strata -> {args.out}")
+    else:
+        print("\n".join(lines))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""
+Deterministic sharding of a pipeline run over many nodes, and the merge of per-shard
+outputs back into one observation table.
+
+    python run_models.py --config config.yaml --shard 3/16 --shard-by sm   # on each node
+    python -m pipelines.shards merge out/observations --out out/observations.parquet
+
+Every node lists the same inputs (expand_input_dirs) and keeps the images assigned to
+its shard, so no coordination is needed. Shard i of N writes, next to the output prefix:
+
+    <prefix>.shard-0003-of-0016.paths.txt   images assigned to the shard
+    <prefix>.shard-0003-of-0016.parquet     its observation rows
+    <prefix>.shard-0003-of-0016.done.json   written last: counts and unreadable files
+
+merge_shards() dedupes rows by path and checks that every assigned image was covered
+exactly once (written, or recorded as unreadable) before writing the merged table.
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .dataset import iter_image_paths
+from .jobqueue import shard_of
+from .manifest import sm_location
+
+SHARD_BY = ("hash", "sm", "date")
+_SHARD_FILE = re.compile(r"\.shard-(\d+)-of-(\d+)\.done\.json$")
+_SHARD_EXTS = (".done.json", ".done.json.tmp", ".paths.txt", ".parquet")
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """'i/N' -> (i, N), with 0 <= i < N (0-based, like SLURM_ARRAY_TASK_ID)."""
+    try:
+        i, n = (int(v) for v in str(spec).split("/"))
+    except ValueError:
+        raise ValueError(f"--shard expects i/N, got {spec!r}") from None
+    if n < 1 or not 0 <= i < n:
+        raise ValueError(f"shard index must satisfy 0 <= i < N, got {spec!r}")
+    return i, n
+
+
+def shard_stem(prefix: str, index: int, n_shards: int) -> str:
+    return f"{prefix}.shard-{index:04d}-of-{n_shards:04d}"
+
+
+def output_prefix(parquet_path: str) -> str:
+    """out/observations.parquet -> out/observations"""
+    root, ext = os.path.splitext(parquet_path)
+    return root if ext.lower() == ".parquet" else parquet_path
+
+
+def path_key(path: str, root: str) -> str:
+    """Key for hashing: the path below its input dir, so nodes that mount the tree at
+    different places still agree."""
+    rel = os.path.relpath(path, root).replace(os.sep, "/")
+    return f"{os.path.basename(os.path.normpath(root))}/{rel}"
+
+
+def sm_shard(path: str, n_shards: int) -> Optional[int]:
+    """SM_k -> (k - 1) % N; None for paths outside an SM_* folder."""
+    sm = sm_location(path)
+    if not sm:
+        return None
+    return (int(sm.split("_")[1]) - 1) % n_shards
+
+
+def date_shard(dt: datetime, start: datetime, end: datetime, n_shards: int) -> int:
+    """Shard of dt when [start, end] is cut into N equal capture-date ranges."""
+    span = (end - start).total_seconds()
+    if span <= 0:
+        return 0
+    frac = (dt - start).total_seconds() / span
+    return min(n_shards - 1, max(0, int(frac * n_shards)))
+
+
+def discover(input_dirs: Sequence[str], manifest=None) -> List[Tuple[str, str]]:
+    """(path, input dir) for every image, sorted, each path once even if dirs overlap."""
+    seen = {}
+    for root in input_dirs:
+        for p in iter_image_paths(root, manifest):
+            seen.setdefault(str(p), root)
+    return sorted(seen.items())
+
+
+def capture_dates(paths: Iterable[str], manifest=None, workers: int = 8) -> Dict[str, Optional[datetime]]:
+    """Capture datetimes from the manifest where indexed, else from EXIF."""
+    paths = list(paths)
+    out: Dict[str, Optional[datetime]] = {}
+    if manifest is not None:
+        for r in manifest.iter_query():
+            if r["capture_dt"]:
+                out[r["path"]] = datetime.fromisoformat(r["capture_dt"])
+    todo = [p for p in paths if p not in out]
+    if todo:
+        from .exif_utils import bulk_exif_datetimes
+
+        for p, (dt, _) in bulk_exif_datetimes(todo, workers=workers).items():
+            out[p] = dt
+    return out
+
+
+def assign_shards(items: Sequence[Tuple[str, str]], n_shards: int, by: str = "hash",
+                  date_range: Optional[Tuple[Any, Any]] = None, manifest=None,
+                  workers: int = 8) -> Dict[str, int]:
+    """
+    {path: shard} for (path, input dir) pairs from discover().
+
+    by="hash" spreads images evenly. by="sm" keeps each camera location on one shard.
+    by="date" cuts [start, end] into N equal ranges; without date_range the bounds are
+    the earliest and latest capture times in the tree, which every node computes alike.
+    Images with no SM folder or no capture date fall back to the path hash.
+    """
+    if by not in SHARD_BY:
+        raise ValueError(f"Unknown shard_by {by!r}; choose from {SHARD_BY}")
+    dates = capture_dates((p for p, _ in items), manifest, workers) if by == "date" else {}
+    if by == "date":
+        known = [d for d in dates.values() if d is not None]
+        if date_range:
+            start, end = (d if isinstance(d, datetime) else datetime.fromisoformat(str(d))
+                          for d in date_range)
+        elif known:
+            start, end = min(known), max(known)
+        else:
+            start = end = None
+
+    out = {}
+    for path, root in items:
+        shard = None
+        if by == "sm":
+            shard = sm_shard(path, n_shards)
+        elif by == "date" and start is not None and dates.get(path) is not None:
+            shard = date_shard(dates[path], start, end, n_shards)
+        if shard is None:
+            shard = shard_of(path_key(path, root), n_shards)
+        out[path] = shard
+    return out
+
+
+def select_shard(input_dirs: Sequence[str], index: int, n_shards: int, by: str = "hash",
+                 date_range=None, manifest=None, workers: int = 8) -> List[str]:
+    """Sorted paths assigned to shard `index` of `n_shards`."""
+    assigned = assign_shards(discover(input_dirs, manifest), n_shards, by, date_range,
+                             manifest, workers)
+    return [p for p, s in assigned.items() if s == index]
+
+
+# ---------- per-shard bookkeeping ----------
+
+def write_shard_paths(stem: str, paths: Iterable[str]):
+    os.makedirs(os.path.dirname(stem) or ".", exist_ok=True)
+    with open(stem + ".paths.txt", "w", encoding="utf-8") as f:
+        f.writelines(p + "\n" for p in paths)
+
+
+def read_shard_paths(stem: str) -> List[str]:
+    with open(stem + ".paths.txt", encoding="utf-8") as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+
+def write_shard_done(stem: str, info: Dict[str, Any]):
+    """Atomically mark a shard finished; merge ignores shards without this file."""
+    tmp = stem + ".done.json.tmp"
+    with open(tmp, "w") as f:
+        json.dump(info, f, indent=2)
+    os.replace(tmp, stem + ".done.json")
+
+
+def clear_shard(stem: str):
+    """Remove whatever an earlier run of this shard left behind."""
+    for ext in _SHARD_EXTS:
+        if os.path.exists(stem + ext):
+            os.remove(stem + ext)
+
+
+def find_shards(prefix: str, n_shards: Optional[int] = None,
+                by: Optional[str] = None) -> Dict[int, Dict[str, Any]]:
+    """
+    {index: done info} for every finished shard of `prefix`. n_shards / by keep only
+    the shards of that run, so files other runs left under the same prefix are ignored.
+    """
+    shards = {}
+    for done in glob.glob(glob.escape(prefix) + ".shard-*-of-*.done.json"):
+        m = _SHARD_FILE.search(done)
+        if not m or (n_shards is not None and int(m.group(2)) != n_shards):
+            continue
+        with open(done) as f:
+            info = json.load(f)
+        if by is not None and info.get("by") != by:
+            continue
+        info["stem"] = done[:-len(".done.json")]
+        shards[int(m.group(1))] = info
+    return shards
+
+
+# ---------- merge ----------
+
+def _sql_strings(values: Iterable[str]) -> str:
+    # DuckDB can't bind parameters in CREATE VIEW / COPY, so quote them inline
+    return ", ".join("'" + v.replace("'", "''") + "'" for v in values)
+
+
+def merge_shards(prefix: str, out_path: str, overwrite: bool = False,
+                 expected_paths: Optional[Iterable[str]] = None,
+                 allow_incomplete: bool = False, n_shards: Optional[int] = None,
+                 by: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Merge <prefix>.shard-*.parquet into out_path (rows deduped by path, first shard
+    wins) and return a coverage report. Unless allow_incomplete, nothing is written
+    when a shard is missing or an assigned image was neither written nor recorded as
+    unreadable. expected_paths, e.g. a fresh discover(), also checks that the shards'
+    assignments cover the whole tree. n_shards / by select one run when several have
+    written under the same prefix.
+    """
+    import duckdb
+
+    from .writer import check_overwrite, ensure_parent
+
+    check_overwrite(out_path, overwrite)
+    shards = find_shards(prefix, n_shards, by)
+    if not shards:
+        run = f" of {n_shards or '*'} by {by or '*'}" if n_shards or by else ""
+        raise FileNotFoundError(f"No finished shards{run} for {prefix} (*.shard-*-of-*.done.json)")
+    sizes = {info["n_shards"] for info in shards.values()}
+    modes = {info.get("by") for info in shards.values()}
+    if len(sizes) != 1 or len(modes) != 1:
+        raise ValueError(f"Shards of {prefix} come from different runs: N={sorted(sizes)}, "
+                         f"by={sorted(map(str, modes))}; pick one with --n-shards / --by")
+    n_shards = sizes.pop()
+
+    assigned: Dict[str, int] = {}
+    overlap = []
+    failed = set()
+    for i in sorted(shards):
+        for p in read_shard_paths(shards[i]["stem"]):
+            if p in assigned:
+                overlap.append(p)
+            else:
+                assigned[p] = i
+        failed.update(shards[i].get("failed", []))
+
+    files = [shards[i]["stem"] + ".parquet" for i in sorted(shards)
+             if os.path.exists(shards[i]["stem"] + ".parquet")]
+    con = duckdb.connect()
+    try:
+        counts = {}
+        if files:
+            con.execute(f"CREATE VIEW rows AS SELECT * FROM read_parquet([{_sql_strings(files)}], "
+                        "union_by_name=true, filename=true)")
+            counts = dict(con.execute("SELECT path, count(*) FROM rows GROUP BY path").fetchall())
+        written = set(counts)
+        report = {
+            "prefix": prefix,
+            "n_shards": n_shards,
+            "by": modes.pop(),
+            "missing_shards": [i for i in range(n_shards) if i not in shards],
+            "assigned": len(assigned),
+            "rows_in": sum(counts.values()),
+            "rows_out": len(written),
+            "unreadable": len(failed & set(assigned)),
+            "duplicate_paths": sorted(p for p, c in counts.items() if c > 1),
+            "overlapping_assignments": sorted(set(overlap)),
+            "missing": sorted(set(assigned) - written - failed),
+            "unexpected": sorted(written - set(assigned)),
+        }
+        if expected_paths is not None:
+            report["unassigned"] = sorted(set(map(str, expected_paths)) - set(assigned))
+        report["ok"] = not (report["missing_shards"] or report["overlapping_assignments"]
+                            or report["missing"] or report["unexpected"]
+                            or report.get("unassigned"))
+
+        if (report["ok"] or allow_incomplete) and files:
+            ensure_parent(out_path)
+            if os.path.exists(out_path):
+                os.remove(out_path)
+            con.execute(f"""
+                COPY (
+                    SELECT * EXCLUDE (filename, _rn) FROM (
+                        SELECT *, row_number() OVER (PARTITION BY path ORDER BY filename) AS _rn
+                        FROM rows
+                    ) WHERE _rn = 1 ORDER BY path
+                ) TO {_sql_strings([out_path])} (FORMAT parquet)
+            """)
+            report["out"] = out_path
+    finally:
+        con.close()
+    return report
+
+
+def print_report(report: Dict[str, Any], limit: int = 10):
+    print(f"{report['prefix']}: {report['n_shards']} shards by {report['by']}, "
+          f"{report['assigned']} images assigned, {report['rows_in']} rows -> "
+          f"{report['rows_out']} unique, {report['unreadable']} unreadable")
+    for key in ("missing_shards", "overlapping_assignments", "missing", "unexpected",
+                "unassigned", "duplicate_paths"):
+        vals = report.get(key)
+        if vals:
+            more = f" (+{len(vals) - limit} more)" if len(vals) > limit else ""
+            print(f"  {key}: {len(vals)}: {', '.join(map(str, vals[:limit]))}{more}")
+    print("coverage OK: every image exactly once" if report["ok"] else "coverage FAILED")
+    if report.get("out"):
+        print(f"wrote {report['out']}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Merge and validate sharded run outputs.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    m = sub.add_parser("merge", help="Combine <prefix>.shard-*.parquet into one table")
+    m.add_argument("prefix", help="Output prefix the shards were written under (out/observations)")
+    m.add_argument("--out", default=None, help="Merged Parquet (default: <prefix>.parquet)")
+    m.add_argument("--overwrite", action="store_true")
+    m.add_argument("--allow-incomplete", action="store_true",
+                   help="Write the merged table even if coverage checks fail")
+    m.add_argument("--inputs", nargs="*", default=None,
+                   help="Re-list these input dirs and check the shards covered all of them")
+    m.add_argument("--report", default=None, help="Also write the coverage report as JSON")
+    m.add_argument("--n-shards", type=int, default=None,
+                   help="Only merge shards of an N-shard run (when several runs share the prefix)")
+    m.add_argument("--by", default=None, choices=SHARD_BY, help="Only merge shards split this way")
+    args = ap.parse_args()
+
+    expected = [p for p, _ in discover(args.inputs)] if args.inputs else None
+    report = merge_shards(args.prefix, args.out or args.prefix + ".parquet", args.overwrite,
+                          expected, args.allow_incomplete, args.n_shards, args.by)
+    print_report(report)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(0 if report["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
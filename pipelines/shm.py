@@ -0,0 +1,183 @@
+"""
+Shared-memory transport for decoded frames (executor="shm" in pipelines.dataset).
+
+Decode workers (separate processes) write RGB pixels into fixed-size uint8 slots of one
+multiprocessing.shared_memory block, so a 1920x1080 frame (~6 MB) is never pickled
+between processes. With as_array=True the consumer gets NumPy views of the slots; a slot
+is recycled once the consumer has moved `hold` frames past it, and at most
+`slots - hold` frames are in flight, which is the back-pressure on decoders.
+"""
+import multiprocessing as mp
+import queue
+from multiprocessing import shared_memory
+from typing import Iterable, Iterator, Tuple
+
+import numpy as np
+from PIL import Image
+
+from .dataset import decode_rgb
+
+DEFAULT_MAX_SHAPE = (1080, 1920, 3)
+
+
+def _decode_worker(shm_name: str, max_shape, tasks, free_slots, ready, min_size=None):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    slot_bytes = int(np.prod(max_shape))
+    n_slots = shm.size // slot_bytes
+    frames = np.ndarray((n_slots,) + tuple(max_shape), dtype=np.uint8, buffer=shm.buf)
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            seq, path = task
+            try:
+                arr = np.asarray(decode_rgb(path, min_size))
+            except Exception as e:
+                ready.put((seq, path, None, None, f"{type(e).__name__}: {e}"))
+                continue
+            h, w = arr.shape[:2]
+            if h > max_shape[0] or w > max_shape[1]:
+                # Larger than a slot: send this one the slow way
+                ready.put((seq, path, None, arr, None))
+                continue
+            slot = free_slots.get()  # blocks while every slot is in use
+            frames[slot, :h, :w] = arr
+            ready.put((seq, path, slot, (h, w), None))
+    finally:
+        del frames
+        shm.close()
+
+
+class FrameRing:
+    """
+    Owner side of the slot ring: the shared block, the free-slot queue and the workers.
+    Use iter_shared_frames() unless you need the pieces.
+    """
+
+    def __init__(self, slots: int = 16, workers: int = 2, max_shape=DEFAULT_MAX_SHAPE,
+                 min_size=None):
+        self.max_shape = tuple(max_shape)
+        self.slot_bytes = int(np.prod(self.max_shape))
+        self.n_slots = max(2, int(slots))
+        ctx = mp.get_context("spawn")
+        self.shm = shared_memory.SharedMemory(create=True, size=self.n_slots * self.slot_bytes)
+        self.frames = np.ndarray((self.n_slots,) + self.max_shape, dtype=np.uint8,
+                                 buffer=self.shm.buf)
+        self.tasks = ctx.Queue()
+        self.free_slots = ctx.Queue()
+        self.ready = ctx.Queue()
+        for i in range(self.n_slots):
+            self.free_slots.put(i)
+        self.procs = [
+            ctx.Process(target=_decode_worker, daemon=True,
+                        args=(self.shm.name, self.max_shape, self.tasks, self.free_slots,
+                              self.ready, min_size))
+            for _ in range(max(1, int(workers)))
+        ]
+        for p in self.procs:
+            p.start()
+
+    def view(self, slot: int, shape) -> np.ndarray:
+        h, w = shape
+        return self.frames[slot, :h, :w]
+
+    def release(self, slot: int):
+        self.free_slots.put(slot)
+
+    def close(self):
+        for _ in self.procs:
+            self.tasks.put(None)
+        for p in self.procs:
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
+        for q in (self.tasks, self.free_slots, self.ready):
+            q.cancel_join_thread()
+            q.close()
+        del self.frames
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # the caller still holds frame views; the mapping goes when they do
+        self.shm.unlink()
+
+
+def iter_shared_frames(paths: Iterable, workers: int = 2, slots: int = 16, hold: int = 8,
+                       ordered: bool = True, max_shape=DEFAULT_MAX_SHAPE, as_array: bool = False,
+                       on_error=None, min_size=None) -> Iterator[Tuple[str, object]]:
+    """
+    Yield (path, frame) decoded by `workers` processes through a shared-memory ring.
+
+    With as_array=True, frame is an HxWx3 uint8 NumPy view of a slot (zero-copy). It
+    stays valid until `hold` further frames have been pulled, so consumers that keep a
+    batch of frames must pass hold >= batch size and copy anything kept longer.
+    Otherwise frame is an ordinary RGB PIL image: PIL cannot wrap 3-byte pixels, so it
+    is built from the slot with one local copy and the slot is recycled at once.
+    min_size is passed to dataset.decode_rgb for reduced-scale decoding.
+    """
+    hold = hold if as_array else 0
+    if slots <= hold:
+        raise ValueError(f"slots ({slots}) must be larger than hold ({hold})")
+    ring = FrameRing(slots, workers, max_shape, min_size)
+    budget = slots - hold  # frames allowed in flight; each can always get a slot
+    it = iter(paths)
+    next_seq = 0
+    exhausted = False
+    in_flight = 0
+    pending = {}  # seq -> message, for ordered output
+    want = 0
+    leased = []  # slots held by the consumer, oldest first
+
+    def dispatch():
+        nonlocal next_seq, exhausted, in_flight
+        while not exhausted and in_flight < budget:
+            try:
+                p = next(it)
+            except StopIteration:
+                exhausted = True
+                break
+            ring.tasks.put((next_seq, str(p)))
+            next_seq += 1
+            in_flight += 1
+
+    try:
+        dispatch()
+        while in_flight:
+            if ordered and want in pending:
+                msg = pending.pop(want)
+            else:
+                try:
+                    msg = ring.ready.get(timeout=1.0)
+                except queue.Empty:
+                    if not any(p.is_alive() for p in ring.procs):
+                        raise RuntimeError("all shared-memory decode workers died")
+                    continue
+                if ordered and msg[0] != want:
+                    pending[msg[0]] = msg
+                    continue
+            seq, path, slot, payload, err = msg
+            want = seq + 1
+            in_flight -= 1
+
+            # Recycle slots the consumer has moved `hold` frames past
+            while leased and len(leased) >= hold:
+                ring.release(leased.pop(0))
+
+            if err is not None:
+                dispatch()
+                if on_error:
+                    on_error(path, RuntimeError(err))
+                continue
+            if slot is None:
+                frame = payload if as_array else Image.fromarray(payload)  # oversized, pickled
+            elif as_array:
+                leased.append(slot)
+                frame = ring.view(slot, payload)
+            else:
+                frame = Image.fromarray(ring.view(slot, payload))
+                ring.release(slot)
+            dispatch()
+            yield path, frame
+    finally:
+        ring.close()
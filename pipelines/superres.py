@@ -0,0 +1,213 @@
+"""
+Model-free stand-ins for the super-resolution experiments in diffusion_test/, so the
+upscale -> judge workflow can be run and checked on CPU without diffusers or Qwen.
+"""
+import os
+import struct
+import zlib
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+# Fields the judge must return (see qwen_rate_pair's system prompt)
+JUDGE_SCORE_FIELDS = ("sharpness_gain", "noise_level", "artifact_level", "overall_improvement")
+
+
+def lanczos_upscale(img, scale: int = 4):
+    """Plain Lanczos resampling, the same output size as the SD x4 upscaler."""
+    return img.resize((img.width * scale, img.height * scale), Image.LANCZOS)
+
+
+def _edge_energy(img) -> float:
+    edges = img.convert("L").filter(ImageFilter.FIND_EDGES)
+    return float(np.asarray(edges, dtype=np.float32).mean())
+
+
+def stub_judge(low_img, enh_img) -> Dict[str, Any]:
+    """
+    Deterministic judge with the same output schema as the Qwen judge: sharpness gain
+    from the edge-energy ratio of the enhanced image against a Lanczos upscale of the
+    input, everything else neutral.
+    """
+    reference = low_img.resize(enh_img.size, Image.LANCZOS)
+    ratio = _edge_energy(enh_img) / max(_edge_energy(reference), 1e-6)
+    sharpness = float(np.clip(5.0 + 5.0 * np.log2(max(ratio, 1e-3)), 1.0, 10.0))
+    return {
+        "sharpness_gain": round(sharpness, 2),
+        "noise_level": 5.0,
+        "artifact_level": 5.0,
+        "overall_improvement": round(sharpness, 2),
+        "short_reason": f"stub judge: edge energy ratio {ratio:.3f}",
+    }
+
+
+# ---------- tiled upscaling ----------
+
+def _tile_starts(length: int, tile: int, overlap: int) -> List[int]:
+    if length <= tile:
+        return [0]
+    step = max(1, tile - overlap)
+    starts = list(range(0, length - tile, step))
+    return starts + [length - tile]
+
+
+def _ramp(n: int, ramp_lo: int, ramp_hi: int) -> np.ndarray:
+    """1-D blend weights: linear ramps at sides that overlap a neighbour, flat elsewhere."""
+    x = np.arange(n, dtype=np.float32) + 0.5
+    w = np.ones(n, dtype=np.float32)
+    if ramp_lo:
+        w = np.minimum(w, x / ramp_lo)
+    if ramp_hi:
+        w = np.minimum(w, (n - x) / ramp_hi)
+    return np.maximum(w, 1e-3)
+
+
+class PNGStreamWriter:
+    """Writes an 8-bit RGB PNG row band by row band, never holding the whole image."""
+
+    def __init__(self, path: str, width: int, height: int, level: int = 6):
+        self.f = open(path, "wb")
+        self.width, self.height = width, height
+        self.rows = 0
+        self._z = zlib.compressobj(level)
+        self.f.write(b"\x89PNG\r\n\x1a\n")
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+
+    def _chunk(self, kind: bytes, data: bytes):
+        self.f.write(struct.pack(">I", len(data)))
+        self.f.write(kind + data)
+        self.f.write(struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+    def write_rows(self, rows: np.ndarray):
+        # Filter type 0 (None) byte in front of every scanline
+        raw = np.empty((rows.shape[0], 1 + self.width * 3), dtype=np.uint8)
+        raw[:, 0] = 0
+        raw[:, 1:] = rows.reshape(rows.shape[0], -1)
+        data = self._z.compress(raw.tobytes())
+        if data:
+            self._chunk(b"IDAT", data)
+        self.rows += rows.shape[0]
+
+    def close(self):
+        if self.rows != self.height:
+            raise ValueError(f"PNG expects {self.height} rows, got {self.rows}")
+        self._chunk(b"IDAT", self._z.flush())
+        self._chunk(b"IEND", b"")
+        self.f.close()
+
+
+class NpyStreamWriter:
+    """Writes rows into an (H, W, 3) uint8 .npy memmap."""
+
+    def __init__(self, path: str, width: int, height: int):
+        self.arr = np.lib.format.open_memmap(path, mode="w+", dtype=np.uint8,
+                                             shape=(height, width, 3))
+        self.rows = 0
+
+    def write_rows(self, rows: np.ndarray):
+        self.arr[self.rows:self.rows + rows.shape[0]] = rows
+        self.rows += rows.shape[0]
+
+    def close(self):
+        self.arr.flush()
+        del self.arr
+
+
+class _ArrayWriter:
+    def __init__(self, width: int, height: int):
+        self.arr = np.empty((height, width, 3), dtype=np.uint8)
+        self.rows = 0
+
+    def write_rows(self, rows: np.ndarray):
+        self.arr[self.rows:self.rows + rows.shape[0]] = rows
+        self.rows += rows.shape[0]
+
+    def close(self):
+        pass
+
+
+def open_stream_writer(path: str, width: int, height: int):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".png":
+        return PNGStreamWriter(path, width, height)
+    if ext == ".npy":
+        return NpyStreamWriter(path, width, height)
+    raise ValueError(f"Streaming output supports .png and .npy, not {ext!r}: {path}")
+
+
+def tiled_upscale(img, upscale_fn: Callable, tile: int = 128, overlap: int = 16,
+                  out_path: Optional[str] = None):
+    """
+    Upscale `img` tile by tile with any PIL -> PIL callable (SD x4 pipeline, Lanczos...).
+
+    Tiles overlap by `overlap` input pixels and are feather-blended across the overlap,
+    so there are no seams. Output is assembled one band of tile rows at a time and,
+    with out_path (.png or .npy), streamed to disk as each band is finished: peak memory
+    is one band (output width x one tile height) plus one model call on a tile, never
+    the whole upscaled image. Without out_path the assembled PIL image is returned.
+    """
+    img = img.convert("RGB")
+    width, height = img.size
+    tile = max(1, int(tile))
+    overlap = max(0, min(int(overlap), tile - 1))
+    xs = _tile_starts(width, tile, overlap)
+    ys = _tile_starts(height, tile, overlap)
+
+    scale = None
+    writer = None
+    acc = None
+    band_top = 0  # output row at acc[0]
+
+    def ramps(starts, sizes, total, ov):
+        """Per-tile 1-D weights, normalised so overlapping tiles sum to exactly 1."""
+        parts = [_ramp(n, ov if i > 0 else 0, ov if i < len(starts) - 1 else 0)
+                 for i, n in enumerate(sizes)]
+        norm = np.zeros(total, dtype=np.float32)
+        for s0, w in zip(starts, parts):
+            norm[s0:s0 + w.size] += w
+        return [w / norm[s0:s0 + w.size] for s0, w in zip(starts, parts)]
+
+    for yi, y0 in enumerate(ys):
+        th = min(tile, height - y0)
+        for xi, x0 in enumerate(xs):
+            tw = min(tile, width - x0)
+            out = upscale_fn(img.crop((x0, y0, x0 + tw, y0 + th)))
+            if scale is None:
+                scale = out.width // tw
+                if scale < 1 or out.size != (tw * scale, th * scale):
+                    raise ValueError(f"upscaler returned {out.size} for a {tw}x{th} tile; "
+                                     "expected an integer scale factor")
+                out_w, out_h = width * scale, height * scale
+                ov = overlap * scale
+                # Blend weights are separable, so the per-pixel weight sum never needs storing
+                wxs = ramps([x * scale for x in xs], [min(tile, width - x) * scale for x in xs],
+                            out_w, ov)
+                wys = ramps([y * scale for y in ys], [min(tile, height - y) * scale for y in ys],
+                            out_h, ov)
+                writer = open_stream_writer(out_path, out_w, out_h) if out_path \
+                    else _ArrayWriter(out_w, out_h)
+                acc = np.zeros((tile * scale, out_w, 3), dtype=np.float32)
+            elif out.size != (tw * scale, th * scale):
+                raise ValueError(f"upscaler returned {out.size} for a {tw}x{th} tile")
+
+            r0 = y0 * scale - band_top
+            c0 = x0 * scale
+            w = wys[yi][:, None, None] * wxs[xi][None, :, None]
+            acc[r0:r0 + th * scale, c0:c0 + tw * scale] += np.asarray(out, np.float32) * w
+
+        # Rows above the next tile row are final: write them and slide the band up
+        done_to = (ys[yi + 1] if yi + 1 < len(ys) else height) * scale
+        n = done_to - band_top
+        for i in range(0, n, 64):
+            rows = acc[i:min(n, i + 64)]
+            writer.write_rows(np.clip(rows + 0.5, 0, 255).astype(np.uint8))
+        keep = acc.shape[0] - n
+        acc[:keep] = acc[n:]
+        acc[keep:] = 0
+        band_top = done_to
+
+    writer.close()
+    if out_path:
+        return out_path
+    return Image.fromarray(writer.arr)
@@ -1,10 +1,248 @@
+import json
 import os
 import pandas as pd
 
+from .crops import detections_to_json
+
+EXCEL_MAX_ROWS = 1_048_576  # including the header row
+
+# Column order of the observation table (path first, then BaseModel.predict fields)
+OBSERVATION_COLUMNS = [
+    "path", "common_name", "species", "number", "same_individual", "sex", "notes", "best_photo",
+]
+
+# Parquet type of columns the pipeline knows about; any other declared column is a string
+OBSERVATION_TYPES = {
+    **{c: "string" for c in OBSERVATION_COLUMNS},
+    "score": "float64",
+    "detections": "string",  # JSON, see pipelines.crops.detections_to_json
+    "model_version": "string",
+    "sm": "string",
+    "capture_dt": "timestamp",
+    "true_dt": "timestamp",
+    "clock_rule": "string",
+    "prefilter_score": "float64",  # pipelines.prefilter motion score (null: no background yet)
+}
+CLOCK_COLUMNS = ["sm", "capture_dt", "true_dt", "clock_rule"]
+
 def ensure_parent(path: str):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+
+def check_overwrite(path: str, overwrite: bool):
+    if (not overwrite) and os.path.exists(path):
+        raise FileExistsError(f"Refusing to overwrite existing file: {path} (set overwrite: true)")
+
+def write_observations(df: pd.DataFrame, excel_path: str, overwrite: bool = False, clock=None):
+    """clock: optional pipelines.clock.ClockCorrector; adds true_dt from capture_dt."""
+    check_overwrite(excel_path, overwrite)
+    if clock is not None and "capture_dt" in df:
+        df = clock.apply(df)
+    df.to_excel(excel_path, index=False)
+
+
+class ObservationWriter:
+    """
+    Streams observation rows to Parquet in fixed-size chunks, so memory stays flat
+    however many images a run covers. Optionally loads the result into a DuckDB
+    file (table `observations` plus a SpeciesNet-style `predictions` view).
+    With a pipelines.clock.ClockCorrector, rows carrying capture_dt also get the
+    corrected true_dt and the clock_rule that produced it, one vectorized pass per chunk.
+
+    The schema is fixed up front: OBSERVATION_COLUMNS plus `columns` (names, or a
+    {name: "string" | "float64" | "timestamp"} dict; known names take their type from
+    OBSERVATION_TYPES). Values are cast to the column type, lists/dicts are stored as
+    JSON strings, and a row with a key outside the schema raises ValueError.
+
+        with ObservationWriter("out/obs.parquet", columns=["score", "detections"]) as w:
+            for path, _, pred in predict_stream(model, images):
+                w.write({"path": path, **pred})
+    """
+
+    def __init__(self, parquet_path: str, overwrite: bool = False, chunk_rows: int = 5000,
+                 duckdb_path: str | None = None, columns: list | None = None, clock=None):
+        import pyarrow  # noqa: F401  (fail early if the optional dependency is missing)
+
+        check_overwrite(parquet_path, overwrite)
+        if duckdb_path:
+            check_overwrite(duckdb_path, overwrite)
+        self.parquet_path = parquet_path
+        self.duckdb_path = duckdb_path
+        self.overwrite = overwrite
+        self.chunk_rows = max(1, chunk_rows)
+        self.clock = clock
+        self.types = observation_schema(columns, clock=clock is not None)
+        self.columns = list(self.types)
+        self.rows_written = 0
+        self._buf = []
+        self._writer = None
+        self._schema = None
+        self._closed = False
+
+    def write(self, row: dict):
+        extra = row.keys() - self.types.keys()
+        if extra:
+            raise ValueError(f"Observation keys not in the output schema: {sorted(extra)}; "
+                             f"declare them with ObservationWriter(columns=...)")
+        dets = row.get("detections")
+        if dets is not None and not isinstance(dets, str):
+            # Boxes as a JSON string column; masks stay in memory only
+            row = {**row, "detections": json.dumps(detections_to_json(dets))}
+        self._buf.append(row)
+        if len(self._buf) >= self.chunk_rows:
+            self.flush()
+
+    def write_many(self, rows):
+        for row in rows:
+            self.write(row)
+
+    def flush(self):
+        if not self._buf:
+            return
+        import pyarrow as pa
+
+        if self.clock is not None and any("capture_dt" in r for r in self._buf):
+            self._apply_clock()
+        data = {c: [cast_value(r.get(c), self.types[c], c) for r in self._buf]
+                for c in self.columns}
+
+        self._open()
+        table = pa.table(data, schema=self._schema)
+        self._writer.write_table(table)
+        self.rows_written += len(self._buf)
+        self._buf = []
+
+    def _apply_clock(self):
+        frame = pd.DataFrame({
+            "path": [r.get("path") for r in self._buf],
+            "sm": [r.get("sm") for r in self._buf],
+            "capture_dt": [r.get("capture_dt") for r in self._buf],
+        })
+        fixed = self.clock.apply(frame, sm_col="sm" if frame["sm"].notna().any() else None)
+        for r, t, rule in zip(self._buf, fixed["true_dt"], fixed["clock_rule"]):
+            r["true_dt"] = None if pd.isna(t) else t.to_pydatetime()
+            r["clock_rule"] = None if pd.isna(rule) else rule
+
+    def _open(self):
+        import pyarrow.parquet as pq
+
+        if self._writer is None:
+            self._schema = arrow_schema(self.types)
+            ensure_parent(self.parquet_path)
+            self._writer = pq.ParquetWriter(self.parquet_path, self._schema)
+
+    def close(self):
+        self.flush()
+        if self._closed:
+            return
+        self._closed = True
+        self._open()  # a run with no rows still gets a file with the declared schema
+        self._writer.close()
+        self._writer = None
+        if self.duckdb_path:
+            load_into_duckdb(self.parquet_path, self.duckdb_path, overwrite=self.overwrite)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def observation_schema(columns=None, clock: bool = False) -> dict:
+    """{column: type name}: OBSERVATION_COLUMNS, the clock columns if asked, then `columns`."""
+    types = {c: OBSERVATION_TYPES[c] for c in OBSERVATION_COLUMNS}
+    if clock:
+        types.update((c, OBSERVATION_TYPES[c]) for c in CLOCK_COLUMNS)
+    if isinstance(columns, dict):
+        types.update(columns)
+    else:
+        types.update((c, OBSERVATION_TYPES.get(c, "string")) for c in columns or ())
+    bad = {c: t for c, t in types.items() if t not in ("string", "float64", "timestamp")}
+    if bad:
+        raise ValueError(f"Unsupported column types {bad}; use string, float64 or timestamp")
+    return types
+
+
+def arrow_schema(types: dict):
+    import pyarrow as pa
+
+    arrow = {"string": pa.string(), "float64": pa.float64(), "timestamp": pa.timestamp("us")}
+    return pa.schema([pa.field(c, arrow[t]) for c, t in types.items()])
+
+
+def cast_value(value, kind: str, column: str = ""):
+    """Coerce one value to a column type ("" and NaN/NaT become null for non-strings)."""
+    if value is None:
+        return None
+    if kind == "string":
+        if isinstance(value, str):
+            return value
+        if isinstance(value, (list, tuple, dict)):
+            return json.dumps(value, default=str)
+        return None if pd.isna(value) else str(value)
+    if isinstance(value, str) and not value.strip():
+        return None
+    try:
+        if kind == "float64":
+            value = float(value)
+            return None if value != value else value
+        ts = pd.Timestamp(value)
+        return None if pd.isna(ts) else ts.to_pydatetime()
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Column {column!r} expects {kind}, got {value!r}") from e
+
+
+def load_into_duckdb(parquet_path: str, duckdb_path: str, overwrite: bool = False):
+    """
+    Create table `observations` from the Parquet file and a `predictions` view with
+    the flattened SpeciesNet columns (filepath, prediction, prediction_score, ...)
+    so the queries from experiments/SpeciesNet run against our own model output.
+    """
+    import duckdb
+
+    if overwrite and os.path.exists(duckdb_path):
+        os.remove(duckdb_path)
+    ensure_parent(duckdb_path)
+    con = duckdb.connect(duckdb_path)
+    try:
+        con.execute("CREATE TABLE observations AS SELECT * FROM read_parquet(?)", [parquet_path])
+        cols = {r[0] for r in con.execute("DESCRIBE observations").fetchall()}
+
+        def col(name, default="NULL"):
+            return name if name in cols else default
+
+        con.execute(f"""
+            CREATE VIEW predictions AS
+            SELECT {col('path')} AS filepath,
+                   COALESCE(NULLIF({col('species')}, ''), {col('common_name')}) AS prediction,
+                   {col('score', 'CAST(NULL AS DOUBLE)')} AS prediction_score,
+                   {col('notes')} AS prediction_source,
+                   {col('model_version', 'CAST(NULL AS VARCHAR)')} AS model_version
+            FROM observations
+        """)
+    finally:
+        con.close()
+
+
+def export_excel(parquet_path: str, excel_path: str, overwrite: bool = False,
+                 batch_rows: int = 10000):
+    """Optional final export of a Parquet observation file to .xlsx, streamed in batches."""
+    import pyarrow.parquet as pq
+    from openpyxl import Workbook
+
+    check_overwrite(excel_path, overwrite)
+    pf = pq.ParquetFile(parquet_path)
+    n = pf.metadata.num_rows
+    if n + 1 > EXCEL_MAX_ROWS:
+        raise ValueError(f"{n} rows do not fit in one Excel sheet; query {parquet_path} instead")
 
-def write_observations(df: pd.DataFrame, excel_path: str, overwrite: bool = False):
-    if (not overwrite) and os.path.exists(excel_path):
-        raise FileExistsError(f"Refusing to overwrite existing file: {excel_path} (set overwrite: true)")
-    df.to_excel(excel_path, index=False)
\ No newline at end of file
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(pf.schema_arrow.names)
+    for batch in pf.iter_batches(batch_size=batch_rows):
+        for row in zip(*(col.to_pylist() for col in batch.columns)):
+            ws.append(list(row))
+    ensure_parent(excel_path)
+    wb.save(excel_path)
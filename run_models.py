@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Run the configured model over the input tree and write the observation table.
+
+    python run_models.py --config config.yaml
+    python run_models.py --config config.yaml --shard 3/16 --shard-by sm   # one node of 16
+    python run_models.py --config config.yaml --local 4                    # 4 local shards + merge
+
+A sharded run writes <outputs.parquet stem>.shard-i-of-N.{paths.txt,parquet,done.json};
+combine them with `python -m pipelines.shards merge <stem> --n-shards N` (see pipelines.shards).
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+import yaml
+
+from pipelines.batching import predict_stream
+from pipelines.cache import ResultCache, predict_with_cache
+from pipelines.cascade import Cascade
+from pipelines.clock import ClockCorrector
+from pipelines.dataset import decode_size_for, expand_input_dirs, iter_images_from_paths, report_bad_image
+from pipelines.manifest import Manifest, sm_location
+from pipelines.models import make_model
+from pipelines.prefilter import prefilter_paths
+from pipelines.profiling import Profiler
+from pipelines.shards import (
+    SHARD_BY, capture_dates, clear_shard, discover, merge_shards, output_prefix, parse_shard,
+    print_report, select_shard, shard_stem, write_shard_done, write_shard_paths,
+)
+from pipelines.writer import ObservationWriter, check_overwrite
+
+
+def load_config(path: str) -> dict:
+    with open(path) as f:
+        return yaml.safe_load(f) or {}
+
+
+def run(cfg: dict, shard=None, shard_by: str = "hash") -> int:
+    """Run one (shard of a) pass; returns the number of observation rows written."""
+    inputs_cfg = cfg.get("inputs", {})
+    inputs = expand_input_dirs(inputs_cfg)
+    out_cfg = cfg.get("outputs", {})
+    parquet = out_cfg.get("parquet", "out/observations.parquet")
+    loader = cfg.get("loader", {})
+    workers = int(loader.get("workers", 0))
+
+    if shard is None:
+        paths = [p for p, _ in discover(inputs)]
+        out_path, stem = parquet, None
+        overwrite = bool(out_cfg.get("overwrite", False))
+    else:
+        i, n = shard
+        paths = select_shard(inputs, i, n, shard_by, cfg.get("shard", {}).get("date_range"),
+                             workers=max(1, workers))
+        stem = shard_stem(output_prefix(parquet), i, n)
+        out_path = stem + ".parquet"
+        overwrite = True  # a re-run of a shard replaces its own output
+        clear_shard(stem)
+        write_shard_paths(stem, paths)
+    print(f"{len(paths)} images from {len(inputs)} input dirs"
+          + (f" (shard {shard[0]}/{shard[1]} by {shard_by})" if shard else ""))
+
+    # Camera location and time for every row; the writer adds true_dt / clock_rule
+    # from them when outputs.clock_rules is set
+    clock = ClockCorrector.from_config(out_cfg.get("clock_rules"))
+    columns = list(out_cfg.get("columns") or [])
+    columns += [c for c in ("sm", "capture_dt") if c not in columns]
+    manifest = Manifest(inputs_cfg["manifest"]) if inputs_cfg.get("manifest") else None
+    try:
+        captured = capture_dates(paths, manifest, workers=max(1, workers))
+    finally:
+        if manifest is not None:
+            manifest.close()
+
+    assigned = len(paths)
+    pre_cfg = cfg.get("prefilter") or {}
+    empty, pre_scores = [], None
+    if pre_cfg.get("enabled"):
+        # Likely-empty frames skip the model but still get a row, so coverage stays whole
+        paths, empty, pre_scores = prefilter_paths(paths, pre_cfg, workers=max(1, workers))
+        if "prefilter_score" not in columns:
+            columns.append("prefilter_score")
+        print(f"prefilter: {len(empty)} likely-empty frames skipped, {len(paths)} to the model")
+
+    def meta(path):
+        row = {"path": path, "sm": sm_location(path), "capture_dt": captured.get(path)}
+        if pre_scores is not None:
+            score = pre_scores.get(path)
+            row["prefilter_score"] = None if score == float("inf") else score
+        return row
+
+    prof = Profiler.from_config(cfg.get("profiling"))
+    model_cfg = cfg.get("model", {})
+    cascade = Cascade.from_config(model_cfg) if model_cfg.get("cascade") else None
+    if cascade is not None:
+        for stage in cascade.stages:
+            stage.model = prof.wrap_model(stage.model)
+        # Crop stages cut from the decoded frame, so they need it at full resolution
+        crops = any(stage.input == "crops" for stage in cascade.stages)
+        min_size = None if crops else decode_size_for(*(st.model for st in cascade.stages))
+        columns += [c for c in ("score", "detections") if c not in columns]
+    else:
+        model = prof.wrap_model(make_model(model_cfg))
+        min_size = decode_size_for(model)
+    failed = []
+
+    def on_error(path, exc):
+        report_bad_image(path, exc)
+        failed.append(path)
+
+    def open_images(todo):
+        return prof.wrap_iter("wait", iter_images_from_paths(
+            todo, workers=workers, prefetch=int(loader.get("prefetch", 16)),
+            executor=loader.get("executor", "thread"), on_error=on_error,
+            min_size=min_size))
+
+    cache_cfg = cfg.get("cache") or {}
+    cache = None
+    if cache_cfg.get("path"):
+        if cascade is not None:
+            print("cache: not used for cascades (stages are cached per model only)")
+        else:
+            cache = ResultCache(cache_cfg["path"],
+                                max_bytes=int(cache_cfg.get("max_mb", 512)) * 1024 * 1024,
+                                commit_every=int(cache_cfg.get("commit_every", 500)))
+
+    writer = ObservationWriter(out_path, overwrite=overwrite,
+                               chunk_rows=int(out_cfg.get("chunk_rows", 5000)),
+                               columns=columns, clock=clock,
+                               duckdb_path=None if shard else out_cfg.get("duckdb"))
+    with writer, prof.hot_loop():
+        for f in empty:
+            writer.write({**meta(f["path"]), "notes": "prefilter:empty"})
+        if cascade is not None:
+            predictions = cascade.run(open_images(paths))
+        elif cache is not None:
+            predictions = predict_with_cache(model, paths, cache, model_cfg,
+                                             open_images=open_images)
+        else:
+            predictions = ((p, pred) for p, _, pred in predict_stream(model, open_images(paths)))
+        try:
+            for p, pred in predictions:
+                writer.write({**meta(p), **pred})
+        finally:
+            if cache is not None:
+                cache_stats = cache.stats()
+                cache.close()
+
+    prof.write_report(os.path.splitext(out_path)[0] + ".profile")
+    if cascade is not None:
+        for st in cascade.report()["stages"]:
+            print(f"  stage {st['name']}: {st['frames_passed']}/{st['frames_in']} passed, "
+                  f"{st['ms_per_frame']:.1f} ms/frame")
+    if cache is not None:
+        print(f"  cache: {cache_stats['hits']} hits, {cache_stats['misses']} inferred "
+              f"({cache_stats['entries']} entries in {cache_cfg['path']})")
+    if stem is not None:
+        write_shard_done(stem, {"shard": shard[0], "n_shards": shard[1], "by": shard_by,
+                                "inputs": inputs, "assigned": assigned,
+                                "written": writer.rows_written, "failed": failed})
+    print(f"{writer.rows_written} rows -> {out_path} ({len(failed)} unreadable)")
+    return writer.rows_written
+
+
+def run_local(config_path: str, cfg: dict, n_shards: int, shard_by: str) -> bool:
+    """Run N shard processes on this machine, then merge and validate them."""
+    out_cfg = cfg.get("outputs", {})
+    parquet = out_cfg.get("parquet", "out/observations.parquet")
+    # Fail before any shard computes, not at merge time
+    check_overwrite(parquet, bool(out_cfg.get("overwrite", False)))
+    prefix = output_prefix(parquet)
+    for i in range(n_shards):
+        clear_shard(shard_stem(prefix, i, n_shards))
+
+    procs = [subprocess.Popen([sys.executable, os.path.abspath(__file__), "--config", config_path,
+                               "--shard", f"{i}/{n_shards}", "--shard-by", shard_by])
+             for i in range(n_shards)]
+    codes = [p.wait() for p in procs]
+    if any(codes):
+        print(f"shard processes failed: {codes}", file=sys.stderr)
+        return False
+    expected = [p for p, _ in discover(expand_input_dirs(cfg.get("inputs", {})))]
+    report = merge_shards(prefix, parquet, bool(out_cfg.get("overwrite", False)), expected,
+                          n_shards=n_shards, by=shard_by)
+    print_report(report)
+    return report["ok"]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Run the species pipeline over the configured inputs.")
+    ap.add_argument("--config", default="config.yaml")
+    group = ap.add_mutually_exclusive_group()
+    group.add_argument("--shard", default=None, help="i/N: run only shard i (0-based) of N")
+    group.add_argument("--local", type=int, default=0, metavar="N",
+                       help="Run N shards as local processes, then merge them")
+    ap.add_argument("--shard-by", default=None, choices=SHARD_BY,
+                    help="Partition by path hash, SM location or capture-date range "
+                         "(default: shard.by in the config, else hash)")
+    args = ap.parse_args()
+
+    cfg = load_config(args.config)
+    shard_by = args.shard_by or cfg.get("shard", {}).get("by", "hash")
+    if args.local:
+        sys.exit(0 if run_local(args.config, cfg, args.local, shard_by) else 1)
+    run(cfg, parse_shard(args.shard) if args.shard else None, shard_by)
+
+
+if __name__ == "__main__":
+    main()
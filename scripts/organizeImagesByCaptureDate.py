@@ -11,6 +11,10 @@
 # Notes
 #   - EXIF priority: DateTimeOriginal -> Modify Date (DateTime) -> DateTimeDigitized -> FS mtime
 #   - Output structure: outDir/SM_X/MM-DD-YYYY/original_filename.jpg
+#   - `--clock-rules 2022-11` (or a rules JSON/YAML) files frames by corrected camera time,
+#     using pipelines.clock (needs pandas); folder dates then follow the true capture day
+#   - `--pool process --workers N` reads dates on N processes, plans name collisions in memory,
+#     reflinks/hardlinks when in/out share a filesystem and journals progress so a killed run resumes
 #   - This script is compatible with Python 3.9 (default Python version of PACE ICE clusters)
 
 import argparse
@@ -22,7 +26,7 @@ import sys
 import threading
 import time
 from datetime import datetime
-from typing import List, Tuple, Optional, Union
+from typing import Dict, List, Tuple, Optional, Union
 
 # Optional EXIF helpers (Pillow first, then piexif if available)
 try:
@@ -37,6 +41,19 @@ try:
 except Exception:
     PIEXIF_OK = False
 
+# Streaming EXIF reader from the repo's pipelines package: reads only the APP1
+# header bytes instead of opening the whole image through Pillow.
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+try:
+    from pipelines.exif_utils import (  # type: ignore
+        DATETIME_FIELDS, parse_exif_datetime, read_exif_datetime_fields,
+    )
+    FAST_EXIF_OK = True
+except Exception:
+    FAST_EXIF_OK = False
+
 SM_DIR_PATTERN = re.compile(r"^SM_([1-5])$")
 JPG_EXTS = {".jpg", ".jpeg"}
 
@@ -84,8 +101,22 @@ def extract_capture_date_mmddyyyy(path: str) -> Tuple[Optional[str], str]:
       3) EXIF DateTimeDigitized (36868)
       4) FS mtime
     """
+    # Streaming route (no Pillow decode, no tag-name map). Only a header it actually
+    # parsed counts as checked; an empty result falls through to Pillow/piexif.
+    exif_checked = False
+    if FAST_EXIF_OK:
+        try:
+            fields = read_exif_datetime_fields(path)
+            exif_checked = bool(fields)
+            for name, label in DATETIME_FIELDS:
+                d = parse_exif_to_mmddyyyy(fields.get(name))
+                if d:
+                    return d, label
+        except Exception:
+            pass
+
     # Pillow route
-    if PIL_OK:
+    if PIL_OK and not exif_checked:
         try:
             with Image.open(path) as im:
                 exif = im.getexif()
@@ -111,7 +142,7 @@ def extract_capture_date_mmddyyyy(path: str) -> Tuple[Optional[str], str]:
             pass
 
     # piexif route
-    if PIEXIF_OK:
+    if PIEXIF_OK and not exif_checked:
         try:
             exif_dict = piexif.load(path)
             # 1) DateTimeOriginal
@@ -143,6 +174,37 @@ def extract_capture_date_mmddyyyy(path: str) -> Tuple[Optional[str], str]:
         return None, "unknown"
 
 
+def extract_capture_datetime(path: str) -> Tuple[Optional[datetime], str]:
+    """
+    Full capture datetime with the same EXIF priority as extract_capture_date_mmddyyyy,
+    for clock corrections (which can move a frame across midnight). Streaming reader
+    only, then FS mtime.
+    """
+    if FAST_EXIF_OK:
+        try:
+            fields = read_exif_datetime_fields(path)
+            for name, label in DATETIME_FIELDS:
+                dt = parse_exif_datetime(fields.get(name))
+                if dt is not None:
+                    return dt, label
+        except Exception:
+            pass
+    try:
+        return datetime.fromtimestamp(os.path.getmtime(path)), "FS:mtime"
+    except Exception:
+        return None, "unknown"
+
+
+def load_clock(spec: Optional[str]):
+    """pipelines.clock.ClockCorrector for a rule-set version or rules file, or None."""
+    if not spec:
+        return None
+    if not FAST_EXIF_OK:
+        raise SystemExit("--clock-rules needs the repo's pipelines package (and pandas)")
+    from pipelines.clock import ClockCorrector  # type: ignore
+    return ClockCorrector.from_config(spec)
+
+
 def unique_dest_path(dest_path: str) -> str:
     if not os.path.exists(dest_path):
         return dest_path
@@ -155,14 +217,29 @@ def unique_dest_path(dest_path: str) -> str:
         i += 1
 
 
-def discover_jobs(in_dir: str) -> List[Tuple[str, str]]:
+def open_manifest(db_path: str, root: str):
+    """Open (and incrementally refresh) the pipelines.manifest index for root."""
+    from pipelines.manifest import open_manifest as _open  # type: ignore
+    return _open(db_path, root)
+
+
+def discover_jobs(in_dir: str, manifest_db: Optional[str] = None) -> List[Tuple[str, str]]:
     """
     Returns a list of (abs_path, sm_top) for jpg files under SM_1..SM_5.
     sm_top is 'SM_X' (top-level SM directory name).
+    With manifest_db, the file list comes from the manifest index instead of os.walk.
     """
     jobs: List[Tuple[str, str]] = []
     in_dir_abs = os.path.abspath(in_dir)
 
+    if manifest_db:
+        with open_manifest(manifest_db, in_dir_abs) as m:
+            for path in m.paths(in_dir_abs, exts=JPG_EXTS, include_errors=True):
+                parts = os.path.relpath(path, in_dir_abs).split(os.sep)
+                if len(parts) > 1 and SM_DIR_PATTERN.match(parts[0]):
+                    jobs.append((path, parts[0]))
+        return jobs
+
     for root, _, files in os.walk(in_dir_abs):
         rel = os.path.relpath(root, in_dir_abs)
         parts = [] if rel == "." else rel.split(os.sep)
@@ -179,14 +256,258 @@ def discover_jobs(in_dir: str) -> List[Tuple[str, str]]:
     return jobs
 
 
+# ---------- Resumable process-pool mode (--pool process) ----------
+
+FICLONE = 0x40049409  # Linux ioctl: share extents copy-on-write (btrfs/xfs)
+PART_SUFFIX = ".part"
+
+
+def date_folder(out_dir: str, sm_top: str, date_str: str) -> str:
+    mm, dd, yyyy = date_str.split("/")
+    return os.path.join(out_dir, sm_top, f"{mm}-{dd}-{yyyy}")
+
+
+def _date_job(job: Tuple[str, str]) -> Tuple[str, str, Optional[str], str, int]:
+    src, sm_top = job
+    date_str, source = extract_capture_date_mmddyyyy(src)
+    try:
+        size = os.path.getsize(src)
+    except OSError:
+        size = 0
+    return src, sm_top, date_str, source, size
+
+
+def _datetime_job(job: Tuple[str, str]) -> Tuple[str, str, Optional[datetime], str, int]:
+    src, sm_top = job
+    dt, source = extract_capture_datetime(src)
+    try:
+        size = os.path.getsize(src)
+    except OSError:
+        size = 0
+    return src, sm_top, dt, source, size
+
+
+def correct_dates(clock, timed: List[Tuple[str, str, Optional[datetime], str, int]]
+                  ) -> List[Tuple[str, str, Optional[str], str, int]]:
+    """Camera datetimes -> corrected 'MM/DD/YYYY' strings, one vectorized pass."""
+    import pandas as pd
+
+    if not timed:
+        return []
+    true_dt = clock.correct_series(pd.Series([t[1] for t in timed], dtype=object),
+                                   pd.Series([t[2] for t in timed], dtype=object))
+    dates = true_dt.dt.strftime("%m/%d/%Y")
+    return [(src, sm_top, None if pd.isna(d) else d, source, size)
+            for (src, sm_top, _, source, size), d in zip(timed, dates)]
+
+
+def load_journal(path: str) -> Dict[str, str]:
+    """Return {src: dest} for every file a previous run finished."""
+    done: Dict[str, str] = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) >= 2:
+                done[parts[0]] = parts[1]
+    return done
+
+
+def same_file(src: str, dest: str) -> bool:
+    """dest is src already placed: the same inode (hardlink) or a copy/reflink with the
+    same size and mtime (copy2/copystat keep the mtime)."""
+    try:
+        a, b = os.stat(src), os.stat(dest)
+    except OSError:
+        return False
+    if (a.st_dev, a.st_ino) == (b.st_dev, b.st_ino):
+        return True
+    return a.st_size == b.st_size and int(a.st_mtime) == int(b.st_mtime)
+
+
+def plan_destinations(dated: List[Tuple[str, str, str, str, int]], out_dir: str,
+                      journal: Dict[str, str]
+                      ) -> Tuple[List[Tuple[str, str, int]], List[Tuple[str, str]]]:
+    """
+    Assign every source a unique destination in memory, the way unique_dest_path
+    would, but listing each destination folder once instead of probing per file.
+    Returns (plan, recovered): (src, dest, size) for files that still need to be placed,
+    and (src, dest) for files a killed run placed but never journaled, found at the
+    name they would be given again, which are adopted instead of copied to IMG_x_1.
+    """
+    taken: Dict[str, set] = {}
+    claimed: Dict[str, set] = {}  # names owned by a journaled or planned source
+    for dest in journal.values():
+        taken.setdefault(os.path.dirname(dest), set()).add(os.path.basename(dest))
+        claimed.setdefault(os.path.dirname(dest), set()).add(os.path.basename(dest))
+
+    plan = []
+    recovered = []
+    for src, sm_top, date_str, _, size in sorted(dated):
+        if src in journal:
+            continue
+        folder = date_folder(out_dir, sm_top, date_str)
+        names = taken.get(folder)
+        if names is None:
+            try:
+                names = {n for n in os.listdir(folder) if not n.endswith(PART_SUFFIX)}
+            except FileNotFoundError:
+                names = set()
+            names.update(taken.get(folder, ()))
+            taken[folder] = names
+        owned = claimed.setdefault(folder, set())
+        base = os.path.basename(src)
+        name = base
+        root, ext = os.path.splitext(base)
+        i = 1
+        adopted = False
+        while name in names:
+            if name not in owned and same_file(src, os.path.join(folder, name)):
+                adopted = True
+                break
+            name = f"{root}_{i}{ext}"
+            i += 1
+        names.add(name)
+        owned.add(name)
+        if adopted:
+            recovered.append((src, os.path.join(folder, name)))
+        else:
+            plan.append((src, os.path.join(folder, name), size))
+    return plan, recovered
+
+
+def _reflink(src: str, dst: str) -> None:
+    import fcntl
+    with open(src, "rb") as fs, open(dst, "wb") as fd:
+        fcntl.ioctl(fd.fileno(), FICLONE, fs.fileno())
+    shutil.copystat(src, dst)
+
+
+def place_file(src: str, dest: str, link: str, same_fs: bool) -> str:
+    """Materialise src at dest; returns the method used. Writes via a .part file."""
+    tmp = dest + PART_SUFFIX
+    methods = [link] if link != "auto" else (["reflink", "hardlink", "copy"] if same_fs else ["copy"])
+    last_exc: Optional[Exception] = None
+    for method in methods:
+        try:
+            if os.path.lexists(tmp):
+                os.remove(tmp)
+            if method == "reflink":
+                _reflink(src, tmp)
+            elif method == "hardlink":
+                os.link(src, tmp)
+            else:
+                shutil.copy2(src, tmp)
+            os.replace(tmp, dest)
+            return method
+        except OSError as e:
+            last_exc = e
+    assert last_exc is not None
+    raise last_exc
+
+
+def run_process_pool(args, jobs: List[Tuple[str, str]], start: float) -> None:
+    out_dir = args.outDir
+    workers = max(1, args.workers)
+    journal_path = args.journal or os.path.join(out_dir, ".organize_journal.tsv")
+    journal = load_journal(journal_path)
+    remaining = [j for j in jobs if j[0] not in journal]
+    print(f"{ts()} Found {len(jobs)} JPG files; {len(jobs) - len(remaining)} already done "
+          f"per {journal_path}. Reading dates with {workers} process(es).")
+
+    # Phase 1: capture dates (CPU/IO mixed) on a process pool
+    clock = load_clock(args.clock_rules)
+    results = []
+    with futures.ProcessPoolExecutor(max_workers=workers) as ex:
+        job_fn = _datetime_job if clock is not None else _date_job
+        for i, res in enumerate(ex.map(job_fn, remaining, chunksize=64), start=1):
+            results.append(res)
+            if i % args.progress_every == 0:
+                print(f"{ts()} dates: {i}/{len(remaining)}")
+    if clock is not None:
+        results = correct_dates(clock, results)
+        print(f"{ts()} Applied clock rules {clock.version or args.clock_rules}.")
+
+    dated = []
+    skipped = 0
+    for src, sm_top, date_str, source, size in results:
+        if date_str:
+            dated.append((src, sm_top, date_str, source, size))
+        else:
+            skipped += 1
+            print(f"{ts()} WARNING: could not extract date, skipping: {src}")
+
+    # Phase 2: resolve name collisions in memory
+    plan, recovered = plan_destinations(dated, out_dir, journal)
+    print(f"{ts()} Planned {len(plan)} destination(s); {len(recovered)} already in place "
+          f"from an interrupted run.")
+    if args.dry_run:
+        for src, dest, _ in plan:
+            print(f"{ts()} {src} -> {dest}")
+        return
+    if recovered:
+        with open(journal_path, "a", encoding="utf-8") as jf:
+            jf.writelines(f"{src}\t{dest}\trecovered\n" for src, dest in recovered)
+
+    # Phase 3: copy/link on threads (pure IO); the journal is line-buffered so every
+    # completed file is recorded before a kill can lose it
+    safe_makedirs(out_dir)
+    same_fs = os.stat(os.path.dirname(os.path.abspath(jobs[0][0]))).st_dev == os.stat(out_dir).st_dev
+    for folder in sorted({os.path.dirname(d) for _, d, _ in plan}):
+        safe_makedirs(folder)
+
+    placed = 0
+    nbytes = 0
+    errors = 0
+    methods: Dict[str, int] = {}
+    with open(journal_path, "a", encoding="utf-8", buffering=1) as jf, \
+            futures.ThreadPoolExecutor(max_workers=max(workers, 4)) as ex:
+        futs = {ex.submit(place_file, src, dest, args.link, same_fs): (src, dest, size)
+                for src, dest, size in plan}
+        for f in futures.as_completed(futs):
+            src, dest, size = futs[f]
+            try:
+                method = f.result()
+            except Exception as e:
+                errors += 1
+                print(f"{ts()} ERROR placing '{src}' -> '{dest}': {e}", file=sys.stderr)
+                continue
+            jf.write(f"{src}\t{dest}\t{method}\n")
+            placed += 1
+            nbytes += size
+            methods[method] = methods.get(method, 0) + 1
+            if placed % args.progress_every == 0:
+                print(f"{ts()} placed: {placed}/{len(plan)}")
+
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    print(f"{ts()} Placed {placed} file(s) ({methods}), skipped {skipped}, errors {errors}.")
+    print(f"{ts()} Throughput: {placed / elapsed:.1f} files/s, "
+          f"{nbytes / elapsed / (1024 * 1024):.1f} MB/s over {elapsed:.1f} s")
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Copy JPGs into output/SM_X/MM/DD/YYYY/ using EXIF DateTimeOriginal first."
     )
     parser.add_argument("--inDir", required=True, help="Input root (contains SM_1..SM_5)")
     parser.add_argument("--outDir", required=True, help="Output root")
-    parser.add_argument("--workers", type=int, default=2, help="Max worker threads (1-2). Default: 2")
+    parser.add_argument("--workers", type=int, default=2,
+                        help="Max worker threads (1-2) or, with --pool process, worker processes. Default: 2")
+    parser.add_argument("--pool", choices=["thread", "process"], default="thread",
+                        help="'process' = resumable mode: process pool, journal, in-memory collision planning")
+    parser.add_argument("--journal", default=None,
+                        help="Journal file for --pool process (default: outDir/.organize_journal.tsv)")
+    parser.add_argument("--link", choices=["auto", "copy", "hardlink", "reflink"], default="auto",
+                        help="How --pool process places files; auto tries reflink, hardlink, then copy")
+    parser.add_argument("--progress-every", type=int, default=1000,
+                        help="Progress line interval for --pool process")
+    parser.add_argument("--clock-rules", default=None,
+                        help="Correct camera clocks first: a pipelines.clock rule-set version "
+                             "(e.g. 2022-11) or a JSON/YAML rules file")
     parser.add_argument("--dry-run", action="store_true", help="Show actions without copying")
+    parser.add_argument("--manifest", default=None,
+                        help="Optional manifest DB (pipelines.manifest) to list files instead of walking inDir")
     args = parser.parse_args()
 
     workers = max(1, min(2, args.workers))
@@ -195,7 +516,7 @@ def main():
 
     start = time.perf_counter()
 
-    jobs = discover_jobs(in_dir)
+    jobs = discover_jobs(in_dir, args.manifest)
     total = len(jobs)
     done = 0
     lock = threading.Lock()
@@ -204,12 +525,23 @@ def main():
         print(f"{ts()} No JPG files found under SM_1..SM_5 in {in_dir}")
         return
 
+    if args.pool == "process":
+        run_process_pool(args, jobs, start)
+        return
+
+    clock = load_clock(args.clock_rules)
+
     def process_one(job: Tuple[str, str]) -> None:
         nonlocal done
         src, sm_top = job
         print(f"{ts()} found: {src}")
 
-        date_str, source = extract_capture_date_mmddyyyy(src)
+        if clock is not None:
+            dt, source = extract_capture_datetime(src)
+            dt = clock.correct(sm_top, dt)
+            date_str = dt.strftime("%m/%d/%Y") if dt is not None else None
+        else:
+            date_str, source = extract_capture_date_mmddyyyy(src)
         if not date_str:
             print(f"{ts()} WARNING: could not extract date, skipping: {src}")
             with lock:
@@ -0,0 +1,45 @@
+import os
+
+from PIL import Image
+
+from pipelines.manifest import Manifest
+
+
+def make_tree(root, per_dir=4):
+    paths = []
+    for sm in ("SM_1", "SM_2"):
+        for day in ("20220101", "20220102"):
+            d = os.path.join(root, sm, day)
+            os.makedirs(d)
+            for i in range(per_dir):
+                p = os.path.join(d, f"IMG_{i:05d}.JPG")
+                Image.new("RGB", (32, 18), (40 * i, 80, 120)).save(p)
+                paths.append(p)
+    return paths
+
+
+def test_refresh_of_sub_root_keeps_parent_link(tmp_path):
+    tree = str(tmp_path / "tree")
+    paths = make_tree(tree)
+    with Manifest(str(tmp_path / "manifest.sqlite")) as m:
+        assert m.refresh(tree, workers=1)["files"] == len(paths)
+        assert m.refresh(os.path.join(tree, "SM_1"), workers=1)["files"] == len(paths) // 2
+
+        again = m.refresh(tree, workers=1)
+        assert again["removed"] == 0
+        assert again["files"] == len(paths)
+        assert sorted(m.paths(tree)) == sorted(paths)
+
+
+def test_refresh_repairs_roots_recorded_without_parent(tmp_path):
+    tree = str(tmp_path / "tree")
+    paths = make_tree(tree)
+    sm_1 = os.path.join(tree, "SM_1")
+    with Manifest(str(tmp_path / "manifest.sqlite")) as m:
+        m.refresh(tree, workers=1)
+        with m.conn:  # what a sub-root refresh stored before the fix
+            m.conn.execute("UPDATE dirs SET parent = NULL WHERE path = ?", (sm_1,))
+
+        again = m.refresh(tree, workers=1)
+        assert again["removed"] == 0
+        assert sorted(m.paths(tree)) == sorted(paths)